@@ -41,7 +41,9 @@ from twisted.internet.defer import inlineCallbacks, returnValue
 import labrad.util
 import labrad.wrappers
 
-from datavault import SessionStore
+from datavault import SessionStore, backend, stats
+from datavault.executor import IOExecutor
+from datavault.catalog import CATALOG_FILE, Catalog
 from datavault.server import DataVault
 
 
@@ -81,6 +83,21 @@ def load_settings(cxn, name):
         print 'To change this, edit the registry keys and restart the server.'
     returnValue(datadir)
 
+@inlineCallbacks
+def load_registry_key(cxn, name, key, default=None):
+    """Load a setting stored under key next to the 'Repository' directory.
+
+    Returns default if the key is not present.
+    """
+    reg = cxn.registry
+    yield reg.cd(['', 'Servers', name], True)
+    (dirs, keys) = yield reg.dir()
+    if key in keys:
+        value = yield reg.get(key)
+    else:
+        value = default
+    returnValue(value)
+
 def main(argv=sys.argv):
     @inlineCallbacks
     def start():
@@ -88,8 +105,46 @@ def main(argv=sys.argv):
         cxn = yield labrad.wrappers.connectAsync(
             host=opts['host'], port=int(opts['port']), password=opts['password'])
         datadir = yield load_settings(cxn, opts['name'])
+        # default storage profile for new datasets, either as a profile name
+        # like 'gzip' or as a cluster of (chunk rows, compression,
+        # compression level, shuffle); the built-in default if not set
+        storage_profile = yield load_registry_key(
+                cxn, opts['name'], 'Storage Profile')
+        # whether to track access times of sessions and datasets; turning
+        # this off saves writing info files when they are only opened
+        track_access = yield load_registry_key(
+                cxn, opts['name'], 'Track Access Times', True)
+        # whether to keep a searchable catalog of datasets, see catalog.py
+        use_catalog = yield load_registry_key(
+                cxn, opts['name'], 'Catalog', False)
+        # bytes of csv data to keep in memory at once, see backend.DataCache
+        data_cache_bytes = yield load_registry_key(
+                cxn, opts['name'], 'Data Cache Bytes')
+        # if positive, record timings from startup and print them every
+        # this many seconds; otherwise they are enabled with 'stats'
+        stats_dump_interval = yield load_registry_key(
+                cxn, opts['name'], 'Stats Dump Interval')
+        # if positive, read and write HDF5 data and list directories in
+        # this many threads, see executor.IOExecutor
+        io_threads = yield load_registry_key(
+                cxn, opts['name'], 'IO Threads', 0)
         yield cxn.disconnect()
-        session_store = SessionStore(datadir, hub=None)
+        if data_cache_bytes is not None:
+            backend.data_cache.setMaxBytes(int(data_cache_bytes))
+        if stats_dump_interval:
+            stats.timings.enabled = True
+            stats.timings.setDumpInterval(float(stats_dump_interval))
+        catalog = None
+        if use_catalog:
+            catalog = Catalog(os.path.join(datadir, CATALOG_FILE))
+        io_executor = None
+        if io_threads > 0:
+            io_executor = IOExecutor(threads=int(io_threads))
+        session_store = SessionStore(datadir, hub=None,
+                                     storage_profile=storage_profile,
+                                     track_access=track_access,
+                                     catalog=catalog,
+                                     io_executor=io_executor)
         server = DataVault(session_store)
         session_store.hub = server
 
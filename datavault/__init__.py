@@ -3,11 +3,25 @@ from datetime import datetime
 import os
 import re
 import collections
+import time
 import weakref
 
+import numpy as np
+from twisted.internet import reactor
+
 from labrad import types as T
 
-from . import backend, errors, util
+from . import backend, decimate, errors, executor, stats, util
+
+# How long changes to session and dataset info files may wait before they
+# are written to disk, so that many opens cost one write.
+SAVE_DELAY = 5.0
+
+# A directory listing is only reused while the directory modification time
+# is unchanged, and only if the listing was made this many seconds after
+# that time, since changes within one tick of the file system clock do not
+# change the modification time.
+MTIME_RESOLUTION = 1.0
 
 
 ## Filename translation.
@@ -40,6 +54,39 @@ def filename_decode(name):
 def filedir(datadir, path):
     return os.path.join(datadir, *[filename_encode(d) + '.dir' for d in path[1:]])
 
+## tag filtering
+
+def tag_index(tags):
+    """Make a tag -> set of entries index from an entry -> set of tags dict."""
+    index = collections.defaultdict(set)
+    for entry, entry_tags in tags.items():
+        for tag in entry_tags:
+            index[tag].add(entry)
+    return index
+
+def filter_entries(entries, tag_filters, index):
+    """Apply tag filters to a list of entries, using a tag index.
+
+    A filter 'tag' keeps only entries with that tag, and '-tag' removes
+    entries with that tag.  The order of entries is kept.
+    """
+    keep = None
+    for tag in tag_filters:
+        if tag[:1] == '-':
+            tagged = index.get(tag[1:])
+            if not tagged:
+                continue
+            if keep is None:
+                keep = set(entries)
+            keep -= tagged
+        else:
+            tagged = index.get(tag, set())
+            keep = tagged & (set(entries) if keep is None else keep)
+    if keep is None:
+        return list(entries)
+    return [e for e in entries if e in keep]
+
+
 ## time formatting
 
 TIME_FORMAT = '%Y-%m-%d, %H:%M:%S'
@@ -50,6 +97,10 @@ def time_to_str(t):
 def time_from_str(s):
     return datetime.strptime(s, TIME_FORMAT)
 
+def catalog_timestamp(t):
+    """Convert a datetime to the seconds since the epoch used by the catalog."""
+    return time.mktime(t.timetuple()) + t.microsecond * 1e-6
+
 
 ## variable parsing
 
@@ -83,14 +134,33 @@ DATA_URL_PREFIX = 'data:application/labrad;base64,'
 
 
 class SessionStore(object):
-    def __init__(self, datadir, hub):
+    def __init__(self, datadir, hub, storage_profile=None, track_access=True,
+                 save_delay=SAVE_DELAY, catalog=None, io_executor=None):
         self._sessions = weakref.WeakValueDictionary()
         self.datadir = datadir
         self.hub = hub
+        # default on-disk layout for new datasets; see backend.get_storage_profile
+        self.storage_profile = backend.get_storage_profile(storage_profile)
+        # whether opening sessions and datasets updates their access times
+        self.track_access = track_access
+        self.save_delay = save_delay
+        # searchable index of the datasets, see catalog.Catalog, or None
+        self.catalog = catalog
+        # threads for blocking file I/O, see executor.IOExecutor, or None
+        # to do all I/O in the reactor thread
+        self.io_executor = io_executor
 
     def get_all(self):
         return self._sessions.values()
 
+    def openDatasetFiles(self):
+        """Get the file paths, without extension, of datasets in use."""
+        paths = set()
+        for session in self.get_all():
+            for name in session.datasets.keys():
+                paths.add(os.path.join(session.dir, filename_encode(name)))
+        return paths
+
     def exists(self, path):
         """Check whether a session exists on disk for a given path.
 
@@ -108,10 +178,21 @@ class SessionStore(object):
         path = tuple(path)
         if path in self._sessions:
             return self._sessions[path]
-        session = Session(self.datadir, path, self.hub, self)
+        session = Session(self.datadir, path, self.hub, self,
+                          track_access=self.track_access,
+                          save_delay=self.save_delay,
+                          catalog=self.catalog,
+                          io_executor=self.io_executor)
         self._sessions[path] = session
         return session
 
+    def flush(self):
+        """Write all pending changes of sessions and datasets to disk."""
+        for session in self.get_all():
+            session.flush()
+        if self.catalog is not None:
+            self.catalog.flush()
+
 
 class Session(object):
     """Stores information about a directory on disk.
@@ -119,32 +200,57 @@ class Session(object):
     One session object is created for each data directory accessed.
     The session object manages reading from and writing to the config
     file, and manages the datasets in this directory.
+
+    Changes that can be lost without harm, like access times and tags,
+    are not written right away: the session and datasets that have them
+    are marked with saveLater, and saved together save_delay seconds
+    later or when flush is called.
+
+    With an I/O executor, directories are listed in its threads, and
+    listContents returns a Deferred.  Info files are small and are always
+    written in the reactor thread, so that writes of the same file cannot
+    overlap and the counter is saved before a dataset number is used.
     """
 
-    def __init__(self, datadir, path, hub, session_store):
+    def __init__(self, datadir, path, hub, session_store, track_access=True,
+                 save_delay=SAVE_DELAY, catalog=None, io_executor=None):
         """Initialization that happens once when session object is created."""
         self.path = path
         self.hub = hub
         self.dir = filedir(datadir, path)
         self.infofile = os.path.join(self.dir, 'session.ini')
         self.datasets = weakref.WeakValueDictionary()
+        self.track_access = track_access
+        self.save_delay = save_delay
+        self.catalog = catalog
+        self.io_executor = io_executor
+        self.reactor = reactor
+        self._unsaved = set() # this session and datasets marked by saveLater
+        self._saveCall = None
+        self._listing = None # see _listDir
+        self._numbers = None # dataset number -> name, see datasetName
+        self._numbers_stamp = None
 
         if not os.path.exists(self.dir):
             os.makedirs(self.dir)
 
             # notify listeners about this new directory
             parent_session = session_store.get(path[:-1])
+            parent_session.invalidateListing()
             hub.onNewDir(path[-1], parent_session.listeners)
 
         if os.path.exists(self.infofile):
             self.load()
+            self.access()
         else:
             self.counter = 1
-            self.created = self.modified = datetime.now()
+            self.created = self.modified = self.accessed = datetime.now()
             self.session_tags = {}
             self.dataset_tags = {}
-
-        self.access() # update current access time and save
+            self.save()
+        self._indexTags()
+        if self.catalog is not None:
+            self.catalog.addSession(path, catalog_timestamp(self.created))
         self.listeners = set()
 
     def load(self):
@@ -167,7 +273,13 @@ class Session(object):
         else:
             self.session_tags = {}
             self.dataset_tags = {}
+        self._indexTags()
+
+    def _indexTags(self):
+        self.session_index = tag_index(self.session_tags)
+        self.dataset_index = tag_index(self.dataset_tags)
 
+    @stats.timed('ini save')
     def save(self):
         """Save info to the session.ini file."""
         S = util.DVSafeConfigParser()
@@ -189,60 +301,137 @@ class Session(object):
 
         with open(self.infofile, 'w') as f:
             S.write(f)
+        self._unsaved.discard(self)
 
     def access(self):
-        """Update last access time and save."""
-        self.accessed = datetime.now()
-        self.save()
-
-    def listContents(self, tagFilters):
-        """Get a list of directory names in this directory."""
-        files = os.listdir(self.dir)
+        """Update last access time, if access times are tracked."""
+        if self.track_access:
+            self.accessed = datetime.now()
+            self.saveLater()
+
+    def saveLater(self, item=None):
+        """Mark this session, or one of its datasets, to be saved soon."""
+        self._unsaved.add(self if item is None else item)
+        if self._saveCall is None:
+            self._saveCall = self.reactor.callLater(self.save_delay, self.flush)
+
+    def flush(self):
+        """Save the session and datasets marked by saveLater now."""
+        if self._saveCall is not None:
+            if self._saveCall.active():
+                self._saveCall.cancel()
+            self._saveCall = None
+        unsaved, self._unsaved = self._unsaved, set()
+        for item in unsaved:
+            item.save()
+
+    def _stamp(self):
+        """Get (mtime, now) for this directory, taken before listing it."""
+        return os.stat(self.dir).st_mtime, time.time()
+
+    def _isCurrent(self, stamp):
+        """Check whether a listing made at a given _stamp is up to date."""
+        if stamp is None:
+            return False
+        listed_mtime, listed_at = stamp
+        mtime = os.stat(self.dir).st_mtime
+        return listed_mtime == mtime and listed_at - mtime > MTIME_RESOLUTION
+
+    def _listDir(self):
+        """Get sorted lists of the directories and datasets in this directory.
+
+        The listing is cached until the directory changes.
+        """
+        if self._listing is not None:
+            stamp, dirs, datasets = self._listing
+            if self._isCurrent(stamp):
+                return dirs, datasets
+        stamp = self._stamp()
+        files = stats.timings.call('listdir', os.listdir, self.dir)
         dirs = [filename_decode(s[:-4]) for s in files if s.endswith('.dir')]
         csv_datasets = [filename_decode(s[:-4]) for s in files if s.endswith('.ini') and s.lower() != 'session.ini' ]
         hdf5_datasets = [filename_decode(s[:-5]) for s in files if s.endswith('.hdf5')]
-        datasets = sorted(csv_datasets + hdf5_datasets)
-        # apply tag filters
-        def include(entries, tag, tags):
-            """Include only entries that have the specified tag."""
-            return [e for e in entries
-                    if e in tags and tag in tags[e]]
-        def exclude(entries, tag, tags):
-            """Exclude all entries that have the specified tag."""
-            return [e for e in entries
-                    if e not in tags or tag not in tags[e]]
-        for tag in tagFilters:
-            if tag[:1] == '-':
-                filter = exclude
-                tag = tag[1:]
-            else:
-                filter = include
-            dirs = filter(dirs, tag, self.session_tags)
-            datasets = filter(datasets, tag, self.dataset_tags)
-        return sorted(dirs), sorted(datasets)
+        # a dataset being migrated to hdf5 briefly has both files
+        datasets = sorted(set(csv_datasets + hdf5_datasets))
+        dirs = sorted(dirs)
+        self._listing = (stamp, dirs, datasets)
+        return dirs, datasets
+
+    def invalidateListing(self):
+        """Forget the cached listing, after adding to this directory."""
+        self._listing = None
+
+    def listContents(self, tagFilters):
+        """Get a list of directory names in this directory."""
+        if self.io_executor is None:
+            return self._filterContents(self._listDir(), tagFilters)
+        d = self.io_executor.run(self.dir, self._listDir)
+        return d.addCallback(self._filterContents, tagFilters)
+
+    def _filterContents(self, listing, tagFilters):
+        dirs, datasets = listing
+        dirs = filter_entries(dirs, tagFilters, self.session_index)
+        datasets = filter_entries(datasets, tagFilters, self.dataset_index)
+        return dirs, datasets
 
     def listDatasets(self):
         """Get a list of dataset names in this directory."""
-        files = os.listdir(self.dir)
+        files = stats.timings.call('listdir', os.listdir, self.dir)
         filenames = []
         for s in files:
             base, _, ext = s.rpartition('.')
             if ext in ['csv', 'hdf5']:
                 filenames.append(filename_decode(base))
-        return sorted(filenames)
+        return sorted(set(filenames))
+
+    def datasetName(self, num):
+        """Get the name of the dataset with a given number, or None.
 
-    def newDataset(self, title, independents, dependents, extended=False):
+        Names are looked up in a number -> name map, which is rebuilt when
+        the directory has changed and a number is not found in it.
+        """
+        if self._numbers is not None:
+            name = self._numbers.get(num)
+            if name is not None and self._hasDataset(name):
+                return name
+        if not self._isCurrent(self._numbers_stamp):
+            self._numbers_stamp = self._stamp()
+            self._numbers = {}
+            for dataset_name in self.listDatasets():
+                if dataset_name[:5].isdigit():
+                    self._numbers.setdefault(int(dataset_name[:5]), dataset_name)
+        name = self._numbers.get(num)
+        if name is not None and self._hasDataset(name):
+            return name
+        return None
+
+    def _hasDataset(self, name):
+        file_base = os.path.join(self.dir, filename_encode(name))
+        return os.path.exists(file_base + '.csv') or os.path.exists(file_base + '.hdf5')
+
+    def newDataset(self, title, independents, dependents, extended=False,
+                   storage=None):
         num = self.counter
         self.counter += 1
-        self.modified = datetime.now()
+        self.modified = self.accessed = datetime.now()
 
         name = '%05d - %s' % (num, title)
         dataset = Dataset(self, name, title, create=True,
                           independents=independents,
                           dependents=dependents,
-                          extended=extended)
+                          extended=extended,
+                          storage=storage)
         self.datasets[name] = dataset
-        self.access()
+        self.invalidateListing()
+        if self._numbers is not None:
+            self._numbers[num] = name
+        if self.catalog is not None:
+            self.catalog.addDataset(self.path, name, title,
+                                    dataset.getIndependents(),
+                                    dataset.getDependents(),
+                                    catalog_timestamp(self.modified))
+        # save the counter now, so a dataset number is never given out twice
+        self.save()
 
         # notify listeners about the new dataset
         self.hub.onNewDataset(name, self.listeners)
@@ -251,18 +440,10 @@ class Session(object):
     def openDataset(self, name):
         # first lookup by number if necessary
         if isinstance(name, (int, long)):
-            for oldName in self.listDatasets():
-                num = int(oldName[:5])
-                if name == num:
-                    name = oldName
-                    break
-        # if it's still a number, we didn't find the set
-        if isinstance(name, (int, long)):
-            raise errors.DatasetNotFoundError(name)
-
-        filename = filename_encode(name)
-        file_base = os.path.join(self.dir, filename)
-        if not (os.path.exists(file_base + '.csv') or os.path.exists(file_base + '.hdf5')):
+            num, name = name, self.datasetName(name)
+            if name is None:
+                raise errors.DatasetNotFoundError(num)
+        elif not self._hasDataset(name):
             raise errors.DatasetNotFoundError(name)
 
         if name in self.datasets:
@@ -277,7 +458,7 @@ class Session(object):
         return dataset
 
     def updateTags(self, tags, sessions, datasets):
-        def updateTagDict(tags, entries, d):
+        def updateTagDict(tags, entries, d, index):
             updates = []
             for entry in entries:
                 changed = False
@@ -290,28 +471,40 @@ class Session(object):
                         tag = tag[1:]
                         if tag in entryTags:
                             entryTags.remove(tag)
+                            index[tag].discard(entry)
                             changed = True
                     elif tag[:1] == '^':
                         # toggle this tag
                         tag = tag[1:]
                         if tag in entryTags:
                             entryTags.remove(tag)
+                            index[tag].discard(entry)
                         else:
                             entryTags.add(tag)
+                            index[tag].add(entry)
                         changed = True
                     else:
                         # add this tag
                         if tag not in entryTags:
                             entryTags.add(tag)
+                            index[tag].add(entry)
                             changed = True
                 if changed:
                     updates.append((entry, sorted(entryTags)))
             return updates
 
-        sessUpdates = updateTagDict(tags, sessions, self.session_tags)
-        dataUpdates = updateTagDict(tags, datasets, self.dataset_tags)
+        sessUpdates = updateTagDict(tags, sessions, self.session_tags,
+                                    self.session_index)
+        dataUpdates = updateTagDict(tags, datasets, self.dataset_tags,
+                                    self.dataset_index)
 
         self.access()
+        self.saveLater()
+        if self.catalog is not None:
+            for entry, entryTags in sessUpdates:
+                self.catalog.setTags(self.path, 'session', entry, entryTags)
+            for entry, entryTags in dataUpdates:
+                self.catalog.setTags(self.path, 'dataset', entry, entryTags)
         if len(sessUpdates) + len(dataUpdates):
             # fire a message about the new tags
             msg = (sessUpdates, dataUpdates)
@@ -322,29 +515,97 @@ class Session(object):
         dataTags = [(d, sorted(self.dataset_tags.get(d, []))) for d in datasets]
         return sessTags, dataTags
 
+class WriteBuffer(object):
+    """Rows added to a dataset that have not yet been written to disk.
+
+    The buffer is full once it holds max_rows rows or max_bytes bytes, and
+    should be flushed no later than max_delay seconds after the first row
+    was added to it.
+    """
+
+    def __init__(self, max_rows, max_delay, max_bytes):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self.blocks = []
+        self.rows = 0
+        self.nbytes = 0
+
+    def __len__(self):
+        return self.rows
+
+    def add(self, data):
+        self.blocks.append(data)
+        self.rows += len(data)
+        self.nbytes += data.nbytes
+
+    def full(self):
+        return self.rows >= self.max_rows or self.nbytes >= self.max_bytes
+
+    def take(self):
+        """Remove and return all buffered rows as a single array."""
+        if len(self.blocks) == 1:
+            data = self.blocks[0]
+        else:
+            data = np.concatenate(self.blocks)
+        self.blocks = []
+        self.rows = 0
+        self.nbytes = 0
+        return data
+
+
+class DataStream(object):
+    """A context that is sent the rows added to a dataset, see Dataset.startStream.
+
+    pos is the number of rows the context has received.  Up to window
+    messages may be sent before the context acknowledges them; after that
+    the context is behind and is only told that data is available until it
+    reads up to the end of the dataset.
+    """
+
+    def __init__(self, pos, max_rows, window):
+        self.pos = pos
+        self.max_rows = max_rows
+        self.window = window
+        self.unacked = 0
+        self.behind = False
+
 class Dataset(object):
     """
     This object basically takes care of listeners and notifications.
     All the actual data or metadata access is proxied through to a
     backend object.
+
+    If the session has an I/O executor, data is read and written in its
+    threads and the methods doing so return Deferreds, see _io.
     """
-    def __init__(self, session, name, title=None, create=False, independents=[], dependents=[], extended=False):
+    def __init__(self, session, name, title=None, create=False, independents=[], dependents=[], extended=False, storage=None):
         self.hub = session.hub
+        self.session = session
         self.name = name
         file_base = os.path.join(session.dir, filename_encode(name))
+        self.file_base = file_base
         self.listeners = set() # contexts that want to hear about added data
         self.param_listeners = set()
         self.comment_listeners = set()
+        self.reactor = reactor
+        self.buffer = None # write-behind buffer, see setWriteBuffer
+        self._flushCall = None
+        self.notify_interval = 0 # see setNotifyInterval
+        self._notified = set() # listeners notified since their last read
+        self._notifyCall = None
+        self.streams = {} # context -> DataStream, see startStream
 
         if create:
             indep = [self.makeIndependent(i, extended) for i in independents]
             dep = [self.makeDependent(d, extended) for d in dependents]
-            self.data = backend.create_backend(file_base, title, indep, dep, extended)
+            self.data = backend.create_backend(file_base, title, indep, dep, extended, storage)
             self.save()
         else:
             self.data = backend.open_backend(file_base)
             self.load()
             self.access()
+        self.data.onClose(self._onFileClose)
 
     def save(self):
         self.data.save()
@@ -357,9 +618,13 @@ class Dataset(object):
         return '.'.join(str(x) for x in v)
 
     def access(self):
-        """Update time of last access for this dataset."""
-        self.data.access()
-        self.save()
+        """Update time of last access for this dataset.
+
+        The change is saved with the session, see Session.saveLater.
+        """
+        if self.session.track_access:
+            self.data.access()
+            self.session.saveLater(self)
 
     def makeIndependent(self, label, extended):
         """Add an independent variable to this dataset."""
@@ -397,6 +662,7 @@ class Dataset(object):
         self.data.addParam(name, data)
         if saveNow:
             self.save()
+        self._catalogParameters([(name, data)])
 
         # notify all listening contexts
         self.hub.onNewParameter(None, self.param_listeners)
@@ -408,27 +674,283 @@ class Dataset(object):
             self.data.addParam(name, data)
         if saveNow:
             self.save()
+        self._catalogParameters(params)
 
         # notify all listening contexts
         self.hub.onNewParameter(None, self.param_listeners)
         self.param_listeners = set()
 
+    def _catalogParameters(self, params):
+        catalog = self.session.catalog
+        if catalog is not None:
+            catalog.addParameters(self.session.path, self.name, params)
+
     def getParameter(self, name, case_sensitive=True):
         return self.data.getParameter(name, case_sensitive)
 
     def getParamNames(self):
         return self.data.getParamNames()
 
+    def setWriteBuffer(self, max_rows, max_delay, max_bytes):
+        """Buffer added rows in memory and write them to disk in batches.
+
+        Buffered rows are written once there are max_rows of them or they
+        take up max_bytes of memory, max_delay seconds after the first of
+        them was added, before the data file is closed, and before any
+        data is read.  Setting max_rows to 0 writes rows immediately.
+        """
+        self.flush()
+        if max_rows:
+            self.buffer = WriteBuffer(max_rows, max_delay, max_bytes)
+        else:
+            self.buffer = None
+
     def addData(self, data):
+        if self.buffer is None:
+            return self._writeData(data)
+        self.buffer.add(data)
+        if self.buffer.full():
+            return self.flush()
+        elif self._flushCall is None:
+            self._flushCall = self.reactor.callLater(self.buffer.max_delay,
+                                                     self.flush)
+
+    def flush(self):
+        """Write any buffered rows to disk."""
+        data = self._takeBuffer()
+        if data is not None:
+            return self._writeData(data)
+
+    def _takeBuffer(self):
+        if self._flushCall is not None:
+            if self._flushCall.active():
+                self._flushCall.cancel()
+            self._flushCall = None
+        if self.buffer is not None and len(self.buffer):
+            return self.buffer.take()
+
+    def _onFileClose(self, fh):
+        # the file is closing, so buffered rows cannot wait for an I/O thread
+        data = self._takeBuffer()
+        if data is not None:
+            self.data.addData(data)
+            self._dataWritten(None, len(data))
+
+    def _io(self, func, *args):
+        """Call func(*args) to access the data, in an I/O thread if possible.
+
+        With an I/O executor, calls for this dataset run in its threads one
+        at a time, in the order they were made, with the data file held
+        open, and a Deferred is returned.  Csv backends schedule calls on
+        the reactor, so they are always called right away.
+        """
+        io_executor = self.session.io_executor
+        if io_executor is None or not self.data.threadsafe:
+            return func(*args)
+        self.data.hold()
+        d = io_executor.run(self.file_base, func, *args)
+        return d.addBoth(self._released)
+
+    def _released(self, result):
+        self.data.release()
+        return result
+
+    def _writeData(self, data):
         # append the data to the file
-        self.data.addData(data)
-
-        # notify all listening contexts
-        self.hub.onDataAvailable(None, self.listeners)
-        self.listeners = set()
+        d = self._io(self.data.addData, data)
+        return executor.then(d, self._dataWritten, len(data))
+
+    def _dataWritten(self, result, rows):
+        catalog = self.session.catalog
+        if catalog is not None:
+            catalog.addRows(self.session.path, self.name, rows, time.time())
+        if self.data.unsaved:
+            # the number of rows is saved with the session
+            self.session.saveLater(self)
+
+        self._dataAdded()
+
+    def setNotifyInterval(self, interval):
+        """Coalesce data available notifications on a fixed tick.
+
+        With interval > 0, listeners stay registered after they are
+        notified, and rows added within interval seconds of each other
+        cause a single message, sent interval seconds after the first of
+        them, to each listener that has read all the data since it was
+        last notified.  Setting interval to 0 notifies listeners on every
+        write, as before.
+        """
+        self.notify_interval = interval
+        if self._notifyCall is not None:
+            self._notifyTick()
+
+    def _dataAdded(self):
+        """Notify listening contexts that data was added."""
+        if not self.notify_interval:
+            self.hub.onDataAvailable(None, self.listeners)
+            self.listeners = set()
+            self._pushStreams()
+        elif self._notifyCall is None:
+            self._notifyCall = self.reactor.callLater(self.notify_interval,
+                                                      self._notifyTick)
+
+    def _notifyTick(self):
+        if self._notifyCall is not None:
+            if self._notifyCall.active():
+                self._notifyCall.cancel()
+            self._notifyCall = None
+        waiting = self.listeners - self._notified
+        if waiting:
+            self.hub.onDataAvailable(None, waiting)
+        # forget contexts that have stopped listening
+        self._notified = set(self.listeners)
+        self._pushStreams()
+
+    def startStream(self, context, pos, max_rows, window):
+        """Send the rows added after pos to a context as they are written.
+
+        Rows are sent with onDataPushed as (start row, columns), with the
+        columns as returned by getDataColumns.  If more than
+        max_rows rows were added since the last message, only the last
+        max_rows of them are sent.  Once window messages have not been
+        acknowledged with ackStream, the context is sent a single data
+        available message instead, and rows are pushed again after it
+        reads to the end of the dataset (see keepStreaming).
+        """
+        self.listeners.discard(context)
+        self._notified.discard(context)
+        self.streams[context] = DataStream(pos, max_rows, window)
+        return self._pushStreams()
+
+    def stopStream(self, context):
+        self.streams.pop(context, None)
+
+    def ackStream(self, context, count=None):
+        """Acknowledge count pushed messages, or all of them if count is None."""
+        stream = self.streams.get(context)
+        if stream is not None:
+            stream.unacked = 0 if count is None else max(stream.unacked - count, 0)
+
+    def streamPosition(self, context, pos):
+        """Get the read position of a context, after any rows pushed to it."""
+        stream = self.streams.get(context)
+        if stream is None:
+            return pos
+        return max(pos, stream.pos)
+
+    def _pushStreams(self):
+        if not self.streams:
+            return
+        return executor.then(self._io(len, self.data), self._pushRows)
+
+    def _pushRows(self, end):
+        # the streams are advanced right away, so that rows are pushed once
+        # even if more are added before they are read
+        pushes = {} # start row -> contexts, which share the columns read
+        for context, stream in self.streams.items():
+            if stream.behind or stream.pos >= end:
+                continue
+            if stream.unacked >= stream.window:
+                stream.behind = True
+                self.hub.onDataAvailable(None, [context])
+                continue
+            start = max(stream.pos, end - stream.max_rows)
+            pushes.setdefault(start, []).append(context)
+            stream.pos = end
+            stream.unacked += 1
+        if pushes:
+            chunks = self._io(self._readChunks, sorted(pushes), end)
+            return executor.then(chunks, self._sendChunks, pushes)
+
+    def _readChunks(self, starts, end):
+        return dict((start, self.data.getDataColumns(end - start, start)[0])
+                    for start in starts)
+
+    def _sendChunks(self, chunks, pushes):
+        for start, contexts in sorted(pushes.items()):
+            for context in contexts:
+                if context in self.streams:
+                    self.hub.onDataPushed((long(start), chunks[start]), [context])
 
     def getData(self, limit, start, transpose=False, simpleOnly=False):
-        return self.data.getData(limit, start, transpose, simpleOnly)
+        self.flush()
+        return self._io(self.data.getData, limit, start, transpose, simpleOnly)
+
+    def getDataColumns(self, limit, start):
+        self.flush()
+        return self._io(self.data.getDataColumns, limit, start)
+
+    def getDataSlice(self, start, stop, step, columns=None):
+        self.flush()
+        if columns is not None:
+            columns = [self.columnIndex(col) for col in columns]
+        return self._io(self.data.getDataSlice, start, stop, step, columns)
+
+    def getDecimated(self, column, points, mode):
+        """Get a decimated view of the data along an independent column.
+
+        Returns the independent column followed by all dependent columns,
+        reduced to at most points bins with the given decimate mode.
+        """
+        if points < 1 or mode not in decimate.MODES:
+            raise errors.BadDecimationError(points, mode)
+        self.flush()
+        indeps = self.getIndependents()
+        deps = self.getDependents()
+        x = self.columnIndex(column)
+        if x >= len(indeps):
+            raise errors.ColumnNotFoundError(column)
+        columns = [x] + range(len(indeps), len(indeps) + len(deps))
+        variables = indeps + deps
+        for idx in columns:
+            var = variables[idx]
+            if tuple(var.shape) != (1,) or var.datatype not in ('v', 'i'):
+                raise errors.NonNumericColumnError(var.label)
+        return self._io(self._decimate, columns, points, mode)
+
+    def _decimate(self, columns, points, mode):
+        # read to the end, since csv datasets are loaded to find their length
+        return decimate.decimate(self.data, None, columns, points, mode)
+
+    def getSummaryLevels(self):
+        self.flush()
+        return self._io(self.data.getSummaryLevels)
+
+    def getSummary(self, factor, start, stop):
+        self.flush()
+        return self._io(self.data.getSummary, factor, start, stop)
+
+    def columnIndex(self, column):
+        """Get the index of a column given by index or by name.
+
+        Independents are named by their label.  Dependents can be named by
+        their label, their legend or 'label (legend)', as long as the name
+        matches only one column.
+        """
+        indeps = self.getIndependents()
+        deps = self.getDependents()
+        if isinstance(column, (int, long)):
+            if not 0 <= column < len(indeps) + len(deps):
+                raise errors.ColumnNotFoundError(column)
+            return column
+        names = [[i.label] for i in indeps]
+        for d in deps:
+            if d.legend:
+                names.append([d.label, d.legend, '{} ({})'.format(d.label, d.legend)])
+            else:
+                names.append([d.label])
+        matches = [idx for idx, n in enumerate(names) if column in n]
+        if not matches:
+            raise errors.ColumnNotFoundError(column)
+        if len(matches) > 1:
+            raise errors.AmbiguousColumnError(column)
+        return matches[0]
+
+    def hasMore(self, pos):
+        """Check whether there is data beyond pos, including buffered rows."""
+        if self.buffer is not None and len(self.buffer):
+            return True
+        return self.data.hasMore(pos)
 
     def keepStreaming(self, context, pos):
         # keepStreaming does something a bit odd and has a confusing name (ERJ)
@@ -445,7 +967,30 @@ class Dataset(object):
         # 
         # If a client reads, but not to the end of the dataset, it is immediately notified that
         # there is more data for it to read, and then removed from the set of notifiers.
-        if self.data.hasMore(pos):
+        #
+        # With a notify interval (see setNotifyInterval) listeners are not removed; instead
+        # we remember which of them have been notified and not read since.
+        #
+        # Contexts that have data pushed to them (see startStream) are not listeners; a read
+        # moves their position and, if they were behind, starts pushing rows to them again.
+        stream = self.streams.get(context)
+        if stream is not None:
+            stream.pos = pos
+            if self.hasMore(pos):
+                self.hub.onDataAvailable(None, [context])
+            else:
+                stream.behind = False
+                stream.unacked = 0
+            return
+        if self.notify_interval:
+            self.listeners.add(context)
+            if self.hasMore(pos):
+                self._notified.add(context)
+                self.hub.onDataAvailable(None, [context])
+            else:
+                self._notified.discard(context)
+            return
+        if self.hasMore(pos):
             if context in self.listeners:
                 self.listeners.remove(context)
             self.hub.onDataAvailable(None, [context])
@@ -1,9 +1,13 @@
 import base64
 import collections
 import datetime
+import itertools
 import os
 import re
+import StringIO
+import struct
 import sys
+import threading
 import time
 
 import h5py
@@ -18,7 +22,7 @@ except ImportError, e:
     use_numpy = False
 
 from labrad import types as T
-from . import errors, util
+from . import errors, stats, summary, util
 
 
 ## Data types for variable defintions
@@ -30,9 +34,97 @@ TIME_FORMAT = '%Y-%m-%d, %H:%M:%S'
 PRECISION = 12 # digits of precision to use when saving data
 DATA_FORMAT = '%%.%dG' % PRECISION
 FILE_TIMEOUT_SEC = 60 # how long to keep datafiles open if not accessed
+MAX_OPEN_FILES = 256 # how many datafiles to keep open at once
 DATA_TIMEOUT = 300 # how long to keep data in memory if not accessed
+MAX_DATA_BYTES = 1 << 30 # how much csv data to keep in memory at once
+LIST_ROW_BYTES = 72 # memory used by a list of floats, per row ...
+FLOAT_BYTES = 32 # ... and per value
+CSV_READ_BLOCK = 1 << 22 # bytes to read at a time when parsing csv files
+ROW_INDEX_STEP = 1024 # rows between entries of the csv row index
+COMMENT_CHUNK = 64 # comments per chunk of the hdf5 comments dataset
+COMMENTS_NOTE = ("Further comments are stored in the 'Comments' dataset of "
+                 "this file, which needs a newer Data Vault to read.")
 DATA_URL_PREFIX = 'data:application/labrad;base64,'
 
+
+## Storage layout for HDF5 datasets
+#
+# A storage profile controls how the 'DataVault' dataset is laid out on disk:
+# the number of rows per chunk, the compression filter ('gzip', 'lzf' or None)
+# with its level, and whether the shuffle filter is applied before
+# compression.  chunk_rows=None leaves chunking up to h5py, which is how
+# datasets were created before storage profiles existed.  If summary is set,
+# min/max/mean summary levels are kept alongside the data (see summary.py).
+
+StorageProfile = collections.namedtuple('StorageProfile', ['chunk_rows', 'compression', 'compression_opts', 'shuffle', 'summary'])
+StorageProfile.__new__.__defaults__ = (False,) # summary
+
+STORAGE_PROFILES = {
+    'legacy': StorageProfile(chunk_rows=None, compression=None, compression_opts=None, shuffle=False, summary=False),
+    'default': StorageProfile(chunk_rows=1024, compression=None, compression_opts=None, shuffle=False, summary=False),
+    'lzf': StorageProfile(chunk_rows=4096, compression='lzf', compression_opts=None, shuffle=True, summary=False),
+    'gzip': StorageProfile(chunk_rows=4096, compression='gzip', compression_opts=4, shuffle=True, summary=False),
+    'timeseries': StorageProfile(chunk_rows=4096, compression='lzf', compression_opts=None, shuffle=True, summary=True),
+}
+DEFAULT_STORAGE_PROFILE = 'default'
+MAX_CHUNK_BYTES = 1 << 20 # upper bound on chunk size for datasets with wide rows
+
+def get_storage_profile(spec=None):
+    """Get a StorageProfile from a profile name, a tuple or None.
+
+    Names are looked up in STORAGE_PROFILES.  A gzip level can be given
+    with the name, e.g. 'gzip:9'.  Tuples are interpreted as
+    (chunk_rows, compression, compression_opts, shuffle[, summary]), where
+    a chunk_rows of 0 or a compression of '' mean 'not set'.  None gives
+    the default profile.
+    """
+    if spec is None:
+        spec = DEFAULT_STORAGE_PROFILE
+    if isinstance(spec, basestring):
+        name, _, level = spec.partition(':')
+        if name not in STORAGE_PROFILES:
+            raise errors.BadStorageProfileError(spec)
+        profile = STORAGE_PROFILES[name]
+        if level:
+            if profile.compression != 'gzip' or not level.isdigit():
+                raise errors.BadStorageProfileError(spec)
+            profile = profile._replace(compression_opts=int(level))
+    else:
+        try:
+            if len(spec) == 4:
+                spec = tuple(spec) + (False,)
+            chunk_rows, compression, compression_opts, shuffle, summary = spec
+        except (TypeError, ValueError):
+            raise errors.BadStorageProfileError(spec)
+        profile = StorageProfile(chunk_rows=chunk_rows or None,
+                                 compression=compression or None,
+                                 compression_opts=compression_opts,
+                                 shuffle=bool(shuffle),
+                                 summary=bool(summary))
+    if profile.compression not in (None, 'gzip', 'lzf'):
+        raise errors.BadStorageProfileError(spec)
+    if profile.compression == 'gzip':
+        if profile.compression_opts not in range(10):
+            raise errors.BadStorageProfileError(spec)
+    elif profile.compression_opts is not None:
+        profile = profile._replace(compression_opts=None)
+    return profile
+
+def _storage_kwargs(profile, dtype):
+    """Keyword arguments for h5py create_dataset implementing a storage profile."""
+    kw = {}
+    if profile.chunk_rows is not None:
+        row_bytes = max(np.dtype(dtype).itemsize, 1)
+        chunk_rows = max(1, min(profile.chunk_rows, MAX_CHUNK_BYTES // row_bytes))
+        kw['chunks'] = (chunk_rows,)
+    if profile.compression is not None:
+        kw['compression'] = profile.compression
+        if profile.compression_opts is not None:
+            kw['compression_opts'] = profile.compression_opts
+    if profile.shuffle:
+        kw['shuffle'] = True
+    return kw
+
 def time_to_str(t):
     return t.strftime(TIME_FORMAT)
 
@@ -62,38 +154,221 @@ def labrad_urldecode(data_url):
         raise ValueError("Trying to labrad_urldecode data that doesn't start "
                          "with prefix: {}".format(DATA_URL_PREFIX))
 
+class FilePool(object):
+    """Keeps track of the files held open by SelfClosingFile containers.
+
+    At most max_open files are kept open at once.  When another file is
+    opened, the least recently used file is closed.  Counters are kept of
+    accesses to files that were already open (hits), of files that had to
+    be opened (misses) and of files closed to make room (evictions).
+    Files that are held open are not closed.  Open files may be accessed
+    from I/O threads, see executor.IOExecutor, so the pool is locked.
+    """
+    def __init__(self, max_open=MAX_OPEN_FILES):
+        self.max_open = max_open
+        self._files = collections.OrderedDict() # least recently used first
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._files)
+
+    def opened(self, f):
+        with self._lock:
+            self.misses += 1
+            self._files[f] = None
+            self._evict()
+
+    def touched(self, f):
+        with self._lock:
+            self.hits += 1
+            if f in self._files:
+                del self._files[f]
+            self._files[f] = None
+
+    def closed(self, f):
+        with self._lock:
+            self._files.pop(f, None)
+
+    def setMaxOpen(self, max_open):
+        with self._lock:
+            self.max_open = max(max_open, 1)
+            self._evict()
+
+    def _evict(self):
+        while len(self._files) > self.max_open:
+            # the most recently used file is in use, even if not held
+            older = itertools.islice(self._files, len(self._files) - 1)
+            f = next((f for f in older if not f.holds), None)
+            if f is None:
+                break
+            self.evictions += 1
+            f.close()
+
+    def stats(self):
+        return [('open', len(self)),
+                ('max open', self.max_open),
+                ('hits', self.hits),
+                ('misses', self.misses),
+                ('evictions', self.evictions)]
+
+file_pool = FilePool()
+
+class DataCache(object):
+    """Keeps track of the data of csv datasets held in memory.
+
+    Csv datasets keep the whole file in memory once it has been read as a
+    whole.  They report the bytes they use with stored, and when more than
+    max_bytes are used in total, the data of the least recently used
+    datasets is released.  The most recently used dataset keeps its data
+    even if that alone is more than max_bytes.
+    """
+    def __init__(self, max_bytes=MAX_DATA_BYTES):
+        self.max_bytes = max_bytes
+        self._owners = collections.OrderedDict() # least recently used first
+        self.nbytes = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._owners)
+
+    def stored(self, owner, nbytes):
+        """Record that owner holds nbytes of data and was just used."""
+        self.nbytes += nbytes - self._owners.pop(owner, 0)
+        self._owners[owner] = nbytes
+        self._evict()
+
+    def released(self, owner):
+        self.nbytes -= self._owners.pop(owner, 0)
+
+    def setMaxBytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._owners) > 1:
+            owner = next(iter(self._owners))
+            self.evictions += 1
+            owner.releaseData()
+
+    def residents(self):
+        """Get (filename, bytes) for each dataset with data in memory."""
+        return [(owner.filename, nbytes)
+                for owner, nbytes in reversed(self._owners.items())]
+
+    def stats(self):
+        return [('datasets', len(self)),
+                ('bytes', self.nbytes),
+                ('max bytes', self.max_bytes),
+                ('evictions', self.evictions)]
+
+data_cache = DataCache()
+
+class MetadataCacheStats(object):
+    """Counts lookups of the column metadata of HDF5 datasets.
+
+    HDF5MetaData parses the column descriptions from the attributes of a
+    dataset once and then serves them from memory.  We count lookups that
+    were served from memory (hits) and that had to read the attributes
+    (misses), the attribute reads done, and the attribute reads that the
+    hits would have needed without the cache.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.reads = 0
+        self.reads_saved = 0
+
+    def stats(self):
+        return [('hits', self.hits),
+                ('misses', self.misses),
+                ('attribute reads', self.reads),
+                ('attribute reads saved', self.reads_saved)]
+
+metadata_stats = MetadataCacheStats()
+
 class SelfClosingFile(object):
     """A container for a file object that manages the underlying file handle.
 
     The file will be opened on demand when this container is called, then
-    closed automatically if not accessed within a specified timeout.
+    closed automatically if not accessed within a specified timeout.  Open
+    files are also tracked by a FilePool, which closes the least recently
+    used files if too many are open.
     """
     def __init__(self, opener=open, open_args=(), open_kw={},
-                 timeout=FILE_TIMEOUT_SEC, touch=True, reactor=reactor):
+                 timeout=FILE_TIMEOUT_SEC, touch=True, reactor=reactor,
+                 pool=None):
         self.opener = opener
         self.open_args = open_args
         self.open_kw = open_kw
         self.timeout = timeout
         self.callbacks = []
         self.reactor = reactor
+        self.pool = file_pool if pool is None else pool
+        self.holds = 0
         if touch:
             self.__call__()
 
     def __call__(self):
+        # Rather than resetting the timeout on every access, we record the
+        # access time and check it when the timeout call fires.
         if not hasattr(self, '_file'):
             self._file = self.opener(*self.open_args, **self.open_kw)
             self._fileTimeoutCall = self.reactor.callLater(
                     self.timeout, self._fileTimeout)
+            self._lastAccess = self.reactor.seconds()
+            self.pool.opened(self)
         else:
-            self._fileTimeoutCall.reset(self.timeout)
+            self._lastAccess = self.reactor.seconds()
+            self.pool.touched(self)
         return self._file
 
+    def hold(self):
+        """Open the file if needed and keep it open until release is called.
+
+        This must be called from the reactor thread.  A held file is not
+        closed by the timeout or the file pool, so that it can be used
+        from another thread.
+        """
+        self()
+        self.holds += 1
+
+    def release(self):
+        self.holds -= 1
+
     def _fileTimeout(self):
-        for callback in self.callbacks:
-            callback(self)
-        self._file.close()
-        del self._file
-        del self._fileTimeoutCall
+        idle = self.reactor.seconds() - self._lastAccess
+        if self.holds:
+            idle = 0
+        if idle < self.timeout:
+            self._fileTimeoutCall = self.reactor.callLater(
+                    self.timeout - idle, self._fileTimeout)
+        else:
+            self.close()
+
+    def close(self):
+        """Close the file now if it is open."""
+        if not hasattr(self, '_file'):
+            return
+        if self._fileTimeoutCall.active():
+            self._fileTimeoutCall.cancel()
+        # callbacks run in reverse order of registration, so that objects
+        # wrapping a backend can write to the file before the backend
+        # itself finishes with it
+        try:
+            for callback in reversed(self.callbacks):
+                callback(self)
+        finally:
+            self._file.close()
+            del self._file
+            del self._fileTimeoutCall
+            self.pool.closed(self)
+
+    @property
+    def is_open(self):
+        return hasattr(self, '_file')
 
     def size(self):
         return os.fstat(self().fileno()).st_size
@@ -113,6 +388,12 @@ class IniData(object):
     This provides the load() and save() methods to read and write the
     INI file as well as accessors for all the metadata attributes.
     """
+    # csv data is released from memory with delayed calls, so it is only
+    # accessed from the reactor thread
+    threadsafe = False
+    # metadata is saved as it changes, see HDF5MetaData.save
+    unsaved = False
+
     def load(self):
         S = util.DVSafeConfigParser()
         S.read(self.infofile)
@@ -177,6 +458,7 @@ class IniData(object):
         else:
             self.comments = []
 
+    @stats.timed('ini save')
     def save(self):
         S = util.DVSafeConfigParser()
 
@@ -290,6 +572,101 @@ class IniData(object):
     def numComments(self):
         return len(self.comments)
 
+class RowIndex(object):
+    """Byte offsets of every step'th row of a csv file.
+
+    The index covers the complete lines of the file up to byte offset end,
+    which is the start of row rows.  It is extended by scanning the file
+    from end, so each row is only scanned once, and saved to a sidecar
+    file (name.idx) so that it survives restarts.  The sidecar holds a
+    header with the step, rows and end, followed by the offsets as int64.
+    A sidecar that does not match the csv file is ignored.
+    """
+
+    HEADER = struct.Struct('<8sqqq')
+    MAGIC = 'DVROWIDX'
+
+    def __init__(self, filename, step=ROW_INDEX_STEP):
+        self.filename = filename
+        self.step = step
+        self.offsets = np.zeros((0,), dtype=np.int64)
+        self.rows = 0
+        self.end = 0
+        self._loaded = False
+        self._saved_rows = 0
+
+    def _load(self, f):
+        """Load the sidecar file if it matches the csv file f."""
+        self._loaded = True
+        try:
+            with open(self.filename, 'rb') as idx:
+                magic, step, rows, end = self.HEADER.unpack(idx.read(self.HEADER.size))
+                offsets = np.fromfile(idx, dtype='<i8')
+        except (IOError, struct.error):
+            return
+        if magic != self.MAGIC or step != self.step:
+            return
+        if len(offsets) != -(-rows // step) or end > os.fstat(f.fileno()).st_size:
+            return
+        if end > 0:
+            # the indexed part of the file must end with a complete line
+            f.seek(end - 1)
+            if f.read(1) != '\n':
+                return
+        self.offsets, self.rows, self.end = offsets, rows, end
+        self._saved_rows = rows
+
+    def knownRows(self, f):
+        """Get the number of rows in the csv file f without scanning it.
+
+        Returns None unless the saved index covers the whole file.
+        """
+        if not self._loaded:
+            self._load(f)
+        if self.end == os.fstat(f.fileno()).st_size:
+            return self.rows
+        return None
+
+    def update(self, f):
+        """Index the rows added to the csv file f since the last update."""
+        if not self._loaded:
+            self._load(f)
+        new_offsets = []
+        f.seek(self.end)
+        while True:
+            chunk = f.read(CSV_READ_BLOCK)
+            # rows start after each line break
+            starts = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10) + 1
+            if not len(starts):
+                break
+            rows = self.rows + np.arange(len(starts))
+            offsets = self.end + np.concatenate(([0], starts[:-1]))
+            new_offsets.append(offsets[rows % self.step == 0])
+            self.rows += len(starts)
+            self.end += int(starts[-1])
+            f.seek(self.end)
+        if new_offsets:
+            new_offsets = np.concatenate(new_offsets)
+            if len(new_offsets):
+                self.offsets = np.concatenate((self.offsets, new_offsets))
+                self.save()
+
+    def seek(self, row):
+        """Get (row, offset) of the nearest indexed row at or before row."""
+        if row >= self.rows:
+            return self.rows, self.end
+        k = row // self.step
+        return k * self.step, int(self.offsets[k])
+
+    def save(self):
+        """Write the index to the sidecar file if it has changed."""
+        if not self._loaded or self.rows == self._saved_rows:
+            return
+        with open(self.filename, 'wb') as idx:
+            idx.write(self.HEADER.pack(self.MAGIC, self.step, self.rows, self.end))
+            self.offsets.astype('<i8').tofile(idx)
+        self._saved_rows = self.rows
+
 class CsvListData(IniData):
     """Data backed by a csv-formatted file.
 
@@ -300,7 +677,8 @@ class CsvListData(IniData):
                  filename,
                  file_timeout=FILE_TIMEOUT_SEC,
                  data_timeout=DATA_TIMEOUT,
-                 reactor=reactor):
+                 reactor=reactor,
+                 cache=None):
         self.filename = filename
         self._file = SelfClosingFile(open_args=(filename, 'a+'),
                                      timeout=file_timeout,
@@ -308,11 +686,22 @@ class CsvListData(IniData):
         self.timeout = data_timeout
         self.infofile = filename[:-4] + '.ini'
         self.reactor = reactor
+        self.cache = data_cache if cache is None else cache
+        self._index = RowIndex(filename[:-4] + '.idx')
+        self._file.onClose(lambda fh: self._index.save())
 
     @property
     def file(self):
         return self._file()
 
+    def onClose(self, callback):
+        """Call callback before the data file is closed."""
+        self._file.onClose(callback)
+
+    def indexedLength(self):
+        """Get the number of rows if the row index is up to date, else None."""
+        return self._index.knownRows(self.file)
+
     @property
     def version(self):
         return np.asarray([1,0,0], np.int32)
@@ -334,12 +723,63 @@ class CsvListData(IniData):
         lines = f.readlines()
         self._data.extend([float(n) for n in line.split(',')] for line in lines)
         self._datapos = f.tell()
+        self.cache.stored(self, self._dataBytes())
         return self._data
 
+    def _dataBytes(self):
+        """Estimate the memory used by the data as lists of floats."""
+        if not self._data:
+            return 0
+        return len(self._data) * (LIST_ROW_BYTES + FLOAT_BYTES * len(self._data[0]))
+
     def _on_timeout(self):
         del self._data
         del self._datapos
         del self._timeout_call
+        self.cache.released(self)
+
+    def releaseData(self):
+        """Clear the data from memory before it times out."""
+        if hasattr(self, '_timeout_call'):
+            if self._timeout_call.active():
+                self._timeout_call.cancel()
+            self._on_timeout()
+
+    def _memoryPosition(self):
+        """(rows, offset) of the end of the data in memory, or None."""
+        if not hasattr(self, '_data'):
+            return None
+        return len(self._data), self._datapos
+
+    def _seekRow(self, row):
+        """Find the byte offset of a row of the file.
+
+        Counting line breaks starts from the nearest row before row whose
+        offset is known, from the row index or from previous reads.
+        Returns (offset, row reached), where the row reached is less than
+        row if the file is shorter.
+        """
+        f = self.file
+        self._index.update(f)
+        known = [self._index.seek(row), getattr(self, '_lastRead', (0, 0))]
+        in_memory = self._memoryPosition()
+        if in_memory is not None:
+            known.append(in_memory)
+        current, offset = max(k for k in known if k[0] <= row)
+        f.seek(offset)
+        while current < row:
+            chunk = f.read(CSV_READ_BLOCK)
+            if not chunk:
+                break
+            lines = chunk.count('\n')
+            if current + lines < row:
+                current += lines
+                offset += len(chunk)
+            else:
+                offset += _line_end(chunk, row - current)
+                current = row
+        return offset, current
+
 
     def _saveData(self, data):
         f = self.file
@@ -360,70 +800,186 @@ class CsvListData(IniData):
     def getData(self, limit, start, transpose, simpleOnly):
         if transpose:
             raise RuntimeError("Transpose specified for simple data format: not supported")
-        if limit is None:
-            data = self.data[start:]
+        if hasattr(self, '_data'):
+            if limit is None:
+                data = self.data[start:]
+            else:
+                data = self.data[start:start+limit]
         else:
-            data = self.data[start:start+limit]
+            # read only the requested rows, and remember where they ended
+            offset, row = self._seekRow(start)
+            f = self.file
+            f.seek(offset)
+            lines = itertools.islice(iter(f.readline, ''), limit)
+            data = [[float(n) for n in line.split(',')] for line in lines]
+            if data:
+                self._lastRead = (start + len(data), f.tell())
         return data, start + len(data)
 
+    def getDataColumns(self, limit, start):
+        """Get up to limit rows as a tuple of columns."""
+        data, new_pos = self.getData(limit, start, False, False)
+        if len(data):
+            columns = tuple(list(col) for col in zip(*data))
+        else:
+            columns = tuple([] for _ in range(self.cols))
+        return columns, new_pos
+
+    def getDataSlice(self, start, stop, step, columns):
+        """Get rows start, start+step, ... before stop for the given columns."""
+        if step < 1:
+            raise ValueError("step must be at least 1, not {}".format(step))
+        if columns is None:
+            columns = range(self.cols)
+        rows = self._sliceRows(start, stop)[::step]
+        return tuple([row[idx] for row in rows] for idx in columns)
+
+    def _sliceRows(self, start, stop):
+        """Get the rows data[start:stop].
+
+        Unless the data is in memory, only these rows are read from the
+        file, found through the row index, if start and stop are not
+        negative.
+        """
+        if start < 0 or (stop is not None and stop < 0):
+            return self.data[start:stop]
+        limit = None if stop is None else max(stop - start, 0)
+        data, _ = self.getData(limit, start, False, False)
+        return data
+
+    def __len__(self):
+        return len(self.data)
+
+    def getSummaryLevels(self):
+        return []
+
+    def getSummary(self, factor, start, stop):
+        raise errors.SummaryLevelNotFoundError(factor)
+
     def hasMore(self, pos):
-        return pos < len(self.data)
+        if hasattr(self, '_data'):
+            return pos < len(self.data)
+        # without the data in memory, check for a row at pos in the file
+        offset, row = self._seekRow(pos)
+        return row == pos and offset < self._file.size()
+
+def _parse_csv_lines(text):
+    """Parse complete lines of comma separated floats into a 2-D array."""
+    cols = text[:text.find('\n')].count(',') + 1
+    values = np.fromstring(text.replace(',', ' '), sep=' ')
+    if values.size != text.count('\n') * cols:
+        # let loadtxt deal with (and complain about) anything unusual
+        return np.loadtxt(StringIO.StringIO(text), delimiter=',', ndmin=2)
+    return values.reshape(-1, cols)
+
+def _line_end(text, n):
+    """Offset just past the n'th newline in text (n > 0)."""
+    return len(text) - len(text.split('\n', n)[-1])
 
 class CsvNumpyData(CsvListData):
     """Data backed by a csv-formatted file.
 
-    Stores the entire contents of the file in memory as a list or numpy array
+    The file is parsed incrementally: reading the data parses only rows
+    added since the last read into a growable buffer.  getData reads a
+    window of rows directly from the file unless the whole file is
+    already in memory, finding the start row by counting lines.
     """
 
-    def __init__(self, filename, reactor=reactor):
+    def __init__(self, filename, reactor=reactor, cache=None):
         self.filename = filename
         self._file = SelfClosingFile(open_args=(filename, 'a+'), reactor=reactor)
         self.infofile = filename[:-4] + '.ini'
         self.reactor = reactor
+        self.cache = data_cache if cache is None else cache
+        self._index = RowIndex(filename[:-4] + '.idx')
+        self._file.onClose(lambda fh: self._index.save())
 
     @property
     def file(self):
         return self._file()
 
-    def _get_data(self):
+    @property
+    def data(self):
         """Read data from file on demand.
 
-        The data is scheduled to be cleared from memory unless accessed."""
-        if not hasattr(self, '_data'):
-            try:
-                # if the file is empty, this line can barf in certain versions
-                # of numpy.  Clearly, if the file does not exist on disk, this
-                # will be the case.  Even if the file exists on disk, we must
-                # check its size
-                if self._file.size() > 0:
-                    self.file.seek(0)
-                    self._data = np.loadtxt(self.file, delimiter=',')
-                else:
-                    self._data = np.array([[]])
-                if len(self._data.shape) == 1:
-                    self._data.shape = (1, len(self._data))
-            except ValueError:
-                # no data saved yet
-                # this error is raised by numpy <=1.2
-                self._data = np.array([[]])
-            except IOError:
-                # no data saved yet
-                # this error is raised by numpy 1.3
-                self.file.seek(0)
-                self._data = np.array([[]])
+        Only the part of the file after the previous read is parsed.  The
+        data is scheduled to be cleared from memory unless accessed.  An
+        empty dataset is returned as an array with one empty row."""
+        if not hasattr(self, '_buf'):
+            self._buf = None
+            self._nrows = 0
+            self._datapos = 0
             self._timeout_call = self.reactor.callLater(DATA_TIMEOUT, self._on_timeout)
         else:
             self._timeout_call.reset(DATA_TIMEOUT)
-        return self._data
-
-    def _set_data(self, data):
-        self._data = data
-
-    data = property(_get_data, _set_data)
+        if self._file.size() > self._datapos:
+            rows, self._datapos = self._readRows(self._datapos, None)
+            self._appendToBuffer(rows)
+        self.cache.stored(self, self._dataBytes())
+        if self._nrows == 0:
+            return np.array([[]])
+        return self._buf[:self._nrows]
+
+    def _appendToBuffer(self, rows):
+        """Append rows to the in-memory data, doubling its capacity as needed."""
+        if not len(rows):
+            return
+        new_rows = self._nrows + len(rows)
+        if self._buf is None or new_rows > len(self._buf):
+            capacity = max(new_rows, 2 * self._nrows, 1024)
+            buf = np.empty((capacity, rows.shape[1]))
+            if self._nrows:
+                buf[:self._nrows] = self._buf[:self._nrows]
+            self._buf = buf
+        self._buf[self._nrows:new_rows] = rows
+        self._nrows = new_rows
+
+    def _dataBytes(self):
+        return 0 if self._buf is None else self._buf.nbytes
 
     def _on_timeout(self):
-        del self._data
+        del self._buf
+        del self._nrows
+        del self._datapos
         del self._timeout_call
+        self.cache.released(self)
+
+    def _memoryPosition(self):
+        if getattr(self, '_buf', None) is None:
+            return None
+        return self._nrows, self._datapos
+
+    @stats.timed('csv read')
+    def _readRows(self, offset, limit):
+        """Parse up to limit rows starting at a byte offset of the file.
+
+        Returns the rows as a 2-D array and the offset after the last row.
+        """
+        f = self.file
+        f.seek(offset)
+        blocks = []
+        nrows = 0
+        tail = ''
+        while limit is None or nrows < limit:
+            chunk = f.read(CSV_READ_BLOCK)
+            if not chunk:
+                # a last line without a line break is still a row
+                if tail.strip():
+                    blocks.append(_parse_csv_lines(tail + '\n'))
+                    offset += len(tail)
+                break
+            text = tail + chunk
+            end = text.rfind('\n') + 1
+            if limit is not None and text.count('\n', 0, end) > limit - nrows:
+                end = _line_end(text, limit - nrows)
+            text, tail = text[:end], text[end:]
+            if text:
+                blocks.append(_parse_csv_lines(text))
+                nrows += len(blocks[-1])
+                offset += len(text)
+        if not blocks:
+            return np.zeros((0, self.cols)), offset
+        return np.concatenate(blocks), offset
 
     def _saveData(self, data):
         f = self.file
@@ -436,37 +992,74 @@ class CsvNumpyData(CsvListData):
         if len(data[0]) != self.cols:
             raise errors.BadDataError(self.cols, len(data[0]))
 
-        # Ordinarily, we are using record arrays, but for numpy savetxt we want a 2-D array
-        record_data = util.from_record_array(data)
-        # append data to in-memory data
-        if self.data.size > 0:
-            self.data = np.vstack((self.data, record_data))
-        else:
-            self.data = record_data
+        # keep the in-memory data, if any, in step with the file
+        in_memory = (getattr(self, '_buf', None) is not None and
+                     self._datapos == self._file.size())
 
         # append data to file
         self._saveData(data)
 
+        if in_memory:
+            # Ordinarily, we are using record arrays, but in memory we want a 2-D array
+            self._appendToBuffer(util.from_record_array(data))
+            self._datapos = self._file.size()
+            self.cache.stored(self, self._dataBytes())
+
     def getData(self, limit, start, transpose, simpleOnly):
         if transpose:
             raise RuntimeError("Transpose specified for simple data format: not supported")
 
-        if limit is None:
-            data = self.data[start:]
+        if getattr(self, '_buf', None) is not None:
+            if limit is None:
+                data = self.data[start:]
+            else:
+                data = self.data[start:start+limit]
         else:
-            data = self.data[start:start+limit]
+            # read only the requested rows, and remember where they ended
+            offset, row = self._seekRow(start)
+            data, end = self._readRows(offset, limit)
+            if len(data):
+                self._lastRead = (start + len(data), end)
         # nrows should be zero for an empty row
         nrows = len(data) if data.size > 0 else 0
         return data, start + nrows
 
+    def getDataColumns(self, limit, start):
+        """Get up to limit rows as a tuple of contiguous column arrays."""
+        data, new_pos = self.getData(limit, start, False, False)
+        if new_pos == start:
+            columns = tuple(np.zeros((0,)) for _ in range(self.cols))
+        else:
+            columns = tuple(np.ascontiguousarray(data[:, i])
+                            for i in range(data.shape[1]))
+        return columns, new_pos
+
+    def getDataSlice(self, start, stop, step, columns):
+        """Get rows start, start+step, ... before stop for the given columns."""
+        if step < 1:
+            raise ValueError("step must be at least 1, not {}".format(step))
+        if columns is None:
+            columns = range(self.cols)
+        data = self._sliceRows(start, stop)
+        if data.size == 0:
+            return tuple(np.zeros((0,)) for _ in columns)
+        rows = data[::step]
+        return tuple(np.ascontiguousarray(rows[:, idx]) for idx in columns)
+
+    def __len__(self):
+        # an empty file is loaded as an array with one empty row
+        return len(self.data) if self.data.size > 0 else 0
+
     def hasMore(self, pos):
         # cheesy hack: if pos == 0, we only need to check whether
         # the filesize is nonzero
         if pos == 0:
             return os.path.getsize(self.filename) > 0
+        elif getattr(self, '_buf', None) is not None:
+            return pos < len(self)
         else:
-            nrows = len(self.data) if self.data.size > 0 else 0
-            return pos < nrows
+            offset, row = self._seekRow(pos)
+            return row == pos and offset < self._file.size()
 
 class HDF5MetaData(object):
     """Class to store metadata inside the file itself.
@@ -483,13 +1076,31 @@ class HDF5MetaData(object):
         ('Comment', h5py.special_dtype(vlen=str))
     ]
 
+    # h5py locks around each call, so data can be read and written from
+    # I/O threads, see executor.IOExecutor, while the file is held open
+    threadsafe = True
+    # rows were added since the length was last saved
+    unsaved = False
+
+    def hold(self):
+        self._file.hold()
+
+    def release(self):
+        self._file.release()
+
     def load(self):
-        """Load and save do nothing because HDF5 metadata is accessed live"""
+        """Load does nothing because HDF5 metadata is accessed live"""
         pass
 
     def save(self):
-        """Load and save do nothing because HDF5 metadata is accessed live"""
-        pass
+        """Save the number of rows written, see __len__.
+
+        Other metadata is accessed live, so it needs no saving.
+        """
+        if self.unsaved:
+            # cleared first, so that rows added meanwhile are saved next time
+            self.unsaved = False
+            self.dataset.attrs.modify('Length', len(self))
 
     @property
     def dtype(self):
@@ -504,7 +1115,7 @@ class HDF5MetaData(object):
         attrs['Access Time'] = t
         attrs['Modification Time'] = t
         attrs['Creation Time'] = t
-        attrs['Comments'] = np.ndarray((0,), dtype=self.comment_type)
+        self.setComments([])
 
         for idx, i in enumerate(indep):
             prefix = 'Independent{}.'.format(idx)
@@ -520,42 +1131,68 @@ class HDF5MetaData(object):
             attrs[prefix + 'shape'] = d.shape
             attrs[prefix + 'datatype'] = d.datatype
             attrs[prefix + 'unit'] = d.unit
+        self._invalidateMetadata()
 
-    def access(self):
-        self.dataset.attrs['Access Time'] = time.time()
+    def _invalidateMetadata(self):
+        """Forget cached column metadata, after the attributes were written."""
+        self._variables = None
+        self._rowType = None
+        self._transposeType = None
 
-    def getIndependents(self):
+    def _getVariables(self):
+        """Get (independents, dependents) parsed from the dataset attributes.
+
+        The attributes are read only once per backend instance, since they
+        only change in initialize_info.
+        """
+        cached = getattr(self, '_variables', None)
+        if cached is not None:
+            indeps, deps, reads = cached
+            metadata_stats.hits += 1
+            metadata_stats.reads_saved += reads
+            return indeps, deps
+        indeps, indep_reads = self._readVariables('Independent', Independent)
+        deps, dep_reads = self._readVariables('Dependent', Dependent)
+        reads = indep_reads + dep_reads
+        metadata_stats.misses += 1
+        metadata_stats.reads += reads
+        self._variables = (indeps, deps, reads)
+        return indeps, deps
+
+    def _readVariables(self, kind, cls):
+        """Read the variables of one kind, returning them with a count of reads."""
         attrs = self.dataset.attrs
         rv = []
+        reads = 0
         for idx in xrange(sys.maxint):
-            prefix = 'Independent{}.'.format(idx)
-            key = prefix + 'label'
-            if key in attrs:
-                label = attrs[prefix + 'label']
-                shape = attrs[prefix + 'shape']
-                datatype = attrs[prefix + 'datatype']
-                unit = attrs[prefix + 'unit']
-                rv.append(Independent(label, shape, datatype, unit))
-            else:
-                return rv
+            prefix = '{}{}.'.format(kind, idx)
+            reads += 1
+            if prefix + 'label' not in attrs:
+                return rv, reads
+            values = [attrs[prefix + field] for field in cls._fields]
+            reads += len(values)
+            rv.append(cls(*values))
+
+    def access(self):
+        self.dataset.attrs['Access Time'] = time.time()
+
+    def getIndependents(self):
+        return list(self._getVariables()[0])
 
     def getDependents(self):
-        attrs = self.dataset.attrs
-        rv = []
-        for idx in xrange(sys.maxint):
-            prefix = 'Dependent{}.'.format(idx)
-            key = prefix + 'label'
-            if key in attrs:
-                label = attrs[prefix + 'label']
-                legend = attrs[prefix + 'legend']
-                shape = attrs[prefix + 'shape']
-                datatype = attrs[prefix + 'datatype']
-                unit = attrs[prefix + 'unit']
-                rv.append(Dependent(label, legend, shape, datatype, unit))
-            else:
-                return rv
+        return list(self._getVariables()[1])
 
     def getRowType(self):
+        if getattr(self, '_rowType', None) is None:
+            self._rowType = self._makeRowType()
+        return self._rowType
+
+    def getTransposeType(self):
+        if getattr(self, '_transposeType', None) is None:
+            self._transposeType = self._makeTransposeType()
+        return self._transposeType
+
+    def _makeRowType(self):
         column_types = []
         for col in self.getIndependents() + self.getDependents():
             base_type = col.datatype
@@ -576,7 +1213,7 @@ class HDF5MetaData(object):
         type_tag = '*({})'.format(','.join(column_types))
         return type_tag
 
-    def getTransposeType(self):
+    def _makeTransposeType(self):
         column_type = []
         for col in self.getIndependents() + self.getDependents():
             base_type = col.datatype
@@ -625,25 +1262,242 @@ class HDF5MetaData(object):
         names = [str(k[6:]) for k in self.dataset.attrs if k.startswith('Param.')]
         return names
 
+    # Comments are kept in a resizable 'Comments' dataset next to the data,
+    # so that adding one does not rewrite the others.  Files written before
+    # that keep their comments in the 'Comments' attribute of the data.
+    # These are read from the attribute until the first comment is added,
+    # when they are copied to a new dataset.  Older servers and scripts
+    # only read the attribute, so it is kept, with the comments it held
+    # followed by COMMENTS_NOTE, telling their users where to find the
+    # others.
+
+    def _commentDataset(self, create=False):
+        """Get the comments dataset.
+
+        If the file has none, returns None, or if create is True, makes one
+        holding the comments from the legacy attribute.
+        """
+        dataset = self.dataset
+        if getattr(self, '_comments_of', None) is dataset:
+            return self._comments
+        group = dataset.parent
+        if 'Comments' in group:
+            comments = group['Comments']
+        elif create:
+            legacy = self._legacyComments()
+            comments = self._createCommentDataset(group, legacy)
+            self._setLegacyComments(legacy)
+        else:
+            return None
+        # cached while the dataset is, like the summary levels
+        self._comments = comments
+        self._comments_of = dataset
+        return comments
+
+    def _createCommentDataset(self, group, records):
+        comments = group.create_dataset('Comments', (len(records),),
+                                        dtype=self.comment_type,
+                                        maxshape=(None,), chunks=(COMMENT_CHUNK,))
+        if len(records):
+            comments[:] = records
+        return comments
+
+    def _legacyComments(self):
+        """Get the comments stored in the attribute of the data, if any."""
+        if 'Comments' in self.dataset.attrs:
+            return self.dataset.attrs['Comments']
+        return np.zeros((0,), dtype=self.comment_type)
+
+    def _setLegacyComments(self, records):
+        """Leave records and COMMENTS_NOTE in the attribute for older readers."""
+        note = np.array([(time.time(), 'Data Vault', COMMENTS_NOTE)],
+                        dtype=self.comment_type)
+        self.dataset.attrs.create('Comments', np.hstack((records, note)),
+                                  dtype=self.comment_type)
+
+    def setComments(self, comments):
+        """Replace all comments with a list of (timestamp, username, comment)."""
+        records = np.array([tuple(c) for c in comments], dtype=self.comment_type)
+        dataset = self.dataset
+        group = dataset.parent
+        if 'Comments' in group:
+            del group['Comments']
+        self._setLegacyComments(records[:0])
+        self._comments = self._createCommentDataset(group, records)
+        self._comments_of = dataset
+
     def addComment(self, user, comment):
         """Add a comment to the dataset."""
         t = time.time()
         new_comment = np.array([(t, user, comment)], dtype=self.comment_type)
-        old_comments = self.dataset.attrs['Comments']
-        data = np.hstack((old_comments, new_comment))
-        self.dataset.attrs.create('Comments', data, dtype=self.comment_type)
+        comments = self._commentDataset(create=True)
+        count = comments.shape[0]
+        comments.resize((count + 1,))
+        comments[count:] = new_comment
 
     def getComments(self, limit, start):
-        """Get comments in [(datetime, username, comment), ...] format."""
-        if limit is None:
-            raw_comments = self.dataset.attrs['Comments'][start:]
-        else:
-            raw_comments = self.dataset.attrs['Comments'][start:start+limit]
+        """Get comments in [(datetime, username, comment), ...] format.
+
+        Only the requested comments are read from the file.
+        """
+        comments = self._commentDataset()
+        if comments is None:
+            comments = self._legacyComments()
+        count = len(comments)
+        stop = count if limit is None else min(start + limit, count)
+        if start >= stop:
+            return [], start
+        raw_comments = comments[start:stop]
         comments = [(datetime.datetime.fromtimestamp(c[0]), str(c[1]), str(c[2])) for c in raw_comments]
         return comments, start+len(comments)
 
     def numComments(self):
-        return len(self.dataset.attrs['Comments'])
+        comments = self._commentDataset()
+        if comments is None:
+            return len(self._legacyComments())
+        return comments.shape[0]
+
+    # Rows are appended into storage that grows by doubling, so that adding
+    # one row at a time does not resize the dataset on every call.  The number
+    # of rows actually written is kept in memory while the file is open, and
+    # stored in the 'Length' attribute by save, which the Dataset calls a few
+    # seconds after rows are added, and when the file is closed, when the
+    # dataset is also truncated back to that length.  Files without a
+    # 'Length' attribute have no spare capacity.
+    #
+    # If the server stops without closing the file, the dataset may have
+    # more rows than 'Length', some of them written after the length was
+    # last saved and the others zeros.  These rows are dropped when the file
+    # is next opened for writing, so that older readers, which ignore
+    # 'Length', do not see the zeros.
+
+    def __len__(self):
+        """Get the number of rows written to the dataset."""
+        if getattr(self, '_length', None) is None:
+            dataset = self.dataset
+            length = int(dataset.attrs.get('Length', dataset.shape[0]))
+            if dataset.shape[0] > length and self.file.mode != 'r':
+                dataset.resize((length,))
+            self._length = length
+        return self._length
+
+    def hasMore(self, pos):
+        return pos < len(self)
+
+    @stats.timed('hdf5 write')
+    def _appendRows(self, data):
+        """Append rows from a numpy struct array, growing storage as needed."""
+        dataset = self.dataset
+        old_rows = len(self)
+        new_rows = old_rows + len(data)
+        capacity = dataset.shape[0]
+        if new_rows > capacity:
+            min_capacity = dataset.chunks[0] if dataset.chunks else 1
+            dataset.resize((max(new_rows, 2 * capacity, min_capacity),))
+        dataset[old_rows:new_rows] = data
+        self._length = new_rows
+        self.unsaved = True
+        levels = self.getSummaryLevels()
+        # the summary only changes when a bin of the lowest level is complete
+        if levels and old_rows // levels[0] != new_rows // levels[0]:
+            summary.update(self.file, dataset, old_rows, new_rows)
+
+    def createSummary(self, factors=summary.FACTORS):
+        """Add summary levels for the rows written so far."""
+        summary.rebuild(self.file, self.dataset, len(self), factors)
+        self._summary_file = None
+
+    def getSummaryLevels(self):
+        """Get the factors of the summary levels, or [] if there are none."""
+        f = self.file
+        if getattr(self, '_summary_file', None) is not f:
+            # cached while the file is open, like the dataset
+            self._summaryLevels = summary.levels(f)
+            self._summary_file = f
+        return self._summaryLevels
+
+    def getSummary(self, factor, start, stop):
+        """Get bins [start, stop) of a summary level.
+
+        Returns (columns, mins, maxs, means), where columns are the indices
+        of the summarized columns and the others are (bins, columns) arrays.
+        """
+        if factor not in self.getSummaryLevels():
+            raise errors.SummaryLevelNotFoundError(factor)
+        cols, bins = summary.read(self.file, self.dataset, len(self), factor,
+                                  start, stop)
+        return (cols,) + tuple(np.ascontiguousarray(bins[:, i])
+                               for i in (summary.MIN, summary.MAX, summary.MEAN))
+
+    @stats.timed('hdf5 read')
+    def _readRows(self, limit, start):
+        """Read up to limit written rows beginning at start."""
+        end = len(self)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.dataset[start:max(start, end)]
+
+    def getDataColumns(self, limit, start):
+        """Get up to limit rows as a tuple of columns.
+
+        The rows are read in one go, then each numeric column is copied into
+        a contiguous array that can be flattened without creating python
+        objects for each row.  String columns are returned as lists.
+        """
+        struct_data = self._readRows(limit, start)
+        columns = range(len(struct_data.dtype.names))
+        return self._toColumns(struct_data, columns), start + len(struct_data)
+
+    @stats.timed('hdf5 read')
+    def getDataSlice(self, start, stop, step, columns):
+        """Get rows start, start+step, ... before stop for the given columns.
+
+        Only the selected rows and fields are read from the file.  stop is
+        clamped to the length of the dataset, columns is a list of column
+        indices or None for all columns.
+        """
+        if step < 1:
+            raise ValueError("step must be at least 1, not {}".format(step))
+        names = self.dataset.dtype.names
+        if columns is None:
+            columns = range(len(names))
+        fields = [names[idx] for idx in columns]
+        start, stop, step = slice(start, stop, step).indices(len(self))
+        if stop <= start:
+            dtype = self.dataset.dtype
+            return tuple(self._toColumn(np.zeros((0,), dtype=dtype[idx]), idx)
+                         for idx in columns)
+        struct_data = self.dataset[(slice(start, stop, step),) + tuple(fields)]
+        if struct_data.dtype.names is None:
+            # h5py returns a plain array when a single field is selected
+            return (self._toColumn(struct_data, columns[0]),)
+        return tuple(self._toColumn(struct_data[name], idx)
+                     for idx, name in zip(columns, fields))
+
+    def _toColumns(self, struct_data, columns):
+        names = struct_data.dtype.names
+        return tuple(self._toColumn(struct_data[names[idx]], idx)
+                     for idx in columns)
+
+    def _toColumn(self, col, idx):
+        # h5py loses the vlen information when reading, see getDataTranspose
+        if self.dataset.dtype[idx] == np.object:
+            return col.tolist()
+        return np.ascontiguousarray(col)
+
+    def onClose(self, callback):
+        """Call callback before the data file is closed."""
+        self._file.onClose(callback)
+
+    def _onClose(self, fh):
+        """Save the length and drop unused capacity before the file is closed."""
+        if 'DataVault' not in self.file:
+            return # dataset was never initialized
+        self.save()
+        length = len(self)
+        if self.dataset.shape[0] > length:
+            self.dataset.resize((length,))
+        self._length = None
 
 class ExtendedHDF5Data(HDF5MetaData):
     """Dataset backed by HDF5 file
@@ -657,8 +1511,9 @@ class ExtendedHDF5Data(HDF5MetaData):
         if 'Version' not in self.file.attrs:
             self.file.attrs['Version'] = np.asarray([3, 0, 0], dtype=np.int32)
         self.version = np.asarray(self.file.attrs['Version'], np.int32)
+        fh.onClose(self._onClose)
 
-    def initialize_info(self, title, indep, dep):
+    def initialize_info(self, title, indep, dep, storage=None):
         """Initialize the columns when creating a new dataset"""
         dtype = []
         for idx, col in enumerate(indep + dep):
@@ -687,8 +1542,14 @@ class ExtendedHDF5Data(HDF5MetaData):
             else:
                 raise RuntimeError("Invalid type tag {}".format(ttag))
 
-        self.file.create_dataset('DataVault', (0,), dtype=dtype, maxshape=(None,))
+        profile = get_storage_profile(storage)
+        dataset = self.file.create_dataset('DataVault', (0,), dtype=dtype,
+                                           maxshape=(None,),
+                                           **_storage_kwargs(profile, dtype))
+        dataset.attrs['Length'] = 0
         HDF5MetaData.initialize_info(self, title, indep, dep)
+        if profile.summary:
+            self.createSummary()
 
     @property
     def file(self):
@@ -696,14 +1557,16 @@ class ExtendedHDF5Data(HDF5MetaData):
 
     @property
     def dataset(self):
-        return self.file["DataVault"]
+        f = self.file
+        if getattr(self, '_dataset_file', None) is not f:
+            # looking up the dataset is slow, so keep it while the file is open
+            self._dataset = f["DataVault"]
+            self._dataset_file = f
+        return self._dataset
 
     def addData(self, data):
         """Adds one or more rows or data from a numpy struct array."""
-        new_rows = len(data)
-        old_rows = self.dataset.shape[0]
-        self.dataset.resize((old_rows + new_rows,))
-        self.dataset[old_rows:(old_rows + new_rows)] = data
+        self._appendRows(data)
 
     def getData(self, limit, start, transpose, simpleOnly):
         """Get up to limit rows from a dataset."""
@@ -743,18 +1606,9 @@ class ExtendedHDF5Data(HDF5MetaData):
         return columns, new_pos
 
     def _getData(self, limit, start):
-        if limit is None:
-            struct_data = self.dataset[start:]
-        else:
-            struct_data = self.dataset[start:start+limit]
+        struct_data = self._readRows(limit, start)
         return struct_data, start + struct_data.shape[0]
 
-    def __len__(self):
-        return self.dataset.shape[0]
-
-    def hasMore(self, pos):
-        return pos < len(self)
-
 class SimpleHDF5Data(HDF5MetaData):
     """Basic dataset backed by HDF5 file.
 
@@ -768,13 +1622,21 @@ class SimpleHDF5Data(HDF5MetaData):
         if 'Version' not in self.file.attrs:
             self.file.attrs['Version'] = np.asarray([2, 0, 0], dtype=np.int32)
         self.version = np.asarray(self.file.attrs['Version'], dtype=np.int32)
+        fh.onClose(self._onClose)
 
-    def initialize_info(self, title, indep, dep):
+    def initialize_info(self, title, indep, dep, storage=None):
         ncol = len(indep) + len(dep)
         dtype = [('f{}'.format(idx), np.float64) for idx in range(ncol)]
+        profile = None
         if 'DataVault' not in self.file:
-            self.file.create_dataset('DataVault', (0,), dtype=dtype, maxshape=(None,))
+            profile = get_storage_profile(storage)
+            dataset = self.file.create_dataset('DataVault', (0,), dtype=dtype,
+                                               maxshape=(None,),
+                                               **_storage_kwargs(profile, dtype))
+            dataset.attrs['Length'] = 0
         HDF5MetaData.initialize_info(self, title, indep, dep)
+        if profile is not None and profile.summary:
+            self.createSummary()
 
     @property
     def file(self):
@@ -782,42 +1644,30 @@ class SimpleHDF5Data(HDF5MetaData):
 
     @property
     def dataset(self):
-        return self.file["DataVault"]
+        f = self.file
+        if getattr(self, '_dataset_file', None) is not f:
+            # looking up the dataset is slow, so keep it while the file is open
+            self._dataset = f["DataVault"]
+            self._dataset_file = f
+        return self._dataset
 
     def addData(self, data):
         """Adds one or more rows or data from a 2D array of floats."""
-        new_rows = data.shape[0]
-        old_rows = self.dataset.shape[0]
         #if data.shape[1] != len(self.dataset.dtype):
         #    raise errors.BadDataError(len(self.dataset.dtype), data.shape[1])
-
-        self.dataset.resize((old_rows + new_rows,))
-        #new_data = np.zeros((new_rows,), dtype=self.dataset.dtype)
-        #for col in range(data.shape[1]):
-        #    field = "f%d" % (col,)
-        #    new_data[field] = data[:,col]
-        self.dataset[old_rows:(old_rows + new_rows)] = data
+        self._appendRows(data)
 
     def getData(self, limit, start, transpose, simpleOnly):
         """Get up to limit rows from a dataset."""
         if transpose:
             raise RuntimeError("Transpose specified for simple data format: not supported")
-        if limit is None:
-            struct_data = self.dataset[start:]
-        else:
-            struct_data = self.dataset[start:start+limit]
+        struct_data = self._readRows(limit, start)
         columns = []
         for idx in range(len(struct_data.dtype)):
             columns.append(struct_data['f{}'.format(idx)])
         data = np.column_stack(columns)
         return data, start + data.shape[0]
 
-    def __len__(self):
-        return self.dataset.shape[0]
-
-    def hasMore(self, pos):
-        return pos < len(self)
-
 def open_hdf5_file(filename):
     """Factory for HDF5 files.  
 
@@ -832,14 +1682,19 @@ def open_hdf5_file(filename):
     else:
         return ExtendedHDF5Data(fh)
 
-def create_backend(filename, title, indep, dep, extended):
+def create_backend(filename, title, indep, dep, extended, storage=None):
+    """Create a new HDF5 dataset.
+
+    storage selects the on-disk layout of the data; it can be anything
+    accepted by get_storage_profile.
+    """
     hdf5_file = filename + '.hdf5'
     fh = SelfClosingFile(h5py.File, open_args=(hdf5_file, 'a'))
     if extended:
         data = ExtendedHDF5Data(fh)
     else:
         data = SimpleHDF5Data(fh)
-    data.initialize_info(title, indep, dep)
+    data.initialize_info(title, indep, dep, storage)
     return data
 
 def open_backend(filename):
@@ -0,0 +1,61 @@
+"""Benchmarks for the Data Vault.
+
+Each module in this package can be run as a script from the repository
+root, e.g. 'python -m datavault.benchmark.storage'.  The benchmarks write
+their scratch files to a temporary directory that is removed afterwards.
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+
+@contextlib.contextmanager
+def scratch_dir(prefix='dvbench_'):
+    """Context manager giving a temporary directory that is removed on exit."""
+    path = tempfile.mkdtemp(prefix=prefix)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def timeit(func, *args, **kw):
+    """Call func once and return (elapsed seconds, result)."""
+    start = time.time()
+    result = func(*args, **kw)
+    return time.time() - start, result
+
+
+def file_size(path):
+    """Size of a file on disk in bytes."""
+    return os.path.getsize(path)
+
+
+def print_table(headers, rows):
+    """Print rows of values as a simple aligned text table."""
+    cells = [[str(h) for h in headers]] + [[str(v) for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for row in cells:
+        print '  '.join(v.rjust(w) for v, w in zip(row, widths))
+
+
+class StubHub(object):
+    """Hub whose signals go nowhere."""
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+class MockContext(dict):
+    def __init__(self, name):
+        self.ID = name
+
+
+def new_context(dv, name='bench'):
+    """Make a context for calling the settings of a DataVault directly."""
+    c = MockContext((0, name))
+    dv.initContext(c)
+    return c
@@ -0,0 +1,68 @@
+"""One-row appends to HDF5 datasets: amortized growth vs. resize per call.
+
+Sweep scripts typically call 'add' once per point.  This compares the
+backend addData, which grows the dataset by doubling its capacity, with
+the previous addData, which looked up the dataset in the file and resized
+it by exactly the number of new rows on every call.
+
+Usage: python -m datavault.benchmark.append [rows ...]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from datavault import backend
+from datavault.benchmark import print_table, scratch_dir, timeit
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def _new_dataset(filename):
+    indep = [backend.Independent('x', (1,), 'v', 'V')]
+    dep = [backend.Dependent('y', '', (1,), 'v', 'A')]
+    return backend.create_backend(filename, 'bench', indep, dep, False)
+
+
+def append_amortized(filename, rows):
+    dataset = _new_dataset(filename)
+    row = np.zeros((1,), dtype=dataset.dtype)
+    for i in xrange(rows):
+        row[0] = (i, i)
+        dataset.addData(row)
+    return len(dataset)
+
+
+def append_resize_per_call(filename, rows):
+    dataset = _new_dataset(filename)
+    row = np.zeros((1,), dtype=dataset.dtype)
+    for i in xrange(rows):
+        row[0] = (i, i)
+        new_rows = len(row)
+        old_rows = dataset.file["DataVault"].shape[0]
+        dataset.file["DataVault"].resize((old_rows + new_rows,))
+        dataset.file["DataVault"][old_rows:(old_rows + new_rows)] = row
+    return dataset.file["DataVault"].shape[0]
+
+
+def run(sizes=DEFAULT_SIZES):
+    results = []
+    with scratch_dir() as path:
+        for rows in sizes:
+            for method in [append_resize_per_call, append_amortized]:
+                filename = os.path.join(path, '{}_{}'.format(method.__name__, rows))
+                elapsed, written = timeit(method, filename, rows)
+                assert written == rows
+                results.append((method.__name__, rows, '{:.2f}'.format(elapsed),
+                                int(rows / elapsed)))
+    return results
+
+
+def main(argv=sys.argv):
+    sizes = [int(a) for a in argv[1:]] or DEFAULT_SIZES
+    print_table(['method', 'rows', 'seconds', 'rows/s'], run(sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Latency of small reads while large reads run, with and without I/O threads.
+
+A few contexts each read a large HDF5 dataset with get, all at once, while
+another context reads a small dataset every INTERVAL seconds, like a
+client plotting live data while others load old datasets.  The settings
+are called directly on a DataVault in a running reactor, as the manager
+would call them.  Without an IOExecutor, the large reads run one after
+the other in the reactor thread and the small reads wait until they are
+all done.  With one, they run in its threads and the small reads are
+served in between, as long as there are more threads than large reads.
+
+We measure the wall time until all large reads are done, the latency of
+the small reads from the time they were due, and how late the reactor
+ran a timer meanwhile.  Each configuration runs in a fresh process, since
+a reactor can only be run once.
+
+Usage: python -m datavault.benchmark.concurrency [rows [readers]]
+"""
+
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+from twisted.internet import defer, reactor, task
+
+from datavault import SessionStore, server
+from datavault.benchmark import StubHub, new_context, print_table, scratch_dir
+from datavault.executor import IOExecutor
+
+DEFAULT_ROWS = 200000 # rows in each large dataset
+DEFAULT_READERS = 4 # contexts reading a large dataset each
+IO_THREADS = [0, 4, 10] # 0 does all I/O in the reactor thread
+INTERVAL = 0.01 # seconds between small reads and between timer ticks
+COLUMNS = 4
+
+
+def create_datasets(datadir, rows, readers):
+    """Write the large datasets and a small one, without I/O threads."""
+    store = SessionStore(datadir, StubHub())
+    dv = server.DataVault(store)
+    dv.initServer()
+    c = new_context(dv, 'setup')
+    for i in range(readers + 1):
+        dv.new_ex(c, 'data', [('x', [1], 'v', 's')],
+                  [('y', str(j), [1], 'v', 'V') for j in range(COLUMNS - 1)])
+        size = rows if i < readers else 10
+        block = np.random.normal(size=(min(size, 100000), COLUMNS))
+        for start in xrange(0, size, len(block)):
+            dv.add(c, block[:size - start])
+    store.flush()
+
+
+def percentiles(times):
+    times = np.asarray(times) * 1e3
+    return (round(np.median(times), 1), round(np.percentile(times, 99), 1),
+            round(times.max(), 1))
+
+
+def measure(datadir, io_threads, readers):
+    """Run the large and small reads in a reactor, return the results."""
+    io_executor = IOExecutor(threads=io_threads) if io_threads else None
+    store = SessionStore(datadir, StubHub(), io_executor=io_executor)
+    dv = server.DataVault(store)
+    dv.initServer()
+    big = [new_context(dv, 'big {}'.format(i)) for i in range(readers)]
+    for i, c in enumerate(big):
+        dv.open(c, i + 1)
+    small = new_context(dv, 'small')
+    dv.open(small, readers + 1)
+
+    results = {}
+    lags = []
+    latencies = []
+    ticks = {'last': None, 'reads': 0}
+
+    def tick():
+        now = time.time()
+        if ticks['last'] is not None:
+            lags.append(now - ticks['last'] - INTERVAL)
+        ticks['last'] = now
+
+    def read_small(count):
+        # count is the number of intervals since the last call, each of
+        # which was due for a read
+        done = defer.maybeDeferred(dv.get, small, None, True)
+        ticks['reads'] += count
+        due = [reader.starttime + (ticks['reads'] - i) * INTERVAL
+               for i in range(count)]
+        done.addCallback(lambda _: latencies.extend(time.time() - t for t in due))
+
+    @defer.inlineCallbacks
+    def run():
+        start = time.time()
+        reads = [defer.maybeDeferred(dv.get, c, None, True) for c in big]
+        yield defer.gatherResults(reads)
+        results['wall s'] = round(time.time() - start, 2)
+        # let the timers catch up on the intervals they missed
+        yield task.deferLater(reactor, 2 * INTERVAL, lambda: None)
+        timer.stop()
+        reader.stop()
+        yield store.flush()
+        if io_executor is not None:
+            io_executor.stop()
+        reactor.stop()
+
+    timer = task.LoopingCall(tick)
+    reader = task.LoopingCall.withCount(read_small)
+    timer.start(INTERVAL, now=False)
+    reader.start(INTERVAL, now=False)
+    # let the small reads start before the large ones arrive
+    reactor.callLater(2 * INTERVAL, run)
+    reactor.run()
+
+    results['io threads'] = io_threads
+    results['small reads'] = len(latencies)
+    (results['small p50 ms'], results['small p99 ms'],
+     results['small max ms']) = percentiles(latencies)
+    results['tick lag max ms'] = percentiles(lags)[2]
+    return results
+
+
+def _measure(args):
+    datadir, io_threads, readers = args
+    return measure(datadir, io_threads, readers)
+
+
+def run(rows=DEFAULT_ROWS, readers=DEFAULT_READERS, io_threads=IO_THREADS):
+    results = []
+    with scratch_dir() as path:
+        create_datasets(path, rows, readers)
+        for threads in io_threads:
+            pool = multiprocessing.Pool(1)
+            try:
+                results.append(pool.apply(_measure, ((path, threads, readers),)))
+            finally:
+                pool.close()
+                pool.join()
+    return results
+
+
+COLUMN_NAMES = ['io threads', 'wall s', 'small reads', 'small p50 ms',
+                'small p99 ms', 'small max ms', 'tick lag max ms']
+
+
+def main(argv=sys.argv[1:]):
+    rows = int(argv[0]) if argv else DEFAULT_ROWS
+    readers = int(argv[1]) if len(argv) > 1 else DEFAULT_READERS
+    print '{} contexts reading {} rows each with get'.format(readers, rows)
+    results = run(rows, readers)
+    print_table(COLUMN_NAMES, [[r[name] for name in COLUMN_NAMES]
+                               for r in results])
+
+
+if __name__ == '__main__':
+    main()
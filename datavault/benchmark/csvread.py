@@ -0,0 +1,124 @@
+"""Reading and appending to legacy CSV datasets.
+
+A CSV dataset with one independent and three dependent columns is
+written to a scratch directory, then read with CsvNumpyData.  For
+comparison, the previous reader, which parsed the whole file with
+np.loadtxt and grew the in-memory array with np.vstack on every add, is
+reproduced here.
+
+We report the time to load the whole file, to read a window of rows near
+the end of the file into a freshly opened dataset (once while the row
+index is built, and once more using the saved index), and the time per
+one-row add once the data is in memory.
+
+Usage: python -m datavault.benchmark.csvread [megabytes] [adds]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from datavault import backend
+from datavault.benchmark import file_size, print_table, scratch_dir, timeit
+
+BLOCK_ROWS = 100000
+
+
+def write_csv(filename, megabytes):
+    """Write a csv dataset of about the given size, return the number of rows."""
+    data = backend.CsvNumpyData(filename)
+    indep = [backend.Independent('x', (1,), 'v', 'V')]
+    dep = [backend.Dependent('y', str(i), (1,), 'v', 'A') for i in range(3)]
+    data.initialize_info('bench', indep, dep)
+    data.save()
+    rows = 0
+    random = np.random.RandomState(0)
+    with open(filename, 'wb') as f:
+        while f.tell() < megabytes * 1e6:
+            block = random.normal(size=(BLOCK_ROWS, 4))
+            block[:, 0] = np.arange(rows, rows + BLOCK_ROWS)
+            np.savetxt(f, block, fmt=backend.DATA_FORMAT, delimiter=',',
+                       newline='\r\n')
+            rows += BLOCK_ROWS
+    data._file.close()
+    return rows
+
+
+def open_csv(filename):
+    data = backend.CsvNumpyData(filename)
+    data.load()
+    return data
+
+
+def load_loadtxt(filename):
+    with open(filename) as f:
+        return np.loadtxt(f, delimiter=',')
+
+
+def load_streaming(filename):
+    return open_csv(filename).data
+
+
+def window_loadtxt(filename, start):
+    return load_loadtxt(filename)[start:start + 100]
+
+
+def window_streaming(filename, start):
+    data = open_csv(filename)
+    rows, _ = data.getData(100, start, False, False)
+    data._file.close()
+    return rows
+
+
+def add_vstack(data, adds):
+    array = data.data
+    for i in xrange(adds):
+        row = np.array([[i, 0.0, 1.0, 2.0]])
+        array = np.vstack((array, row))
+        data._saveData(row)
+    return array
+
+
+def add_streaming(data, adds):
+    row = np.zeros((1,), dtype=data.dtype)
+    for i in xrange(adds):
+        row[0] = (i, 0.0, 1.0, 2.0)
+        data.addData(row)
+    return data.data
+
+
+def run(megabytes=500, adds=200):
+    results = []
+    with scratch_dir() as path:
+        filename = os.path.join(path, 'bench.csv')
+        rows = write_csv(filename, megabytes)
+        size = file_size(filename)
+        for name, func, args in [
+                ('load (loadtxt)', load_loadtxt, (filename,)),
+                ('load (streaming)', load_streaming, (filename,)),
+                ('window at end (loadtxt)', window_loadtxt, (filename, rows - 100)),
+                ('window at end (streaming)', window_streaming, (filename, rows - 100)),
+                ('window at end (row index)', window_streaming, (filename, rows - 100))]:
+            elapsed, result = timeit(func, *args)
+            assert len(result) in (rows, 100)
+            results.append((name, rows, size, '{:.3f}'.format(elapsed)))
+        for name, func in [('add 1 row (vstack)', add_vstack),
+                           ('add 1 row (streaming)', add_streaming)]:
+            data = open_csv(filename)
+            data.data
+            elapsed, _ = timeit(func, data, adds)
+            data._file.close()
+            results.append((name, rows, size,
+                            '{:.2f} ms/add'.format(1e3 * elapsed / adds)))
+    return results
+
+
+def main(argv=sys.argv):
+    megabytes = float(argv[1]) if len(argv) > 1 else 500
+    adds = int(argv[2]) if len(argv) > 2 else 200
+    print_table(['operation', 'rows', 'bytes', 'seconds'], run(megabytes, adds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Converting added data to records in add, add_ex and add_ex_t.
+
+The add settings convert the data they are sent into a 1-D record array
+with the dtype of the dataset before it is written.  This times those
+conversions for a dataset of four float columns, for the data as
+pylabrad delivers it: a 2-D array for add, a list of tuples for add_ex
+and a tuple of column arrays for add_ex_t.  The previous conversions,
+which built records with fromarrays and fromrecords and converted
+records back to rows one row at a time for csv datasets, are reproduced
+here for comparison.  add_ex_t already copies whole columns with
+fromarrays and is unchanged; it is timed for reference.
+
+Usage: python -m datavault.benchmark.ingest [rows ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from datavault import util
+from datavault.benchmark import print_table
+
+DEFAULT_SIZES = [1, 100, 100000]
+COLUMNS = 4
+DTYPE = np.dtype([('f{}'.format(i), '<f8') for i in range(COLUMNS)])
+MIN_SECONDS = 0.2
+
+
+def add_old(data):
+    return np.core.records.fromarrays(data.T, dtype=DTYPE)
+
+
+def add_new(data):
+    return util.to_record_array(data, DTYPE)
+
+
+def add_ex_old(rows):
+    list_data = [tuple(row) for row in rows]
+    return np.core.records.fromrecords(list_data, dtype=DTYPE)
+
+
+def add_ex_new(rows):
+    return util.rows_to_record_array(rows, DTYPE)
+
+
+def add_ex_t(columns):
+    return np.core.records.fromarrays(columns, dtype=DTYPE)
+
+
+def csv_rows_old(records):
+    return np.vstack([np.array(tuple(row)) for row in records])
+
+
+def csv_rows_new(records):
+    return util.from_record_array(records)
+
+
+def per_call(func, arg):
+    """Seconds per call of func(arg), repeated for at least MIN_SECONDS."""
+    calls = 0
+    start = time.time()
+    while True:
+        func(arg)
+        calls += 1
+        elapsed = time.time() - start
+        if elapsed > MIN_SECONDS:
+            return elapsed / calls
+
+
+def run(sizes=DEFAULT_SIZES):
+    random = np.random.RandomState(0)
+    results = []
+    for rows in sizes:
+        data = random.normal(size=(rows, COLUMNS))
+        records = add_old(data)
+        cases = [('add', add_old, add_new, data),
+                 ('add_ex', add_ex_old, add_ex_new, [tuple(row) for row in data]),
+                 ('add_ex_t', add_ex_t, add_ex_t, tuple(data.T.copy())),
+                 ('csv rows', csv_rows_old, csv_rows_new, records)]
+        for name, old, new, arg in cases:
+            assert np.array_equal(old(arg), new(arg))
+            t_old = per_call(old, arg)
+            t_new = per_call(new, arg)
+            results.append((name, rows, '{:.1f}'.format(t_old * 1e6),
+                            '{:.1f}'.format(t_new * 1e6),
+                            '{:.1f}x'.format(t_old / t_new)))
+    return results
+
+
+def main(argv=sys.argv[1:]):
+    sizes = [int(a) for a in argv] or DEFAULT_SIZES
+    print_table(['path', 'rows', 'before us', 'after us', 'speedup'],
+                run(sizes))
+
+
+if __name__ == '__main__':
+    main()
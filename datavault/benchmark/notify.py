@@ -0,0 +1,98 @@
+"""Data available messages with many listeners on one dataset.
+
+A writer adds one row every millisecond while a number of listeners wait
+for data available messages and read to the end of the dataset a short
+while after each message, as plotters do.  This counts the messages sent
+with notifications on every write and with a notify interval, see
+Dataset.setNotifyInterval.  Time is simulated with a task.Clock, so the
+rates are per simulated second; the wall time is the cost of running the
+simulation, including the reads.
+
+Usage: python -m datavault.benchmark.notify [listeners]
+"""
+
+import sys
+import time
+
+import numpy as np
+from twisted.internet import task
+
+from datavault import SessionStore
+from datavault.benchmark import print_table, scratch_dir
+
+ADD_PERIOD = 0.001
+READ_LATENCY = 0.005
+SECONDS = 2.0
+
+
+class CountingHub(object):
+    """Hub that counts data available messages and makes listeners read."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.dataset = None
+        self.calls = 0
+        self.messages = 0
+        self.reads = 0
+
+    def onDataAvailable(self, data, contexts):
+        contexts = list(contexts)
+        self.calls += 1
+        self.messages += len(contexts)
+        for ctx in contexts:
+            self.clock.callLater(READ_LATENCY, self.read, ctx)
+
+    def read(self, ctx):
+        self.reads += 1
+        self.dataset.flush()
+        self.dataset.keepStreaming(ctx, len(self.dataset.data))
+
+    def __getattr__(self, name):
+        # other signals are not counted
+        return lambda *args: None
+
+
+def simulate(datadir, listeners, interval, seconds=SECONDS):
+    clock = task.Clock()
+    hub = CountingHub(clock)
+    store = SessionStore(datadir, hub, track_access=False)
+    session = store.get([''])
+    dataset = session.newDataset('notify {}'.format(interval),
+                                 ['x [s]'], ['y (amp) [V]'])
+    dataset.reactor = clock
+    dataset.setNotifyInterval(interval)
+    hub.dataset = dataset
+    for ctx in xrange(listeners):
+        dataset.keepStreaming(ctx, 0)
+
+    row = np.zeros((1,), dtype=dataset.data.dtype)
+    start = time.time()
+    for i in xrange(int(seconds / ADD_PERIOD)):
+        row[0] = (i, i)
+        dataset.addData(row)
+        clock.advance(ADD_PERIOD)
+    clock.advance(1)
+    elapsed = time.time() - start
+    return hub, elapsed
+
+
+def run(listeners=100, intervals=(0, 0.05)):
+    results = []
+    with scratch_dir() as path:
+        for interval in intervals:
+            hub, elapsed = simulate(path, listeners, interval)
+            results.append((interval, listeners, int(hub.calls / SECONDS),
+                            int(hub.messages / SECONDS), int(hub.reads / SECONDS),
+                            '{:.2f}'.format(elapsed)))
+    return results
+
+
+def main(argv=sys.argv[1:]):
+    listeners = int(argv[0]) if argv else 100
+    print_table(['interval', 'listeners', 'fan-outs/s', 'messages/s',
+                 'reads/s', 'wall s'],
+                run(listeners))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Ingest and query benchmarks for the Data Vault server.
+
+The settings of a DataVault are called directly, with a stub hub and
+mock contexts, as in test_server.py, against a SessionStore in a scratch
+directory.  We measure:
+
+  add        rows/s for add and add_ex_t, with a few rows per call
+  get        latency of get and get_ex_t of a whole dataset, for several
+             dataset sizes
+  dir        latency of dir in directories with many datasets, with the
+             listing cached and after it was invalidated
+  open       datasets opened per second when cycling through more
+             datasets than the file pool keeps open
+
+Each benchmark runs in a fresh process, so that it is not slowed down by
+what the previous ones left behind in h5py and the reactor.  Results are
+printed and, with --json, written to a file together with the versions of
+the software used, so that runs of different versions of the Data Vault
+can be compared.
+
+Usage: python -m datavault.benchmark.server [--quick] [--json FILE]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import h5py
+import numpy as np
+
+from datavault import SessionStore, backend, server
+from datavault.benchmark import StubHub, new_context, print_table, scratch_dir
+
+ADD_ROWS = [1, 100, 10000] # rows per call of add and add_ex_t
+GET_SIZES = [1000, 100000, 1000000] # rows in datasets read with get
+DIR_SIZES = [100, 1000] # datasets in directories listed with dir
+OPEN_DATASETS = 64 # datasets cycled through when opening ...
+OPEN_MAX_FILES = 16 # ... with this many files kept open
+MIN_SECONDS = 0.5 # time spent on each measurement
+COLUMNS = 4
+
+
+def new_vault(datadir):
+    store = SessionStore(datadir, StubHub())
+    dv = server.DataVault(store)
+    dv.initServer()
+    return store, dv
+
+
+def new_simple(dv, c, name):
+    dv.new(c, name, [('x', 's')],
+           [('y', str(i), 'V') for i in range(COLUMNS - 1)])
+
+
+def new_extended(dv, c, name):
+    dv.new_ex(c, name, [('x', [1], 'v', 's')],
+              [('y', str(i), [1], 'v', 'V') for i in range(COLUMNS - 1)])
+
+
+def repeat(func, min_seconds=MIN_SECONDS):
+    """Call func until min_seconds have passed, return the seconds per call."""
+    times = []
+    start = time.time()
+    while not times or time.time() - start < min_seconds:
+        t = time.time()
+        func()
+        times.append(time.time() - t)
+    return times
+
+
+def latency(times):
+    """Median and 90th percentile of times, in milliseconds."""
+    return {'median ms': round(np.median(times) * 1e3, 3),
+            'p90 ms': round(np.percentile(times, 90) * 1e3, 3),
+            'calls': len(times)}
+
+
+def bench_add(datadir, add_rows=ADD_ROWS):
+    store, dv = new_vault(datadir)
+    c = new_context(dv)
+    results = []
+    for rows in add_rows:
+        data = np.random.normal(size=(rows, COLUMNS))
+        columns = tuple(data.T.copy())
+        new_simple(dv, c, 'add {}'.format(rows))
+        times = repeat(lambda: dv.add(c, data))
+        results.append({'setting': 'add', 'rows per call': rows,
+                        'rows/s': int(rows * len(times) / sum(times))})
+        new_extended(dv, c, 'add_ex_t {}'.format(rows))
+        times = repeat(lambda: dv.add_ex_t(c, columns))
+        results.append({'setting': 'add_ex_t', 'rows per call': rows,
+                        'rows/s': int(rows * len(times) / sum(times))})
+    store.flush()
+    return results
+
+
+def bench_get(datadir, get_sizes=GET_SIZES):
+    store, dv = new_vault(datadir)
+    c = new_context(dv)
+    results = []
+    for size in get_sizes:
+        new_extended(dv, c, 'get {}'.format(size))
+        block = np.random.normal(size=(min(size, 100000), COLUMNS))
+        for start in xrange(0, size, len(block)):
+            dv.add(c, block[:size - start])
+        for name, get in [('get', dv.get), ('get_ex_t', dv.get_ex_t)]:
+            times = repeat(lambda: get(c, None, True))
+            result = {'setting': name, 'rows': size}
+            result.update(latency(times))
+            results.append(result)
+    store.flush()
+    return results
+
+
+def bench_dir(datadir, dir_sizes=DIR_SIZES):
+    store, dv = new_vault(datadir)
+    c = new_context(dv)
+    results = []
+    for size in dir_sizes:
+        dv.cd(c, 'dir {}'.format(size), True)
+        for i in xrange(size):
+            new_simple(dv, c, 'data')
+        session = dv.getSession(c)
+        # listings of directories changed within the mtime resolution
+        # are not cached, so make the directory look older
+        past = time.time() - 10
+        os.utime(session.dir, (past, past))
+        times = repeat(lambda: dv.dir(c))
+        result = {'datasets': size, 'listing': 'cached'}
+        result.update(latency(times))
+        results.append(result)
+        def uncached():
+            session.invalidateListing()
+            dv.dir(c)
+        result = {'datasets': size, 'listing': 'invalidated'}
+        result.update(latency(repeat(uncached)))
+        results.append(result)
+        dv.cd(c, 1)
+    store.flush()
+    return results
+
+
+def bench_open(datadir, datasets=OPEN_DATASETS, max_open=OPEN_MAX_FILES):
+    store, dv = new_vault(datadir)
+    c = new_context(dv)
+    names = []
+    for i in xrange(datasets):
+        new_simple(dv, c, 'open')
+        dv.add(c, np.zeros((10, COLUMNS)))
+        names.append(c['dataset'])
+    old_max_open = backend.file_pool.max_open
+    backend.file_pool.setMaxOpen(max_open)
+    misses = backend.file_pool.misses
+    state = {'next': 0}
+    def open_next():
+        dv.open(c, names[state['next'] % len(names)])
+        dv.get(c)
+        state['next'] += 1
+    try:
+        times = repeat(open_next)
+    finally:
+        backend.file_pool.setMaxOpen(old_max_open)
+    store.flush()
+    result = {'datasets': datasets, 'max open': max_open,
+              'opens/s': int(len(times) / sum(times)),
+              'files opened': backend.file_pool.misses - misses}
+    result.update(latency(times))
+    return [result]
+
+
+def versions():
+    """Versions of the code and libraries being benchmarked."""
+    info = {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'h5py': h5py.version.version,
+            'hdf5': h5py.version.hdf5_version,
+            'platform': platform.platform()}
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        info['commit'] = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=here,
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+
+def _run_bench(bench, args):
+    with scratch_dir() as path:
+        return bench(path, *args)
+
+
+def run(quick=False):
+    """Run all benchmarks and return the results as a dict."""
+    get_sizes = GET_SIZES[:-1] if quick else GET_SIZES
+    dir_sizes = DIR_SIZES[:1] if quick else DIR_SIZES
+    results = {'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'versions': versions()}
+    for name, bench, args in [('add', bench_add, ()),
+                              ('get', bench_get, (get_sizes,)),
+                              ('dir', bench_dir, (dir_sizes,)),
+                              ('open', bench_open, ())]:
+        pool = multiprocessing.Pool(1)
+        try:
+            results[name] = pool.apply(_run_bench, (bench, args))
+        finally:
+            pool.close()
+            pool.join()
+    return results
+
+
+def _print_results(results, name, columns):
+    print '{}:'.format(name)
+    print_table(columns, [[r[col] for col in columns] for r in results[name]])
+    print
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Data Vault server settings.')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the largest datasets and directories')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results to FILE as JSON')
+    args = parser.parse_args(argv)
+    results = run(args.quick)
+    _print_results(results, 'add', ['setting', 'rows per call', 'rows/s'])
+    _print_results(results, 'get', ['setting', 'rows', 'median ms', 'p90 ms'])
+    _print_results(results, 'dir', ['datasets', 'listing', 'median ms', 'p90 ms'])
+    _print_results(results, 'open', ['datasets', 'max open', 'opens/s',
+                                     'files opened'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Write throughput and on-disk size of HDF5 storage profiles.
+
+For each storage profile, a simple dataset with one independent and three
+dependent columns is written in batches, as a sweep script would do, and
+we report the write rate and the size of the resulting file.
+
+Usage: python -m datavault.benchmark.storage [rows] [batch rows]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from datavault import backend
+from datavault.benchmark import file_size, print_table, scratch_dir, timeit
+
+
+def sweep_data(rows):
+    """Data that looks like a slow sweep: a ramp and some noisy traces."""
+    x = np.linspace(0, 1, rows)
+    noise = np.random.RandomState(0).normal(scale=1e-3, size=(rows, 2))
+    y1 = np.sin(2 * np.pi * 5 * x)
+    y2 = np.round(x * 1e4) / 1e4
+    return np.column_stack((x, y1 + noise[:, 0], y2, noise[:, 1]))
+
+
+def write_dataset(filename, profile, data, batch):
+    indep = [backend.Independent('x', (1,), 'v', 'V')]
+    dep = [backend.Dependent('y', str(i), (1,), 'v', 'A') for i in range(3)]
+    dataset = backend.create_backend(filename, 'bench', indep, dep, False, profile)
+    for start in xrange(0, len(data), batch):
+        block = data[start:start + batch]
+        dataset.addData(np.core.records.fromarrays(block.T, dtype=dataset.dtype))
+    dataset.file.flush()
+    return dataset
+
+
+def run(rows=100000, batch=100):
+    data = sweep_data(rows)
+    results = []
+    with scratch_dir() as path:
+        for name in sorted(backend.STORAGE_PROFILES):
+            filename = os.path.join(path, name)
+            elapsed, _ = timeit(write_dataset, filename, name, data, batch)
+            size = file_size(filename + '.hdf5')
+            results.append((name, rows, batch, int(rows / elapsed), size,
+                            '{:.2f}'.format(float(size) / data.nbytes)))
+    return results
+
+
+def main(argv=sys.argv):
+    rows = int(argv[1]) if len(argv) > 1 else 100000
+    batch = int(argv[2]) if len(argv) > 2 else 100
+    results = run(rows, batch)
+    print_table(['profile', 'rows', 'batch', 'rows/s', 'bytes', 'ratio'], results)
+
+
+if __name__ == '__main__':
+    main()
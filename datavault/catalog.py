@@ -0,0 +1,290 @@
+"""A searchable catalog of the sessions and datasets in a data vault.
+
+The catalog is an SQLite database, by default catalog.sqlite in the root
+directory of the vault.  It holds, for each dataset, its session path,
+name, title, columns, parameter names and scalar values, tags, number of
+rows and creation and modification times, so that datasets can be found
+without walking the directory tree.
+
+The catalog is kept up to date by Session and Dataset as datasets are
+created, tagged and written to.  Changes are committed in batches, at
+most commit_delay seconds after they were made, and when flush is
+called.  Rows added to datasets are counted in memory until then.  The catalog only knows about datasets created while it was in
+use; others can be added with addDataset.
+
+The number of rows of a dataset is NULL if it is not known, as for csv
+datasets added by the crawler without reading the whole file.
+
+Session paths are stored as keys made by joining the filename-encoded
+directory names with '/', so that the key of a session is a prefix of
+the keys of the sessions below it.
+"""
+
+import sqlite3
+
+import numpy as np
+from twisted.internet import reactor
+
+from labrad import units as U
+
+from . import filename_decode, filename_encode
+
+CATALOG_FILE = 'catalog.sqlite'
+
+# How long changes may wait before they are committed to the database.
+COMMIT_DELAY = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    path TEXT PRIMARY KEY,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    name TEXT NOT NULL,
+    title TEXT,
+    rows INTEGER DEFAULT 0,
+    created REAL,
+    modified REAL,
+    UNIQUE (session, name)
+);
+CREATE INDEX IF NOT EXISTS datasets_created ON datasets (created);
+CREATE TABLE IF NOT EXISTS columns (
+    dataset INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT,
+    legend TEXT,
+    unit TEXT,
+    PRIMARY KEY (dataset, idx)
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    dataset INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    unit TEXT,
+    text TEXT,
+    PRIMARY KEY (dataset, name)
+);
+CREATE INDEX IF NOT EXISTS parameters_value ON parameters (name, value);
+CREATE TABLE IF NOT EXISTS tags (
+    session TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (session, kind, entry, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (kind, tag);
+"""
+
+_DATASET_ID = 'SELECT id FROM datasets WHERE session = ? AND name = ?'
+
+_HAS_TAG = """EXISTS (SELECT 1 FROM tags t WHERE t.session = d.session
+    AND t.kind = 'dataset' AND t.entry = d.name AND t.tag = ?)"""
+
+_HAS_PARAMETER = """EXISTS (SELECT 1 FROM parameters p WHERE p.dataset = d.id
+    AND p.name = ? AND p.value BETWEEN ? AND ?)"""
+
+
+def path_key(path):
+    """Get the catalog key of a session path like ['', 'foo', 'bar']."""
+    return '/'.join(filename_encode(p) for p in path)
+
+
+def key_path(key):
+    """Get the session path for a catalog key."""
+    return [filename_decode(p) for p in key.split('/')]
+
+
+def scalar(data):
+    """Get the (value, unit, text) stored in the catalog for a parameter.
+
+    Real numbers, with or without units, are stored as values, and strings
+    as text.  Other parameters are cataloged by name only.
+    """
+    if isinstance(data, basestring):
+        return None, None, data
+    if isinstance(data, U.WithUnit):
+        unit, data = str(data.unit), data._value
+    else:
+        unit = ''
+    if isinstance(data, (bool, int, long, float, np.bool_, np.integer, np.floating)):
+        return float(data), unit, None
+    return None, None, None
+
+
+class Catalog(object):
+    def __init__(self, filename, commit_delay=COMMIT_DELAY):
+        self.filename = filename
+        self.commit_delay = commit_delay
+        self.reactor = reactor
+        self._db = sqlite3.connect(filename)
+        self._db.text_factory = str
+        self._db.executescript(SCHEMA)
+        self._commitCall = None
+        self._rows = {} # (session, name) -> [rows added, modified] not written
+
+    def _execute(self, sql, args=()):
+        """Execute a statement that changes the catalog."""
+        cursor = self._db.execute(sql, args)
+        self._commitLater()
+        return cursor
+
+    def _commitLater(self):
+        if self._commitCall is None:
+            self._commitCall = self.reactor.callLater(self.commit_delay, self.flush)
+
+    def _writeRows(self):
+        """Write the row counts kept by addRows to the database."""
+        if self._rows:
+            rows, self._rows = self._rows, {}
+            self._db.executemany(
+                'UPDATE datasets SET rows = rows + ?, modified = ?'
+                ' WHERE session = ? AND name = ?',
+                [(count, modified, session, name)
+                 for (session, name), (count, modified) in rows.items()])
+
+    def flush(self):
+        """Commit pending changes to the database."""
+        if self._commitCall is not None:
+            if self._commitCall.active():
+                self._commitCall.cancel()
+            self._commitCall = None
+        self._writeRows()
+        self._db.commit()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def addSession(self, path, created):
+        """Add a session, unless it is already in the catalog."""
+        self._execute('INSERT OR IGNORE INTO sessions (path, created) VALUES (?, ?)',
+                      (path_key(path), created))
+
+    def addDataset(self, path, name, title, independents, dependents, created,
+                   modified=None, rows=0):
+        """Add a dataset, replacing any entry of the same name.
+
+        independents and dependents are lists of backend.Independent and
+        backend.Dependent.  Parameters are added with addParameters.
+        """
+        self.removeDataset(path, name)
+        session = path_key(path)
+        cursor = self._execute(
+            'INSERT INTO datasets (session, name, title, rows, created, modified)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (session, name, title, rows, created,
+             created if modified is None else modified))
+        dataset = cursor.lastrowid
+        columns = [(dataset, idx, 'independent', i.label, '', i.unit)
+                   for idx, i in enumerate(independents)]
+        columns += [(dataset, len(independents) + idx, 'dependent', d.label,
+                     d.legend, d.unit)
+                    for idx, d in enumerate(dependents)]
+        self._db.executemany('INSERT INTO columns VALUES (?, ?, ?, ?, ?, ?)',
+                             columns)
+
+    def removeDataset(self, path, name):
+        """Remove a dataset and its columns and parameters."""
+        session = path_key(path)
+        self._rows.pop((session, name), None)
+        for table in ['columns', 'parameters']:
+            self._execute('DELETE FROM {} WHERE dataset IN ({})'.format(table, _DATASET_ID),
+                          (session, name))
+        self._execute('DELETE FROM datasets WHERE session = ? AND name = ?',
+                      (session, name))
+
+    def addParameters(self, path, name, params):
+        """Add a list of (name, data) parameters to a dataset."""
+        self.addParameterValues(path, name, [(param,) + scalar(data)
+                                             for param, data in params])
+
+    def addParameterValues(self, path, name, values):
+        """Add parameters as a list of (name, value, unit, text), see scalar."""
+        session = path_key(path)
+        for param, value, unit, text in values:
+            self._execute(
+                'INSERT OR REPLACE INTO parameters (dataset, name, value, unit, text)'
+                ' SELECT id, ?, ?, ?, ? FROM datasets WHERE session = ? AND name = ?',
+                (param, value, unit, text, session, name))
+
+    def addRows(self, path, name, count, modified):
+        """Record that count rows were added to a dataset.
+
+        This is called for every add, so the counts are only kept in memory
+        until the changes are committed.
+        """
+        entry = self._rows.setdefault((path_key(path), name), [0, modified])
+        entry[0] += count
+        entry[1] = modified
+        self._commitLater()
+
+    def setTags(self, path, kind, entry, tags):
+        """Set the tags of an entry of a session.
+
+        kind is 'session' for a subdirectory or 'dataset' for a dataset.
+        """
+        session = path_key(path)
+        self._execute('DELETE FROM tags WHERE session = ? AND kind = ? AND entry = ?',
+                      (session, kind, entry))
+        self._db.executemany('INSERT INTO tags VALUES (?, ?, ?, ?)',
+                             [(session, kind, entry, tag) for tag in tags])
+
+    def search(self, title=None, tags=(), params=(), after=None, before=None,
+               path=None, limit=100, offset=0):
+        """Find datasets, returning a list of (session path, name).
+
+        title: only datasets with this in their title, ignoring case.
+        tags: only datasets with each tag, or without it for '-tag'.
+        params: list of (name, minimum, maximum), only datasets that have
+            each parameter with a real value in [minimum, maximum].
+        after, before: only datasets created in [after, before), in seconds
+            since the epoch.
+        path: only datasets in this session or sessions below it.
+
+        Results are sorted by session and name, and paged with limit and
+        offset.
+        """
+        where, args = [], []
+        if title:
+            where.append(r"d.title LIKE ? ESCAPE '\'")
+            escaped = title.replace('\\', r'\\').replace('%', r'\%').replace('_', r'\_')
+            args.append('%' + escaped + '%')
+        for tag in tags:
+            if tag[:1] == '-':
+                where.append('NOT ' + _HAS_TAG)
+                args.append(tag[1:])
+            else:
+                where.append(_HAS_TAG)
+                args.append(tag)
+        for name, minimum, maximum in params:
+            where.append(_HAS_PARAMETER)
+            args.extend([name, minimum, maximum])
+        if after is not None:
+            where.append('d.created >= ?')
+            args.append(after)
+        if before is not None:
+            where.append('d.created < ?')
+            args.append(before)
+        if path is not None:
+            key = path_key(path)
+            # keys of subsessions start with key + '/', and '0' follows '/'
+            where.append('(d.session = ? OR (d.session >= ? AND d.session < ?))')
+            args.extend([key, key + '/', key + '0'])
+        sql = 'SELECT d.session, d.name FROM datasets d'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY d.session, d.name LIMIT ? OFFSET ?'
+        args.extend([limit, offset])
+        self._writeRows()
+        return [(key_path(session), name)
+                for session, name in self._db.execute(sql, args)]
+
+    def getDataset(self, path, name):
+        """Get (title, rows, created, modified) of a dataset, or None."""
+        self._writeRows()
+        return self._db.execute(
+            'SELECT title, rows, created, modified FROM datasets'
+            ' WHERE session = ? AND name = ?', (path_key(path), name)).fetchone()
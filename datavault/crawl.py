@@ -0,0 +1,259 @@
+"""Add the existing datasets of a data vault to its catalog.
+
+The crawler walks the session directories of a vault and reads the
+metadata of every dataset: title, columns, parameters, number of rows
+and creation and modification times.  Only the ini file of csv datasets
+and the attributes of HDF5 datasets are read, not the data; the number
+of rows of a csv dataset is only known if its row index is up to date.
+Data files are opened read-only and closed as soon as they are read.
+
+Datasets are read in a pool of worker processes, a few hundred at a
+time, while the main process writes them to the catalog together with
+the sessions and tags.  Every CHECKPOINT_INTERVAL seconds the catalog is
+committed and the sessions that are complete are recorded in a
+checkpoint file, so that an interrupted crawl can be resumed.  Sessions
+with datasets that could not be read are not recorded, so that they are
+crawled again.  This includes HDF5 datasets that a running data vault in
+another process has open for writing, which HDF5 locks against readers.
+
+    python -m datavault.crawl [-j PROCESSES] [--checkpoint FILE] DIR
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import h5py
+
+from . import (backend, catalog, catalog_timestamp, filename_decode,
+               filename_encode, time_from_str, util)
+
+# Number of datasets read by a worker at a time.
+CHUNK_FILES = 256
+
+# Seconds between progress reports and checkpoints.
+CHECKPOINT_INTERVAL = 10.0
+
+Stats = collections.namedtuple('Stats', ['sessions', 'files', 'failed', 'seconds'])
+
+
+def find_sessions(datadir):
+    """Yield (path, directory) for each session in a vault, parents first."""
+    for dirpath, dirnames, filenames in os.walk(datadir):
+        dirnames[:] = sorted(d for d in dirnames if d.endswith('.dir'))
+        rel = os.path.relpath(dirpath, datadir)
+        parts = [] if rel == os.curdir else rel.split(os.sep)
+        yield [''] + [filename_decode(p[:-4]) for p in parts], dirpath
+
+
+def dataset_names(dirpath):
+    """Get the names of the datasets in a session directory."""
+    names = set()
+    for s in os.listdir(dirpath):
+        base, _, ext = s.rpartition('.')
+        if ext in ['csv', 'hdf5']:
+            names.add(filename_decode(base))
+    return sorted(names)
+
+
+def read_session(dirpath):
+    """Read (created, session tags, dataset tags) from a session.ini file."""
+    infofile = os.path.join(dirpath, 'session.ini')
+    if not os.path.exists(infofile):
+        return None, {}, {}
+    S = util.DVSafeConfigParser()
+    S.read(infofile)
+    created = catalog_timestamp(time_from_str(S.get('Information', 'Created')))
+    if S.has_section('Tags'):
+        return (created, eval(S.get('Tags', 'sessions', raw=True)),
+                eval(S.get('Tags', 'datasets', raw=True)))
+    return created, {}, {}
+
+
+class _HDF5Attributes(backend.HDF5MetaData):
+    """The metadata of an HDF5 dataset in a file opened read-only."""
+    def __init__(self, f):
+        self.file = f
+        self.dataset = f['DataVault']
+
+
+def read_dataset(dirpath, name):
+    """Read the metadata of a dataset.
+
+    Returns a dict with the arguments of Catalog.addDataset and the
+    parameter values for Catalog.addParameterValues.  Files are opened
+    read-only and outside the file pool, so that reading a dataset does
+    not change it or close the files of other datasets.
+    """
+    base = os.path.join(dirpath, filename_encode(name))
+    if os.path.exists(base + '.csv'):
+        data = backend.IniData()
+        data.infofile = base + '.ini'
+        data.load()
+        with open(base + '.csv', 'rb') as f:
+            rows = backend.RowIndex(base + '.idx').knownRows(f)
+        info = dict(title=data.title, created=catalog_timestamp(data.created),
+                    modified=catalog_timestamp(data.modified), rows=rows)
+        return _with_variables(info, data)
+    with h5py.File(base + '.hdf5', 'r') as f:
+        data = _HDF5Attributes(f)
+        attrs = data.dataset.attrs
+        info = dict(title=str(attrs['Title']),
+                    created=float(attrs['Creation Time']),
+                    modified=float(attrs['Modification Time']),
+                    rows=len(data))
+        return _with_variables(info, data)
+
+
+def _with_variables(info, data):
+    info.update(independents=data.getIndependents(),
+                dependents=data.getDependents(),
+                params=[(param,) + catalog.scalar(data.getParameter(param))
+                        for param in data.getParamNames()])
+    return info
+
+
+def _read_chunk(args):
+    """Read datasets in a worker, returning (path, [(name, info, error)])."""
+    path, dirpath, names = args
+    results = []
+    for name in names:
+        try:
+            results.append((name, read_dataset(dirpath, name), None))
+        except Exception:
+            results.append((name, None, traceback.format_exc()))
+    return path, results
+
+
+def load_checkpoint(filename):
+    """Get the catalog keys of the sessions recorded as done."""
+    if filename is None or not os.path.exists(filename):
+        return set()
+    with open(filename) as f:
+        return set(json.load(f)['done'])
+
+
+def save_checkpoint(filename, done):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'done': sorted(done)}, f)
+    if os.path.exists(filename):
+        os.remove(filename)
+    os.rename(tmp, filename)
+
+
+def _report(files, start):
+    elapsed = time.time() - start
+    print '{} datasets, {:.0f} files/s'.format(files, files / max(elapsed, 1e-9))
+
+
+def crawl(datadir, cat, processes=None, checkpoint=None, report=_report,
+          chunk_files=CHUNK_FILES):
+    """Add all sessions and datasets in datadir to the catalog cat.
+
+    Sessions recorded in the checkpoint file, if given, are skipped.
+    report(files, start time) is called every CHECKPOINT_INTERVAL seconds.
+    Returns Stats with the number of sessions and datasets added, the
+    number of datasets that could not be read, and the time taken.
+    """
+    start = time.time()
+    done = load_checkpoint(checkpoint)
+    remaining = {} # session key -> number of chunks not read yet
+    incomplete = set() # keys of sessions with datasets that failed
+    sessions = collections.OrderedDict()
+    tasks = []
+    for path, dirpath in find_sessions(datadir):
+        key = catalog.path_key(path)
+        if key in done:
+            continue
+        sessions[key] = (path, dirpath)
+        names = dataset_names(dirpath)
+        chunks = [names[i:i + chunk_files] for i in xrange(0, len(names), chunk_files)]
+        remaining[key] = len(chunks)
+        tasks.extend((path, dirpath, chunk) for chunk in chunks)
+
+    def finish_session(key):
+        path, dirpath = sessions[key]
+        created, session_tags, dataset_tags = read_session(dirpath)
+        cat.addSession(path, created)
+        for entry, tags in session_tags.items():
+            cat.setTags(path, 'session', entry, sorted(tags))
+        for entry, tags in dataset_tags.items():
+            cat.setTags(path, 'dataset', entry, sorted(tags))
+        if key not in incomplete:
+            done.add(key)
+
+    for key, chunks in remaining.items():
+        if not chunks:
+            finish_session(key)
+
+    files = failed = 0
+    last_checkpoint = time.time()
+    pool = None
+    if processes == 1 or len(tasks) <= 1:
+        results = (_read_chunk(t) for t in tasks)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_read_chunk, tasks)
+    try:
+        for path, chunk in results:
+            for name, info, error in chunk:
+                files += 1
+                if error is not None:
+                    print '{}: failed\n{}'.format('/'.join(path + [name]), error)
+                    failed += 1
+                    incomplete.add(catalog.path_key(path))
+                    continue
+                params = info.pop('params')
+                cat.addDataset(path, name, **info)
+                cat.addParameterValues(path, name, params)
+            key = catalog.path_key(path)
+            remaining[key] -= 1
+            if not remaining[key]:
+                finish_session(key)
+            if time.time() - last_checkpoint > CHECKPOINT_INTERVAL:
+                cat.flush()
+                if checkpoint is not None:
+                    save_checkpoint(checkpoint, done)
+                if report is not None:
+                    report(files, start)
+                last_checkpoint = time.time()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    cat.flush()
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, done)
+    return Stats(len(sessions), files, failed, time.time() - start)
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Add the datasets in a Data Vault directory to its catalog.')
+    parser.add_argument('root', metavar='DIR')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: one per cpu)')
+    parser.add_argument('--catalog', default=None,
+                        help='catalog file (default: DIR/{})'.format(catalog.CATALOG_FILE))
+    parser.add_argument('--checkpoint', default=None,
+                        help='file to record progress in, to resume an interrupted crawl')
+    args = parser.parse_args(argv)
+    filename = args.catalog or os.path.join(args.root, catalog.CATALOG_FILE)
+    cat = catalog.Catalog(filename)
+    try:
+        stats = crawl(args.root, cat, args.processes, args.checkpoint)
+    finally:
+        cat.close()
+    print 'Cataloged {} datasets in {} sessions in {:.1f} s ({:.0f} files/s), {} failed'.format(
+        stats.files - stats.failed, stats.sessions, stats.seconds,
+        stats.files / max(stats.seconds, 1e-9), stats.failed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Decimated views of datasets for plotting.
+
+A decimated view splits the range of values of an independent column
+into at most `points` bins of equal width and reduces the rows falling
+in each bin to one or two rows.  Binning by value rather than by row
+keeps the bins evenly spaced on the plot when the sweep is not, e.g.
+for sweeps with a finer step around a feature, or sweeping back and
+forth.  Bins without rows are left out, and rows whose independent
+value is NaN are ignored.
+
+The data is read twice, first the independent column to find its range,
+then all columns, in chunks of whole rows through the backend
+getDataSlice method, so memory use is bounded by the chunk size and the
+number of points, not by the size of the dataset.
+
+The modes are:
+
+stride: the first row of each bin.
+mean: the mean of each column over each bin.
+minmax: two rows per bin, holding the minimum and the maximum of each
+    column over the bin.  Plotting both rows draws the envelope of the
+    data, so that narrow peaks are not lost as with stride or mean.
+
+Like the summary levels, NaN values, often stored for failed points, are
+left out of the mean, minimum and maximum, which are NaN only for bins
+without other values.
+"""
+
+import numpy as np
+
+MODES = ('stride', 'mean', 'minmax')
+
+# Number of rows read from the backend at a time.
+CHUNK_ROWS = 65536
+
+
+def iter_chunks(data, rows, columns, chunk_rows=CHUNK_ROWS):
+    """Iterate over float column arrays for chunks of rows of data.
+
+    If rows is None, chunks are read until the end of the data.
+    """
+    start = 0
+    while rows is None or start < rows:
+        stop = start + chunk_rows
+        if rows is not None:
+            stop = min(stop, rows)
+        chunk = data.getDataSlice(start, stop, 1, columns)
+        cols = [np.asarray(col, dtype=np.float64) for col in chunk]
+        if len(cols[0]):
+            yield cols
+        if len(cols[0]) < stop - start:
+            break
+        start = stop
+
+
+def value_range(data, rows, column, chunk_rows=CHUNK_ROWS):
+    """Get the (min, max) of the values of a column, or None if all are NaN."""
+    lo, hi = np.inf, -np.inf
+    for col, in iter_chunks(data, rows, [column], chunk_rows):
+        col = col[~np.isnan(col)]
+        if len(col):
+            lo = min(lo, col.min())
+            hi = max(hi, col.max())
+    if lo > hi:
+        return None
+    return lo, hi
+
+
+def bin_index(x, lo, hi, points):
+    """Index of the bin of each value of x, for points bins from lo to hi.
+
+    The last bin includes hi.  The result is NaN where x is NaN.
+    """
+    if hi <= lo:
+        return np.where(np.isnan(x), np.nan, 0.0)
+    with np.errstate(invalid='ignore'):
+        return np.minimum(np.floor((x - lo) * (points / (hi - lo))), points - 1)
+
+
+def _binned(chunks, lo, hi, points):
+    """Iterate over (bin indices, columns) with the rows sorted by bin.
+
+    Rows with a NaN independent value are dropped; rows in the same bin
+    keep their order.
+    """
+    for cols in chunks:
+        b = bin_index(cols[0], lo, hi, points)
+        keep = ~np.isnan(b)
+        if not keep.any():
+            continue
+        order = np.argsort(b[keep], kind='mergesort')
+        yield (b[keep][order].astype(np.intp),
+               [col[keep][order] for col in cols])
+
+
+def _bin_starts(bins):
+    """The bins present in sorted bins, and the offsets at which each starts."""
+    starts = np.flatnonzero(np.diff(bins)) + 1
+    starts = np.concatenate(([0], starts))
+    return bins[starts], starts
+
+
+def _nan_extreme(col, starts, reduce, fill):
+    """Reduce col over the runs beginning at starts, ignoring NaN values."""
+    nan = np.isnan(col)
+    out = reduce.reduceat(np.where(nan, fill, col), starts)
+    out[np.logical_and.reduceat(nan, starts)] = np.nan
+    return out
+
+
+def decimate(data, rows, columns, points, mode, chunk_rows=CHUNK_ROWS):
+    """Compute a decimated view of rows of data for the given columns.
+
+    data can be any backend with a getDataSlice method, and rows may be
+    None to read all of its rows.  The rows are binned by the values of
+    the first of columns.  Returns a tuple of float arrays, one per
+    column.
+    """
+    if mode not in MODES:
+        raise ValueError("Unknown decimation mode '{}', expected one of {}"
+                         .format(mode, ', '.join(MODES)))
+    if points < 1:
+        raise ValueError("points must be at least 1, not {}".format(points))
+    span = value_range(data, rows, columns[0], chunk_rows)
+    if span is None:
+        return tuple(np.zeros((0,)) for _ in columns)
+    lo, hi = span
+    chunks = _binned(iter_chunks(data, rows, columns, chunk_rows),
+                     lo, hi, points)
+    seen = np.zeros(points, dtype=bool)
+
+    if mode == 'stride':
+        out = np.full((len(columns), points), np.nan)
+        for bins, cols in chunks:
+            present, starts = _bin_starts(bins)
+            new = ~seen[present]
+            for i, col in enumerate(cols):
+                out[i, present[new]] = col[starts[new]]
+            seen[present] = True
+        return tuple(out[:, seen])
+
+    if mode == 'mean':
+        sums = np.zeros((len(columns), points))
+        counts = np.zeros((len(columns), points))
+        for bins, cols in chunks:
+            seen[bins] = True
+            for i, col in enumerate(cols):
+                nan = np.isnan(col)
+                sums[i] += np.bincount(bins, np.where(nan, 0.0, col), points)
+                counts[i] += np.bincount(bins, ~nan, points)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return tuple(sums[:, seen] / counts[:, seen])
+
+    mins = np.full((len(columns), points), np.nan)
+    maxs = np.full((len(columns), points), np.nan)
+    for bins, cols in chunks:
+        present, starts = _bin_starts(bins)
+        seen[present] = True
+        for i, col in enumerate(cols):
+            # np.fmin and np.fmax keep the value that is not NaN
+            mins[i, present] = np.fmin(
+                    mins[i, present], _nan_extreme(col, starts, np.minimum, np.inf))
+            maxs[i, present] = np.fmax(
+                    maxs[i, present], _nan_extreme(col, starts, np.maximum, -np.inf))
+    return tuple(np.column_stack((low, high)).ravel()
+                 for low, high in zip(mins[:, seen], maxs[:, seen]))
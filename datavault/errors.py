@@ -1,5 +1,7 @@
 from labrad import types as T
 
+from . import decimate
+
 class NoDatasetError(T.Error):
     """Please open a dataset first."""
     code = 2
@@ -46,3 +48,40 @@ class DataVersionMismatchError(T.Error):
     code = 11
     def __init__(self):
         self.msg = "Dataset was created with newer API, cannot be read.  Use get_ex"
+
+class BadStorageProfileError(T.Error):
+    code = 12
+    def __init__(self, spec):
+        self.msg = "Invalid storage profile '{0}'.".format(spec)
+
+class ColumnNotFoundError(T.Error):
+    code = 13
+    def __init__(self, column):
+        self.msg = "Column '{0}' not found.".format(column)
+
+class AmbiguousColumnError(T.Error):
+    code = 14
+    def __init__(self, column):
+        self.msg = "Column name '{0}' matches more than one column.".format(column)
+
+class NonNumericColumnError(T.Error):
+    code = 15
+    def __init__(self, column):
+        self.msg = "Column '{0}' is not a scalar real number column.".format(column)
+
+class BadDecimationError(T.Error):
+    code = 16
+    def __init__(self, points, mode):
+        self.msg = ("Cannot decimate to {0} points with mode '{1}'.  Points must "
+                    "be at least 1 and the mode one of {2}.").format(
+                        points, mode, ', '.join(decimate.MODES))
+
+class SummaryLevelNotFoundError(T.Error):
+    code = 17
+    def __init__(self, factor):
+        self.msg = "Dataset has no summary level with factor {0}.".format(factor)
+
+class CatalogDisabledError(T.Error):
+    code = 18
+    def __init__(self):
+        self.msg = "This data vault does not keep a catalog of datasets."
@@ -0,0 +1,93 @@
+"""Running blocking file I/O of the Data Vault outside the reactor thread.
+
+An IOExecutor runs functions in a pool of threads.  Calls are serialized
+by key, normally the path of the file they use: a call starts only once
+the earlier calls with the same key have finished, while calls with
+different keys can run at the same time.  Results are delivered as
+Deferreds in the reactor thread.
+
+The functions run in the threads must not touch state that is owned by
+the reactor thread, such as delayed calls, signals and listeners.  Data
+files used in a thread are held open with SelfClosingFile.hold, so that
+they are not closed by the file pool or the idle timeout meanwhile.
+"""
+
+from __future__ import absolute_import
+
+from twisted.internet import defer, reactor, threads
+from twisted.python import threadpool
+
+# Threads are started as needed.  A call waits for a free thread, so a
+# small read can wait for large reads when they take all the threads.
+DEFAULT_THREADS = 10
+
+
+class IOExecutor(object):
+    """Runs calls in a pool of threads, one call per key at a time."""
+    def __init__(self, threads=DEFAULT_THREADS, reactor=reactor):
+        self.reactor = reactor
+        self.pool = threadpool.ThreadPool(0, threads, name='datavault-io')
+        self.pool.start()
+        self._locks = {} # key -> DeferredLock of keys in use
+        self._shutdownID = reactor.addSystemEventTrigger(
+                'during', 'shutdown', self._shutdown)
+
+    def __len__(self):
+        """Get the number of keys with calls running or waiting."""
+        return len(self._locks)
+
+    def run(self, key, func, *args, **kw):
+        """Call func(*args, **kw) in a thread, after earlier calls for key.
+
+        Returns a Deferred that fires with the result of func.
+        """
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = defer.DeferredLock()
+        d = lock.run(threads.deferToThreadPool, self.reactor, self.pool,
+                     func, *args, **kw)
+        return d.addBoth(self._done, key, lock)
+
+    def _done(self, result, key, lock):
+        # forget locks that are not in use, so keys do not pile up
+        if not lock.locked and not lock.waiting and self._locks.get(key) is lock:
+            del self._locks[key]
+        return result
+
+    def stop(self):
+        """Stop the threads, after the calls already running finish."""
+        if self._shutdownID is not None:
+            self.reactor.removeSystemEventTrigger(self._shutdownID)
+            self._shutdownID = None
+            self.pool.stop()
+
+    def _shutdown(self):
+        # the trigger running now cannot be removed
+        if self._shutdownID is not None:
+            self._shutdownID = None
+            self.pool.stop()
+
+
+def then(result, func, *args):
+    """Call func(result, *args), once result has fired if it is a Deferred.
+
+    This lets code work both with and without an IOExecutor, returning a
+    plain value when it is called without one.
+    """
+    if isinstance(result, defer.Deferred):
+        return result.addCallback(func, *args)
+    return func(result, *args)
+
+
+def gather(results):
+    """Get a Deferred for the Deferreds among results, or None if there are none.
+
+    The Deferred fires with None when they have all fired, or fails with
+    the first failure.
+    """
+    pending = [r for r in results if isinstance(r, defer.Deferred)]
+    if not pending:
+        return None
+    d = defer.gatherResults(pending, consumeErrors=True)
+    d.addErrback(lambda f: f.value.subFailure)
+    return d.addCallback(lambda _: None)
@@ -0,0 +1,201 @@
+"""Convert legacy csv datasets to HDF5.
+
+Each csv dataset (name.csv with its metadata in name.ini) is converted
+to a simple HDF5 dataset name.hdf5 with the same title, variables,
+parameters and comments.  Conversion happens in two steps:
+
+convert: write the data and metadata to name.hdf5.tmp, then rename it to
+    name.hdf5.  This is the slow part, and runs in a process pool.  The
+    size of the csv file that was converted is stored in the HDF5 file.
+commit: if the csv file has not changed since it was converted, rename
+    name.csv and name.ini to name.csv.migrated and name.ini.migrated.
+
+Since open_backend prefers the csv file while it exists, a dataset stays
+readable under its name at every point of the migration, and the
+directory listing shows it once.  Migration can be interrupted at any
+point and run again: leftover temporary files are discarded, and
+converted datasets that were not committed yet are committed.
+
+Run this from the command line only while no data vault is serving the
+directory; a running data vault can migrate its datasets with the
+'migrate' setting instead:
+
+    python -m datavault.migrate [-j PROCESSES] [--storage PROFILE] DIR
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import h5py
+import numpy as np
+from twisted.internet import task
+
+from . import backend
+
+TMP_SUFFIX = '.hdf5.tmp'
+MIGRATED_SUFFIX = '.migrated'
+SIZE_ATTR = 'Migrated CSV Size'
+
+# Number of csv rows converted at a time.
+BLOCK_ROWS = 65536
+
+
+def find_datasets(root, recursive=True):
+    """Get the csv datasets in root as paths without extension."""
+    bases = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        names = set(filenames)
+        for name in sorted(names):
+            if name.endswith('.csv') and name[:-4] + '.ini' in names:
+                bases.append(os.path.join(dirpath, name[:-4]))
+        if not recursive:
+            break
+        dirnames.sort()
+    return bases
+
+
+def _iter_blocks(csv_file, size):
+    """Parse the first size bytes of a csv file in blocks of rows."""
+    with open(csv_file, 'rb') as f:
+        tail = ''
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(backend.CSV_READ_BLOCK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            text = tail + chunk
+            end = text.rfind('\n') + 1
+            text, tail = text[:end], text[end:]
+            if text:
+                yield backend._parse_csv_lines(text)
+        if tail.strip():
+            yield backend._parse_csv_lines(tail + '\n')
+
+
+def convert(base, storage=None):
+    """Convert the csv dataset base to base.hdf5.
+
+    Returns the path of the HDF5 file.  Does nothing if a converted file
+    is already there.
+    """
+    hdf5_file = base + '.hdf5'
+    tmp_file = base + TMP_SUFFIX
+    if os.path.exists(hdf5_file):
+        with h5py.File(hdf5_file, 'r') as f:
+            if SIZE_ATTR not in f.attrs:
+                raise IOError('{} exists and was not made by migration'.format(hdf5_file))
+        return hdf5_file
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    ini = backend.IniData()
+    ini.infofile = base + '.ini'
+    ini.load()
+    size = os.path.getsize(base + '.csv')
+
+    # convert runs in worker threads and processes, so the file must not
+    # use the reactor or the file pool of the server
+    fh = backend.SelfClosingFile(h5py.File, open_args=(tmp_file, 'w'),
+                                 reactor=task.Clock(), pool=backend.FilePool())
+    try:
+        data = backend.SimpleHDF5Data(fh)
+        data.initialize_info(ini.title, ini.independents, ini.dependents, storage)
+        for block in _iter_blocks(base + '.csv', size):
+            for start in xrange(0, len(block), BLOCK_ROWS):
+                rows = block[start:start + BLOCK_ROWS]
+                data.addData(np.core.records.fromarrays(rows.T, dtype=data.dtype))
+        for param in ini.parameters:
+            data.addParam(param['label'], param['data'])
+        data.setComments([(_timestamp(t), user, comment)
+                          for t, user, comment in ini.comments])
+        attrs = data.dataset.attrs
+        attrs['Creation Time'] = _timestamp(ini.created)
+        attrs['Modification Time'] = _timestamp(ini.modified)
+        attrs['Access Time'] = _timestamp(ini.accessed)
+        data.file.attrs[SIZE_ATTR] = size
+    finally:
+        fh.close()
+    os.rename(tmp_file, hdf5_file)
+    return hdf5_file
+
+
+def _timestamp(dt):
+    return time.mktime(dt.timetuple()) + dt.microsecond * 1e-6
+
+
+def commit(base):
+    """Retire the csv files of a converted dataset.
+
+    Returns False, and removes the converted file, if the csv file
+    changed after it was converted.
+    """
+    hdf5_file = base + '.hdf5'
+    with h5py.File(hdf5_file, 'r') as f:
+        size = f.attrs[SIZE_ATTR]
+    if os.path.getsize(base + '.csv') != size:
+        os.remove(hdf5_file)
+        return False
+    os.rename(base + '.csv', base + '.csv' + MIGRATED_SUFFIX)
+    os.rename(base + '.ini', base + '.ini' + MIGRATED_SUFFIX)
+    if os.path.exists(base + '.idx'):
+        os.remove(base + '.idx')
+    return True
+
+
+def _convert(args):
+    """Convert a dataset in a worker, returning (base, error message or None)."""
+    base, storage = args
+    try:
+        convert(base, storage)
+        return base, None
+    except Exception:
+        return base, traceback.format_exc()
+
+
+def convert_all(bases, processes=None, storage=None):
+    """Convert datasets, using a pool of processes unless processes is 1.
+
+    Returns a list of (base, error), where error is None if the dataset
+    was converted, or the traceback of the failure.
+    """
+    work = [(base, storage) for base in bases]
+    if processes == 1 or len(work) <= 1:
+        return [_convert(w) for w in work]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_convert, work, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Convert csv datasets in a Data Vault directory to HDF5.')
+    parser.add_argument('root', metavar='DIR')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: one per cpu)')
+    parser.add_argument('--storage', default=None,
+                        help='storage profile for the HDF5 files')
+    args = parser.parse_args(argv)
+    storage = backend.get_storage_profile(args.storage)
+    bases = find_datasets(args.root)
+    print 'Converting {} datasets'.format(len(bases))
+    migrated = 0
+    for base, error in convert_all(bases, args.processes, storage):
+        if error is not None:
+            print '{}: failed\n{}'.format(base, error)
+        elif commit(base):
+            migrated += 1
+        else:
+            print '{}: changed during conversion, skipped'.format(base)
+    print 'Migrated {} of {} datasets'.format(migrated, len(bases))
+
+
+if __name__ == '__main__':
+    main()
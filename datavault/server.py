@@ -2,12 +2,38 @@ from __future__ import absolute_import
 
 import collections
 
+from twisted.internet import defer, threads
 from twisted.internet.defer import inlineCallbacks
 import twisted.internet.task
 import numpy as np
 from labrad.server import LabradServer, Signal, setting
 
-from . import errors
+from . import backend, errors, executor, migrate, stats, util
+
+
+class TimedSetting(object):
+    """A setting that records the time taken by each request it handles.
+
+    Everything but handleRequest is passed through to the wrapped setting,
+    so it is registered with the manager like the setting itself.
+    """
+    def __init__(self, setting):
+        self._setting = setting
+        self._statName = 'setting: {}'.format(setting.name)
+
+    def __getattr__(self, name):
+        return getattr(self._setting, name)
+
+    def handleRequest(self, server, c, data):
+        return stats.timings.call(self._statName, self._setting.handleRequest,
+                                  server, c, data)
+
+
+class TimedSignal(Signal):
+    """A signal that records the time taken to send each message."""
+    def __call__(self, *args, **kw):
+        return stats.timings.call(self.name, Signal.__call__, self,
+                                  *args, **kw)
 
 
 class DataVault(LabradServer):
@@ -19,19 +45,44 @@ class DataVault(LabradServer):
         self.session_store = session_store
 
         # session signals
-        self.onNewDir = Signal(543617, 'signal: new dir', 's')
-        self.onNewDataset = Signal(543618, 'signal: new dataset', 's')
-        self.onTagsUpdated = Signal(543622, 'signal: tags updated', '*(s*s)*(s*s)')
+        self.onNewDir = TimedSignal(543617, 'signal: new dir', 's')
+        self.onNewDataset = TimedSignal(543618, 'signal: new dataset', 's')
+        self.onTagsUpdated = TimedSignal(543622, 'signal: tags updated', '*(s*s)*(s*s)')
 
         # dataset signals
-        self.onDataAvailable = Signal(543619, 'signal: data available', '')
-        self.onNewParameter = Signal(543620, 'signal: new parameter', '')
-        self.onCommentsAvailable = Signal(543621, 'signal: comments available', '')
+        self.onDataAvailable = TimedSignal(543619, 'signal: data available', '')
+        self.onNewParameter = TimedSignal(543620, 'signal: new parameter', '')
+        self.onCommentsAvailable = TimedSignal(543621, 'signal: comments available', '')
+        self.onDataPushed = TimedSignal(543623, 'signal: data pushed', '?')
+
+    def _findSettingHandlers(self):
+        """Find all settings, and time the requests to each of them."""
+        handlers = LabradServer._findSettingHandlers(self)
+        return [h if isinstance(h, Signal) else TimedSetting(h)
+                for h in handlers]
 
     def initServer(self):
         # create root session
         _root = self.session_store.get([''])
 
+    def stopServer(self):
+        """Write out buffered data and pending changes before shutting down."""
+        pending = []
+        for session in self.session_store.get_all():
+            for dataset in session.datasets.values():
+                pending.append(dataset.flush())
+        io_executor = self.session_store.io_executor
+        if io_executor is None:
+            self.session_store.flush()
+            return
+        d = executor.gather(pending) or defer.succeed(None)
+        def stop(result):
+            # saves the length of the datasets written in I/O threads
+            self.session_store.flush()
+            io_executor.stop()
+            return result
+        return d.addBoth(stop)
+
     def contextKey(self, c):
         """The key used to identify a given context for notifications"""
         return c.ID
@@ -55,6 +106,7 @@ class DataVault(LabradServer):
                 removeFromList(dataset.listeners)
                 removeFromList(dataset.param_listeners)
                 removeFromList(dataset.comment_listeners)
+                dataset.stopStream(key)
 
     def getSession(self, c):
         """Get a session object for the current path."""
@@ -66,6 +118,23 @@ class DataVault(LabradServer):
             raise errors.NoDatasetError()
         return c['datasetObj']
 
+    def stopStreaming(self, c):
+        """Stop pushing data from the current dataset to a context."""
+        if 'datasetObj' in c:
+            c['datasetObj'].stopStream(self.contextKey(c))
+
+    def readPosition(self, c, dataset, startOver):
+        """Get the row to read from next, after any rows pushed to c."""
+        if startOver:
+            return 0
+        return dataset.streamPosition(self.contextKey(c), c['filepos'])
+
+    def readDone(self, result, c, dataset):
+        """Move the read position of c past the rows read, and return them."""
+        data, c['filepos'] = result
+        dataset.keepStreaming(self.contextKey(c), c['filepos'])
+        return data
+
     @setting(5, returns=['*s'])
     def dump_existing_sessions(self, c):
         return ['/'.join(session.path)
@@ -79,10 +148,10 @@ class DataVault(LabradServer):
         if isinstance(tagFilters, str):
             tagFilters = [tagFilters]
         sess = self.getSession(c)
-        dirs, datasets = sess.listContents(tagFilters)
+        listing = sess.listContents(tagFilters)
         if includeTags:
-            dirs, datasets = sess.getTags(dirs, datasets)
-        return dirs, datasets
+            return executor.then(listing, lambda found: sess.getTags(*found))
+        return listing
 
     @setting(7, path=['{get current directory}',
                       's{change into this directory}',
@@ -144,11 +213,21 @@ class DataVault(LabradServer):
         _sess = self.session_store.get(path) # make the new directory
         return path
 
+    def getStorageProfile(self, storage):
+        """Get the storage profile for a new dataset.
+
+        If no storage is specified, the default for this data vault is used.
+        """
+        if storage is None:
+            return self.session_store.storage_profile
+        return backend.get_storage_profile(storage)
+
     @setting(9, name='s',
                 independents=['*s', '*(ss)'],
                 dependents=['*s', '*(sss)'],
+                storage=['s', '(wswb)', '(wswbb)'],
                 returns='(*s{path}, s{name})')
-    def new(self, c, name, independents, dependents):
+    def new(self, c, name, independents, dependents, storage=None):
         """Create a new Dataset.
 
         Independent and dependent variables can be specified either
@@ -159,9 +238,19 @@ class DataVault(LabradServer):
         axis label that can be shared among traces, while legend is
         a legend entry that should be unique for each trace.
         Returns the path and name for this dataset.
+
+        The optional storage argument selects the on-disk layout of the
+        data.  It can be the name of a storage profile ('default', 'legacy',
+        'lzf', 'gzip', 'gzip:<level>' or 'timeseries') or a cluster of
+        (chunk rows, compression, compression level, shuffle[, summary]).
+        Profiles with summary set keep summary levels for get_summary.  If
+        omitted, the storage profile configured for this data vault is used.
         """
         session = self.getSession(c)
-        dataset = session.newDataset(name or 'untitled', independents, dependents)
+        profile = self.getStorageProfile(storage)
+        dataset = session.newDataset(name or 'untitled', independents, dependents,
+                                     storage=profile)
+        self.stopStreaming(c)
         c['dataset'] = dataset.name # not the same as name; has number prefixed
         c['datasetObj'] = dataset
         c['filepos'] = 0 # start at the beginning
@@ -172,8 +261,9 @@ class DataVault(LabradServer):
     @setting(1009, name='s', 
              independents='*(s*iss)',
              dependents='*(ss*iss)',
+             storage=['s', '(wswb)', '(wswbb)'],
              returns=['*ss'])
-    def new_ex(self, c, name, independents, dependents):
+    def new_ex(self, c, name, independents, dependents, storage=None):
         """Create a new extended dataset
 
         Independents are specified as: (label, shape, type, unit)
@@ -199,9 +289,14 @@ class DataVault(LabradServer):
         code.  The name and parameters will be there, but no actual data.
 
         The legacy format requires each column be a scalar v[unit] type.
+
+        storage selects the on-disk layout of the data, as in new().
         """
         session = self.getSession(c)
-        dataset = session.newDataset(name, independents, dependents, extended=True)
+        profile = self.getStorageProfile(storage)
+        dataset = session.newDataset(name, independents, dependents, extended=True,
+                                     storage=profile)
+        self.stopStreaming(c)
         c['dataset'] = dataset.name # not the same as name; has number prefixed
         c['datasetObj'] = dataset
         c['filepos'] = 0 # start at the beginning
@@ -218,6 +313,7 @@ class DataVault(LabradServer):
         """
         session = self.getSession(c)
         dataset = session.openDataset(name)
+        self.stopStreaming(c)
         c['dataset'] = dataset.name # not the same as name; has number prefixed
         c['datasetObj'] = dataset
         c['filepos'] = 0
@@ -253,10 +349,8 @@ class DataVault(LabradServer):
         if not c['writing']:
             raise errors.ReadOnlyError()
         data = np.atleast_2d(np.asarray(data))
-        # fromarrays is faster than fromrecords, and when we have a simple 2-D array
-        # we can just transpose the array.
-        rec_data = np.core.records.fromarrays(data.T, dtype=dataset.data.dtype)
-        dataset.addData(rec_data)
+        # a simple 2-D array can be viewed as records without copying
+        return dataset.addData(util.to_record_array(data, dataset.data.dtype))
 
     @setting(1020, data='?', returns='')
     def add_ex(self, c, data):
@@ -272,8 +366,7 @@ class DataVault(LabradServer):
         dataset = self.getDataset(c)
         if not c['writing']:
             raise errors.ReadOnlyError()
-        list_data = [tuple(row) for row in data]
-        dataset.addData(np.core.records.fromrecords(list_data, dtype=dataset.data.dtype))
+        return dataset.addData(util.rows_to_record_array(data, dataset.data.dtype))
 
     @setting(2020, data='?', returns='')
     def add_ex_t(self, c, data):
@@ -286,7 +379,65 @@ class DataVault(LabradServer):
         dataset = self.getDataset(c)
         if not c['writing']:
             raise errors.ReadOnlyError()
-        dataset.addData(np.core.records.fromarrays(data, dtype=dataset.data.dtype))
+        return dataset.addData(
+                np.core.records.fromarrays(data, dtype=dataset.data.dtype))
+
+    @setting(1030, 'write buffer', rows='w', delay='v', max_bytes='w',
+                   returns='')
+    def write_buffer(self, c, rows=0, delay=1.0, max_bytes=16*1024*1024):
+        """Buffer rows added to the current dataset before writing them.
+
+        Rows added with add, add_ex or add_ex_t are held in memory and
+        written to disk in batches: once rows rows or max_bytes bytes are
+        buffered, delay seconds after the first buffered row was added,
+        when the data file is closed, or when data is read.  Readers in
+        any context see buffered rows as if they had been written.
+        Listeners are notified of new data when the buffer is written.
+        Passing rows=0 (the default) turns buffering off.
+        """
+        dataset = self.getDataset(c)
+        dataset.setWriteBuffer(rows, delay, max_bytes)
+
+    @setting(1031, 'notify interval', interval='v', returns='')
+    def notify_interval(self, c, interval=0.05):
+        """Coalesce data available messages for the current dataset.
+
+        Listeners in all contexts are sent at most one data available
+        message every interval seconds, however often rows are added,
+        and still at most one message between calls to get.  Passing
+        interval=0 sends messages as soon as rows are written.
+        """
+        dataset = self.getDataset(c)
+        dataset.setNotifyInterval(interval)
+
+    @setting(1040, 'stream data', rows='w', window='w', returns='')
+    def stream_data(self, c, rows=1000, window=4):
+        """Push rows added to the current dataset to this context.
+
+        Rows added after the current read position are sent to this
+        context with 'signal: data pushed' as (w{start row}, ?{columns}),
+        with one list or array per column as returned by get_arrays,
+        instead of a data available message.  At most rows rows are sent in one message;
+        if more were added since the last message, only the last rows of
+        them are sent, and the start row tells which were skipped.  Up to
+        window messages may be sent before they are acknowledged with
+        stream_ack.  A context that falls further behind is sent a single
+        data available message, and rows are pushed to it again once it
+        has read to the end of the dataset with get.  Passing rows=0
+        stops pushing.
+        """
+        dataset = self.getDataset(c)
+        key = self.contextKey(c)
+        if rows:
+            dataset.startStream(key, c['filepos'], rows, window)
+        else:
+            dataset.stopStream(key)
+
+    @setting(1041, 'stream ack', count='w', returns='')
+    def stream_ack(self, c, count=None):
+        """Acknowledge count messages pushed to this context, or all of them."""
+        dataset = self.getDataset(c)
+        dataset.ackStream(self.contextKey(c), count)
 
     @setting(21, limit='w', startOver='b', returns='*2v')
     def get(self, c, limit=None, startOver=False):
@@ -299,11 +450,9 @@ class DataVault(LabradServer):
         in this context is returned.
         """
         dataset = self.getDataset(c)
-        c['filepos'] = 0 if startOver else c['filepos']
-        data, c['filepos'] = dataset.getData(limit, c['filepos'], simpleOnly=True)
-        key = self.contextKey(c)
-        dataset.keepStreaming(key, c['filepos'])
-        return data
+        c['filepos'] = self.readPosition(c, dataset, startOver)
+        result = dataset.getData(limit, c['filepos'], simpleOnly=True)
+        return executor.then(result, self.readDone, c, dataset)
 
     @setting(1021, limit='w', startOver='b', returns='?')
     def get_ex(self, c, limit=None, startOver=False):
@@ -315,11 +464,9 @@ class DataVault(LabradServer):
         performance.
         """
         dataset = self.getDataset(c)
-        c['filepos'] = 0 if startOver else c['filepos']
-        data, c['filepos'] = dataset.getData(limit, c['filepos'], transpose=False)
-        ctx = self.contextKey(c)
-        dataset.keepStreaming(ctx, c['filepos'])
-        return data
+        c['filepos'] = self.readPosition(c, dataset, startOver)
+        result = dataset.getData(limit, c['filepos'], transpose=False)
+        return executor.then(result, self.readDone, c, dataset)
 
     @setting(2021, limit='w', startOver='b', returns='?')
     def get_ex_t(self, c, limit=None, startOver=False):
@@ -333,11 +480,162 @@ class DataVault(LabradServer):
         code.
         """
         dataset = self.getDataset(c)
-        c['filepos'] = 0 if startOver else c['filepos']
-        data, c['filepos'] = dataset.getData(limit, c['filepos'], transpose=True)
-        ctx = self.contextKey(c)
-        dataset.keepStreaming(ctx, c['filepos'])
-        return data
+        c['filepos'] = self.readPosition(c, dataset, startOver)
+        result = dataset.getData(limit, c['filepos'], transpose=True)
+        return executor.then(result, self.readDone, c, dataset)
+
+    @setting(3021, limit='w', startOver='b', returns='?')
+    def get_arrays(self, c, limit=None, startOver=False):
+        """Get data from the current dataset as a cluster of column arrays.
+
+        Like get_ex_t, this returns one list per column, but each numeric
+        column is sent as a single contiguous array instead of being
+        built up row by row, which is much faster for large datasets.
+        String columns are returned as lists of strings.  This works for
+        datasets of any version.
+        """
+        dataset = self.getDataset(c)
+        c['filepos'] = self.readPosition(c, dataset, startOver)
+        result = dataset.getDataColumns(limit, c['filepos'])
+        return executor.then(result, self.readDone, c, dataset)
+
+    @setting(3022, start='w', stop='w', step='w', columns=['*w', '*s'], returns='?')
+    def get_slice(self, c, start=0, stop=None, step=1, columns=None):
+        """Get a range of rows and a subset of columns from the current dataset.
+
+        Returns rows start, start+step, ... up to but not including stop,
+        or the end of the dataset if stop is not given.  columns is a list
+        of column indices or names; independents are named by label, and
+        dependents by label, legend or 'label (legend)'.  If not given, all
+        columns are returned.
+
+        The data is returned as a cluster of columns, as for get_arrays.
+        Only the selected rows and columns are read from disk.  Unlike the
+        other get settings, this does not move the read position of the
+        context or register it for data notifications.
+        """
+        dataset = self.getDataset(c)
+        return dataset.getDataSlice(start, stop, step, columns)
+
+    @setting(3023, points='w', mode='s', independent=['w', 's'], returns='?')
+    def get_decimated(self, c, points, mode='minmax', independent=0):
+        """Get a decimated view of the current dataset for plotting.
+
+        The range of values of the independent column is split into at
+        most points bins of equal width, and the rows in each bin are
+        reduced according to mode, ignoring NaN values:
+
+        'stride': the first row of each bin.
+        'mean': the mean of each column over the bin.
+        'minmax': two rows per bin, with the minimum and the maximum of
+            each column over the bin.  This is the default, since it keeps
+            narrow peaks visible.
+
+        Returns a cluster of columns, as for get_arrays: the independent
+        given by index or label, followed by all dependents, with one
+        or two rows for each bin that has rows, in order of the
+        independent.  Only datasets with real scalar columns can be
+        decimated.  Like get_slice, this does not move the read position
+        of the context.
+        """
+        dataset = self.getDataset(c)
+        return dataset.getDecimated(independent, points, mode)
+
+    @setting(3024, returns='*w')
+    def summary_levels(self, c):
+        """Get the bin sizes of the summary levels of the current dataset.
+
+        Datasets created with a storage profile that has summaries enabled
+        (e.g. 'timeseries') keep the min, max and mean of each scalar real
+        column over bins of consecutive rows, for a few bin sizes.  Returns
+        an empty list if the dataset has no summary.
+        """
+        dataset = self.getDataset(c)
+        return dataset.getSummaryLevels()
+
+    @setting(3025, factor='w', start='w', stop='w', returns='?')
+    def get_summary(self, c, factor, start=0, stop=None):
+        """Get bins [start, stop) of a summary level of the current dataset.
+
+        factor is the bin size of the level, see summary_levels.  Bin i
+        summarizes rows factor*i up to factor*(i+1); the last bin may be
+        partial.  Returns (columns, min, max, mean), where columns are
+        the indices of the summarized columns and min, max and mean are
+        2-D arrays with one row per bin and one column per summarized
+        column.  This does not move the read position of the context.
+        """
+        dataset = self.getDataset(c)
+        return dataset.getSummary(factor, start, stop)
+
+    @setting(510, 'migrate', recursive='b', returns='(www)')
+    def migrate_datasets(self, c, recursive=True):
+        """Convert the legacy csv datasets in the current directory to HDF5.
+
+        The datasets keep their names, parameters and comments, and stay
+        readable while they are converted.  If recursive is True (the
+        default), subdirectories are converted as well.  The conversion
+        runs in the background, one dataset at a time in a single thread:
+        forking worker processes from a server with open HDF5 files is
+        not safe.  Use python -m datavault.migrate to convert many
+        datasets in parallel while no data vault is running.  Datasets
+        that are open in some context, or that change while they are
+        converted, are skipped and can be migrated by calling this again
+        later.
+
+        Returns the number of datasets migrated, skipped and failed.
+        """
+        session = self.getSession(c)
+        open_files = self.session_store.openDatasetFiles()
+        found = migrate.find_datasets(session.dir, recursive)
+        bases = [base for base in found if base not in open_files]
+        d = threads.deferToThread(migrate.convert_all, bases, 1,
+                                  self.session_store.storage_profile)
+        d.addCallback(self._commitMigrated, len(found) - len(bases))
+        return d
+
+    def _commitMigrated(self, results, skipped):
+        """Commit converted datasets, unless they were opened meanwhile."""
+        migrated = failed = 0
+        open_files = self.session_store.openDatasetFiles()
+        for base, error in results:
+            if error is not None:
+                print 'Failed to migrate {}:\n{}'.format(base, error)
+                failed += 1
+            elif base in open_files or not migrate.commit(base):
+                skipped += 1
+            else:
+                migrated += 1
+        return migrated, skipped, failed
+
+    @setting(520, 'search', title='s', tags='*s', params='*(svv)', after='v',
+                  before='v', below='b', limit='w', offset='w',
+                  returns='*(*s{path}, s{name})')
+    def search(self, c, title='', tags=[], params=[], after=None, before=None,
+               below=False, limit=100, offset=0):
+        """Find datasets anywhere in the data vault.
+
+        Only datasets matching all of the given criteria are returned:
+        title: title contains this string, ignoring case.
+        tags: has each tag, or does not have it if prefixed with '-'.
+        params: list of (name, minimum, maximum); has each parameter
+            with a real value in [minimum, maximum], in the units it was
+            stored with.
+        after, before: created in [after, before), in seconds since the
+            epoch.
+        below: in the current directory or a directory below it.
+
+        Returns (path, name) for each dataset, sorted by path and name.
+        Use limit and offset to get the results a page at a time.  This
+        requires the data vault to keep a catalog of datasets, which is
+        turned on with the 'Catalog' registry key and only holds datasets
+        created while it was kept, unless datavault.crawl adds the others.
+        """
+        catalog = self.session_store.catalog
+        if catalog is None:
+            raise errors.CatalogDisabledError()
+        path = c['path'] if below else None
+        return catalog.search(title, tags, params, after, before, path,
+                              limit, offset)
 
     @setting(100, returns='(*(ss){independents}, *(sss){dependents})')
     def variables(self, c):
@@ -453,6 +751,69 @@ class DataVault(LabradServer):
         dataset.keepStreamingComments(key, c['commentpos'])
         return comments
 
+    @setting(500, 'file pool', max_open='w', returns='*(sw)')
+    def file_pool(self, c, max_open=None):
+        """Get statistics for the pool of open data files.
+
+        Returns (name, value) pairs giving the number of open files, the
+        maximum number of open files, and counts of accesses to files that
+        were already open (hits), of files that had to be opened (misses)
+        and of files closed to stay under the maximum (evictions).  If
+        max_open is given, the maximum number of open files is changed.
+        """
+        if max_open is not None:
+            backend.file_pool.setMaxOpen(max_open)
+        return backend.file_pool.stats()
+
+    @setting(501, 'metadata cache', returns='*(sw)')
+    def metadata_cache(self, c):
+        """Get statistics for the cache of HDF5 column metadata.
+
+        Returns (name, value) pairs giving the number of column metadata
+        lookups served from memory (hits) and read from the file
+        (misses), the number of attribute reads done, and the number of
+        attribute reads saved by the cache.
+        """
+        return backend.metadata_stats.stats()
+
+    @setting(502, 'data cache', max_bytes='w',
+                  returns='*(sw){stats}, *(sw){datasets}')
+    def data_cache(self, c, max_bytes=None):
+        """Get statistics for the csv data held in memory.
+
+        Returns (name, value) pairs giving the number of csv datasets
+        with data in memory, the bytes they use, the maximum number of
+        bytes, and the number of datasets whose data was released to stay
+        under the maximum, followed by (file name, bytes) for each dataset
+        with data in memory, most recently used first.  If max_bytes is
+        given, the maximum is changed.
+        """
+        if max_bytes is not None:
+            backend.data_cache.setMaxBytes(max_bytes)
+        return backend.data_cache.stats(), backend.data_cache.residents()
+
+    @setting(503, 'stats', enable='b', reset='b', dump_interval='v',
+                  returns='*(swvvvv)')
+    def timing_stats(self, c, enable=None, reset=False, dump_interval=None):
+        """Get statistics of the time taken by settings and file operations.
+
+        Returns (name, count, mean, p50, p99, max) for each setting, for
+        reading and writing HDF5 and csv data, saving ini files, listing
+        directories and sending each signal, with times in milliseconds.
+        The percentiles are estimated to within 20%.  Times are only
+        recorded while enabled, which can be changed with enable.  If
+        reset is True, the statistics collected so far are cleared.  If
+        dump_interval is given, the statistics are also printed to the
+        log every dump_interval seconds, or never if it is 0.
+        """
+        if enable is not None:
+            stats.timings.enabled = enable
+        if reset:
+            stats.timings.reset()
+        if dump_interval is not None:
+            stats.timings.setDumpInterval(dump_interval)
+        return stats.timings.stats()
+
     @setting(300, 'update tags', tags=['s', '*s'],
                   dirs=['s', '*s'], datasets=['s', '*s'],
                   returns='')
@@ -0,0 +1,158 @@
+"""Timing counters for the settings and backend operations of the Data Vault.
+
+Timings are recorded by name into histograms with logarithmic buckets, from
+which percentiles are estimated without keeping every sample.  Recording is
+off by default; while it is off, timed functions only check a flag before
+calling through, so the counters can stay in the hot paths.
+
+The global timings object is shared by the server and the backend.  It is
+turned on with the 'stats' setting of the server, which also returns the
+collected statistics, and can print them periodically.
+"""
+
+from __future__ import absolute_import
+
+import functools
+import math
+import threading
+import time
+
+from twisted.internet import defer, reactor, task
+
+MIN_SECONDS = 1e-6 # upper bound of the first histogram bucket
+BUCKET_RATIO = 2 ** 0.25 # ratio of the bounds of consecutive buckets
+_LOG_RATIO = math.log(BUCKET_RATIO)
+
+clock = time.time
+
+
+class Histogram(object):
+    """Counts durations in buckets whose bounds grow by BUCKET_RATIO.
+
+    Bucket i holds durations up to MIN_SECONDS * BUCKET_RATIO**i, so
+    percentiles are estimated to within a factor of BUCKET_RATIO.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds > MIN_SECONDS:
+            idx = int(math.ceil(math.log(seconds / MIN_SECONDS) / _LOG_RATIO))
+        else:
+            idx = 0
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Estimate the duration below which q percent of the samples lie."""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return min(MIN_SECONDS * BUCKET_RATIO ** idx, self.max)
+        return self.max
+
+
+class Timings(object):
+    """Histograms of durations by name, recorded while enabled.
+
+    Durations may be recorded from I/O threads, see executor.IOExecutor.
+    """
+    def __init__(self, reactor=reactor):
+        self.reactor = reactor
+        self.enabled = False
+        self.histograms = {}
+        self._dumpCall = None
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.add(seconds)
+
+    def call(self, name, func, *args, **kw):
+        """Call func, recording how long it took under name.
+
+        If func returns a Deferred, the time until it fires is recorded.
+        """
+        if not self.enabled:
+            return func(*args, **kw)
+        start = clock()
+        try:
+            result = func(*args, **kw)
+        except Exception:
+            self.record(name, clock() - start)
+            raise
+        if isinstance(result, defer.Deferred):
+            def done(result):
+                self.record(name, clock() - start)
+                return result
+            return result.addBoth(done)
+        self.record(name, clock() - start)
+        return result
+
+    def reset(self):
+        self.histograms = {}
+
+    def stats(self):
+        """Get (name, count, mean, p50, p99, max) for each name, sorted.
+
+        Durations are given in milliseconds.
+        """
+        rows = []
+        for name, hist in sorted(self.histograms.items()):
+            rows.append((name, hist.count, hist.mean() * 1e3,
+                         hist.percentile(50) * 1e3, hist.percentile(99) * 1e3,
+                         hist.max * 1e3))
+        return rows
+
+    def format(self):
+        lines = ['{:<32} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+            'name', 'count', 'mean ms', 'p50 ms', 'p99 ms', 'max ms')]
+        for row in self.stats():
+            lines.append('{:<32} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} '
+                         '{:>10.3f}'.format(*row))
+        return '\n'.join(lines)
+
+    def dump(self):
+        if self.histograms:
+            print 'Data Vault timings:\n{}'.format(self.format())
+
+    def setDumpInterval(self, interval):
+        """Print the timings every interval seconds, or never if 0."""
+        if self._dumpCall is not None:
+            if self._dumpCall.running:
+                self._dumpCall.stop()
+            self._dumpCall = None
+        if interval > 0:
+            self._dumpCall = task.LoopingCall(self.dump)
+            self._dumpCall.clock = self.reactor
+            self._dumpCall.start(interval, now=False)
+
+timings = Timings()
+
+
+def timed(name):
+    """Decorator recording the durations of calls under name in timings."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            if not timings.enabled:
+                return func(*args, **kw)
+            return timings.call(name, func, *args, **kw)
+        return wrapper
+    return decorator
@@ -0,0 +1,228 @@
+"""Multi-resolution summaries of HDF5 datasets.
+
+A summary is stored in the 'Summary' group of a dataset file and has one
+level for each of a few bin sizes (the factors, e.g. 16, 256 and 4096
+rows).  Level f holds, for every complete bin of f consecutive rows, the
+minimum, maximum and mean of each scalar real column of the dataset, so
+that zoomed-out views of long datasets can be drawn from a number of
+summary bins proportional to the number of pixels.
+
+Each level is a dataset named after its factor with shape (bins, 4,
+columns), where the middle axis is (min, max, mean, count), stored as
+float64.  Only complete bins are stored; when reading, the trailing
+partial bin is computed from the raw rows.  Each factor must divide the
+next one, so that a level can be computed from the level below it.  The
+levels are updated as rows are appended by HDF5MetaData.
+
+NaN values, often stored for failed points, are left out of the min, max
+and mean, which are NaN only for bins without other values.  The count
+is the number of values that are not NaN, and the means of the higher
+levels are the means of the bins below weighted by their counts, so
+that they equal the means of the raw rows.  Levels written before the
+counts were stored, with shape (bins, 3, columns), can still be read,
+and are rebuilt when rows are next appended.
+
+Summaries can be added to existing files with:
+
+    python -m datavault.summary [--factors 16,256,4096] file.hdf5 ...
+"""
+
+import argparse
+import sys
+
+import h5py
+import numpy as np
+
+GROUP = 'Summary'
+FACTORS = (16, 256, 4096)
+MIN, MAX, MEAN, COUNT = 0, 1, 2, 3
+STATS = 4 # length of the middle axis of a level
+
+# Number of bins computed at a time when updating a level.
+CHUNK_BINS = 4096
+
+
+def summary_columns(dtype):
+    """Indices of the fields of a dataset dtype that can be summarized."""
+    columns = []
+    for idx, name in enumerate(dtype.names):
+        field = dtype[name]
+        if field.shape == () and field.kind in 'fiu':
+            columns.append(idx)
+    return columns
+
+
+def create(f, dataset, factors=FACTORS):
+    """Create empty summary levels in file f for dataset.
+
+    Returns False without creating anything if the dataset has no
+    columns that can be summarized.
+    """
+    factors = sorted(factors)
+    for lower, upper in zip(factors, factors[1:]):
+        if upper % lower:
+            raise ValueError("Summary factors must divide each other: {}"
+                             .format(factors))
+    columns = summary_columns(dataset.dtype)
+    if not columns:
+        return False
+    if GROUP in f:
+        del f[GROUP]
+    group = f.create_group(GROUP)
+    group.attrs['Columns'] = np.array(columns, dtype=np.int32)
+    group.attrs['Factors'] = np.array(factors, dtype=np.int64)
+    for factor in factors:
+        group.create_dataset(str(factor), (0, STATS, len(columns)),
+                             dtype=np.float64,
+                             maxshape=(None, STATS, len(columns)),
+                             chunks=(256, STATS, len(columns)))
+    return True
+
+
+def levels(f):
+    """The factors of the summary levels in file f, or [] if there are none."""
+    if GROUP not in f:
+        return []
+    return [int(x) for x in f[GROUP].attrs['Factors']]
+
+
+def columns(f):
+    """The indices of the summarized columns in file f."""
+    return [int(x) for x in f[GROUP].attrs['Columns']]
+
+
+def _raw_columns(dataset, columns, start, stop):
+    """Read rows [start, stop) of the given columns as a float (rows, cols) array."""
+    rows = dataset[start:stop]
+    names = dataset.dtype.names
+    return np.column_stack([rows[names[idx]] for idx in columns]).astype(np.float64)
+
+
+def _nan_extreme(blocks, reduce, fill):
+    """Reduce blocks along axis 1 with reduce, ignoring NaN values."""
+    nan = np.isnan(blocks)
+    out = reduce(np.where(nan, fill, blocks), axis=1)
+    out[nan.all(axis=1)] = np.nan
+    return out
+
+
+def _nan_mean(blocks):
+    """Mean of blocks along axis 1, ignoring NaN values."""
+    nan = np.isnan(blocks)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(nan, 0.0, blocks).sum(axis=1) / (~nan).sum(axis=1)
+
+
+def _weighted_mean(means, counts):
+    """Mean of bins along axis 1 given their means and value counts."""
+    total = counts.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, means * counts, 0.0).sum(axis=1) / total
+
+
+def _reduce_rows(rows, size):
+    """Summarize each consecutive size rows of a (rows, cols) array."""
+    blocks = rows.reshape(-1, size, rows.shape[1])
+    return np.stack([_nan_extreme(blocks, np.min, np.inf),
+                     _nan_extreme(blocks, np.max, -np.inf),
+                     _nan_mean(blocks),
+                     (~np.isnan(blocks)).sum(axis=1)], axis=1)
+
+
+def _reduce_bins(bins, size):
+    """Combine each consecutive size bins of a (bins, 4, cols) summary."""
+    blocks = bins.reshape(-1, size, STATS, bins.shape[2])
+    return np.stack([_nan_extreme(blocks[:, :, MIN], np.min, np.inf),
+                     _nan_extreme(blocks[:, :, MAX], np.max, -np.inf),
+                     _weighted_mean(blocks[:, :, MEAN], blocks[:, :, COUNT]),
+                     blocks[:, :, COUNT].sum(axis=1)], axis=1)
+
+
+def update(f, dataset, old_length, new_length):
+    """Update the summary levels after rows were appended to dataset.
+
+    Bins completed by the rows [old_length, new_length) are computed from
+    the level below, or from the raw rows for the lowest level.
+    """
+    group = f[GROUP]
+    factors = [int(x) for x in group.attrs['Factors']]
+    if group[str(factors[0])].shape[1] != STATS:
+        # levels without counts cannot be combined into weighted means
+        rebuild(f, dataset, new_length, factors)
+        return
+    cols = [int(x) for x in group.attrs['Columns']]
+    lower = None
+    for factor in factors:
+        level = group[str(factor)]
+        b0 = old_length // factor
+        b1 = new_length // factor
+        if b0 == b1:
+            # bins of the higher levels are made of bins of this one
+            break
+        if level.shape[0] < b1:
+            level.resize((b1, STATS, len(cols)))
+        for start in xrange(b0, b1, CHUNK_BINS):
+            stop = min(start + CHUNK_BINS, b1)
+            if lower is None:
+                rows = _raw_columns(dataset, cols, start * factor, stop * factor)
+                level[start:stop] = _reduce_rows(rows, factor)
+            else:
+                ratio = factor // lower_factor
+                bins = lower[start * ratio:stop * ratio]
+                level[start:stop] = _reduce_bins(bins, ratio)
+        lower, lower_factor = level, factor
+
+
+def rebuild(f, dataset, length, factors=FACTORS):
+    """Recreate the summary levels of dataset from its first length rows."""
+    if not create(f, dataset, factors):
+        return False
+    update(f, dataset, 0, length)
+    return True
+
+
+def read(f, dataset, length, factor, start=0, stop=None):
+    """Read bins [start, stop) of the level with the given factor.
+
+    The dataset has length rows, so the level has ceil(length / factor)
+    bins.  The last bin may be partial, in which case it is computed from
+    the raw rows.  Returns (columns, summary) where summary is a (bins, 3,
+    columns) array of (min, max, mean), without the counts.
+    """
+    if factor not in levels(f):
+        raise KeyError(factor)
+    cols = columns(f)
+    nbins = -(-length // factor)
+    start, stop, _ = slice(start, stop).indices(nbins)
+    stop = max(start, stop)
+    complete = min(stop, length // factor)
+    level = f[GROUP][str(factor)]
+    parts = [level[start:complete, :COUNT]] if complete > start else []
+    if stop > complete:
+        rows = _raw_columns(dataset, cols, complete * factor, length)
+        parts.append(_reduce_rows(rows, len(rows))[:, :COUNT])
+    if not parts:
+        return cols, np.zeros((0, 3, len(cols)))
+    return cols, np.concatenate(parts)
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Rebuild the summary levels of Data Vault HDF5 files.')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('--factors', default=','.join(str(x) for x in FACTORS),
+                        help='comma separated bin sizes (default %(default)s)')
+    args = parser.parse_args(argv)
+    factors = [int(x) for x in args.factors.split(',')]
+    for filename in args.files:
+        with h5py.File(filename, 'a') as f:
+            dataset = f['DataVault']
+            length = int(dataset.attrs.get('Length', dataset.shape[0]))
+            if rebuild(f, dataset, length, factors):
+                print '{}: {} rows summarized'.format(filename, length)
+            else:
+                print '{}: no columns to summarize'.format(filename)
+
+
+if __name__ == '__main__':
+    main()
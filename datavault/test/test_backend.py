@@ -70,6 +70,43 @@ class UtilityMethodsTest(_TestCase):
                 ValueError, backend.labrad_urldecode, url_string)
 
 
+class StorageProfileTest(_TestCase):
+    def test_default_profile(self):
+        profile = backend.get_storage_profile()
+        self.assertEqual(
+                backend.STORAGE_PROFILES[backend.DEFAULT_STORAGE_PROFILE],
+                profile)
+
+    def test_named_profile(self):
+        profile = backend.get_storage_profile('gzip')
+        self.assertEqual(profile.compression, 'gzip')
+        self.assertTrue(profile.shuffle)
+
+    def test_named_profile_with_level(self):
+        profile = backend.get_storage_profile('gzip:9')
+        self.assertEqual(profile.compression, 'gzip')
+        self.assertEqual(profile.compression_opts, 9)
+
+    def test_profile_from_tuple(self):
+        profile = backend.get_storage_profile((256, 'lzf', 0, True))
+        self.assertEqual(
+                backend.StorageProfile(256, 'lzf', None, True), profile)
+        profile = backend.get_storage_profile((0, '', 0, False))
+        self.assertEqual(
+                backend.StorageProfile(None, None, None, False), profile)
+        profile = backend.get_storage_profile((1024, '', 0, False, True))
+        self.assertEqual(
+                backend.StorageProfile(1024, None, None, False, True), profile)
+
+    def test_bad_profiles(self):
+        for spec in ['foo', 'lzf:3', 'gzip:x', 'gzip:12', (1, 'bzip2', 0, 0),
+                     (1, 2)]:
+            self.assertRaises(
+                    errors.BadStorageProfileError,
+                    backend.get_storage_profile,
+                    spec)
+
+
 class _MockFile(object):
     def __init__(self):
         self.is_open = True
@@ -132,6 +169,172 @@ class SelfClosingFileTest(_TestCase):
         self.assertTrue(self.close_callback_called,
                     msg='Registered callback not called!')
 
+    def test_close_callbacks_run_in_reverse_order(self):
+        calls = []
+        self.file.onClose(lambda f: calls.append('first'))
+        self.file.onClose(lambda f: calls.append('second'))
+        self.clock.advance(self.close_timeout_sec)
+        self.assertEqual(['second', 'first'], calls)
+
+    def test_file_usable_in_close_callback(self):
+        files = []
+        self.file.onClose(lambda f: files.append(f()))
+        self.clock.advance(self.close_timeout_sec)
+        self.assertEqual([self.opener.file], files)
+        self.assertFalse(self.opener.file.is_open)
+
+    def test_access_delays_timeout(self):
+        self.clock.advance(0.5)
+        self.file()
+        self.clock.advance(0.5)
+        self.assertTrue(self.opener.file.is_open,
+                    msg='File closed although accessed recently')
+        self.clock.advance(0.5)
+        self.assertFalse(self.opener.file.is_open,
+                    msg='File not closed after timeout')
+
+    def test_held_file_stays_open(self):
+        self.file.hold()
+        self.clock.advance(2 * self.close_timeout_sec)
+        self.assertTrue(self.opener.file.is_open,
+                    msg='Held file closed after timeout')
+        self.file.release()
+        self.clock.advance(self.close_timeout_sec)
+        self.assertFalse(self.opener.file.is_open,
+                    msg='File not closed after timeout')
+
+    def test_close(self):
+        self.file.close()
+        self.assertFalse(self.opener.file.is_open, msg='File not closed')
+        self.assertFalse(self.file.is_open)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+
+class FilePoolTest(_TestCase):
+    """Tests for the FilePool."""
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.pool = backend.FilePool(max_open=2)
+
+    def _open_file(self):
+        opener = _MockFileOpener()
+        f = backend.SelfClosingFile(opener=opener, reactor=self.clock,
+                                    pool=self.pool)
+        return f, opener
+
+    def test_evicts_least_recently_used(self):
+        f1, opener1 = self._open_file()
+        f2, opener2 = self._open_file()
+        f1() # f2 is now the least recently used
+        f3, opener3 = self._open_file()
+        self.assertTrue(opener1.file.is_open)
+        self.assertFalse(opener2.file.is_open)
+        self.assertTrue(opener3.file.is_open)
+        self.assertEqual(2, len(self.pool))
+        stats = dict(self.pool.stats())
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(3, stats['misses'])
+        self.assertEqual(1, stats['evictions'])
+
+    def test_evicted_file_reopens(self):
+        f1, opener1 = self._open_file()
+        self._open_file()
+        self._open_file()
+        self.assertFalse(f1.is_open)
+        f1()
+        self.assertTrue(opener1.file.is_open)
+        self.assertEqual(4, self.pool.misses)
+
+    def test_set_max_open(self):
+        f1, opener1 = self._open_file()
+        f2, opener2 = self._open_file()
+        self.pool.setMaxOpen(1)
+        self.assertFalse(opener1.file.is_open)
+        self.assertTrue(opener2.file.is_open)
+
+    def test_held_file_not_evicted(self):
+        f1, opener1 = self._open_file()
+        f1.hold()
+        f2, opener2 = self._open_file()
+        f3, opener3 = self._open_file()
+        self.assertTrue(opener1.file.is_open)
+        self.assertFalse(opener2.file.is_open)
+        # neither the held nor the most recently used file is closed
+        self.pool.setMaxOpen(1)
+        self.assertTrue(opener1.file.is_open)
+        self.assertTrue(opener3.file.is_open)
+        self.assertEqual(2, len(self.pool))
+        f1.release()
+        self.pool.setMaxOpen(1)
+        self.assertFalse(opener1.file.is_open)
+        self.assertEqual(1, len(self.pool))
+
+    def test_timeout_removes_from_pool(self):
+        self._open_file()
+        self.clock.advance(backend.FILE_TIMEOUT_SEC)
+        self.assertEqual(0, len(self.pool))
+
+
+class DataCacheTest(_TestCase):
+    """Tests for the DataCache."""
+
+    def setUp(self):
+        self.clock = task.Clock()
+        # room for two files of 100 rows of 3 floats
+        self.cache = backend.DataCache(max_bytes=2 * 2400)
+        self.filenames = []
+
+    def tearDown(self):
+        for name in self.filenames:
+            _remove_file_if_exists(name)
+
+    def _csv_data(self, cls=backend.CsvNumpyData, rows=100):
+        filename = _unique_filename(suffix='.csv')
+        self.filenames.append(filename)
+        with open(filename, 'w') as f:
+            for i in range(rows):
+                f.write('{0}, {0}, {0}\r\n'.format(i))
+        return cls(filename, reactor=self.clock, cache=self.cache)
+
+    def test_evicts_least_recently_used(self):
+        d1 = self._csv_data()
+        d2 = self._csv_data()
+        d1.data
+        d2.data
+        # buffers have room for at least 1024 rows
+        self.assertEqual(1, len(self.cache))
+        self.assertFalse(hasattr(d1, '_buf'))
+        self.assertEqual([(d2.filename, d2._buf.nbytes)], self.cache.residents())
+        self.assertEqual(1, self.cache.evictions)
+
+        # evicted data is read again when needed
+        self.assertEqual(100, len(d1))
+        self.assertFalse(hasattr(d2, '_buf'))
+        self.assertEqual(1, len(self.cache))
+
+    def test_list_data(self):
+        self.cache.setMaxBytes(1 << 20)
+        d1 = self._csv_data(backend.CsvListData)
+        d2 = self._csv_data(backend.CsvListData)
+        d1.data
+        d2.data
+        d1.data
+        self.assertEqual([d1.filename, d2.filename],
+                         [name for name, nbytes in self.cache.residents()])
+        self.assertEqual(self.cache.nbytes, 2 * 100 * (
+                backend.LIST_ROW_BYTES + 3 * backend.FLOAT_BYTES))
+        self.cache.setMaxBytes(1)
+        self.assertFalse(hasattr(d2, '_data'))
+        self.assertEqual(1, len(self.cache))
+
+    def test_timeout_releases_data(self):
+        d1 = self._csv_data()
+        d1.data
+        self.clock.advance(backend.DATA_TIMEOUT)
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.nbytes)
+
 
 # Dependent and Independent variables used for testing IniData and HDF5MetaData.
 _INDEPENDENTS = [
@@ -408,9 +611,15 @@ class _MockAttrs(dict):
 
 
 class _MockDataset(object):
-    """Mock Dataset class to use in the HDF5MetaDataTest."""
+    """Mock Dataset class to use in the HDF5MetaDataTest.
+
+    The comments are stored in a dataset next to the data, so the parent
+    group is an in-memory HDF5 file.
+    """
     def __init__(self):
         self.attrs = _MockAttrs()
+        self.parent = h5py.File(_unique_filename(), 'w', driver='core',
+                                backing_store=False)
 
 
 class HDF5MetaDataTest(_MetadataTest):
@@ -447,6 +656,68 @@ class _BackendDataTestCase(_TestCase):
         self.assert_arrays_equal(read_data[0], expected_data[1])
         self.assertEqual(next_pos, 2)
 
+class RowIndexTest(_TestCase):
+
+    def setUp(self):
+        self.filename = _unique_filename(suffix='.csv')
+        self.index_file = self.filename[:-4] + '.idx'
+        self.lines = ['{}, {}\r\n'.format(i, i * i) for i in range(10)]
+        with open(self.filename, 'wb') as f:
+            f.write(''.join(self.lines))
+        self.file = open(self.filename, 'a+')
+
+    def tearDown(self):
+        self.file.close()
+        _remove_file_if_exists(self.filename)
+        _remove_file_if_exists(self.index_file)
+
+    def offset(self, row):
+        return sum(len(line) for line in self.lines[:row])
+
+    def test_index(self):
+        index = backend.RowIndex(self.index_file, step=4)
+        index.update(self.file)
+        self.assertEqual(index.rows, 10)
+        self.assertEqual(index.end, self.offset(10))
+        self.assert_arrays_equal(index.offsets,
+                                 [self.offset(0), self.offset(4), self.offset(8)])
+        self.assertEqual(index.seek(3), (0, 0))
+        self.assertEqual(index.seek(9), (8, self.offset(8)))
+        self.assertEqual(index.seek(12), (10, self.offset(10)))
+
+    def test_update_after_append(self):
+        index = backend.RowIndex(self.index_file, step=4)
+        index.update(self.file)
+        self.file.write('10, 100\r\n11, 121\r\n12, 1')
+        self.file.flush()
+        index.update(self.file)
+        # the incomplete last line is not indexed yet
+        self.assertEqual(index.rows, 12)
+        self.assertEqual(index.seek(12), (12, self.offset(10) + 18))
+
+    def test_save_and_load(self):
+        index = backend.RowIndex(self.index_file, step=4)
+        index.update(self.file)
+        index.save()
+        loaded = backend.RowIndex(self.index_file, step=4)
+        loaded._load(self.file)
+        self.assertEqual(loaded.rows, 10)
+        self.assert_arrays_equal(loaded.offsets, index.offsets)
+
+    def test_stale_index_is_ignored(self):
+        index = backend.RowIndex(self.index_file, step=4)
+        index.update(self.file)
+        index.save()
+        self.file.close()
+        with open(self.filename, 'wb') as f:
+            f.write('1, 1\r\n')
+        self.file = open(self.filename, 'a+')
+        loaded = backend.RowIndex(self.index_file, step=4)
+        loaded.update(self.file)
+        self.assertEqual(loaded.rows, 1)
+        self.assert_arrays_equal(loaded.offsets, [0])
+
+
 class CsvListDataTest(_BackendDataTestCase):
 
     def setUp(self):
@@ -459,6 +730,7 @@ class CsvListDataTest(_BackendDataTestCase):
     def tearDown(self):
         _remove_file_if_exists(self.filename)
         _remove_file_if_exists(self.filename[:-4] + '.ini')
+        _remove_file_if_exists(self.filename[:-4] + '.idx')
 
     def get_backend_data(self):
         return backend.CsvListData(self.filename, reactor=self.clock)
@@ -491,6 +763,39 @@ class CsvListDataTest(_BackendDataTestCase):
         self.assertTrue(data.hasMore(1))
         self.assertFalse(data.hasMore(2))
 
+    def test_get_data_columns(self):
+        self.data.addData([[1, 2, 3], [4, 5, 6]])
+        columns, next_pos = self.data.getDataColumns(None, 0)
+        self.assertEqual(columns, ([1, 4], [2, 5], [3, 6]))
+        self.assertEqual(next_pos, 2)
+        columns, next_pos = self.data.getDataColumns(None, 2)
+        self.assertEqual(columns, ([], [], []))
+        self.assertEqual(next_pos, 2)
+
+    def test_windowed_read_uses_index(self):
+        self.data._index.step = 4
+        self.data.addData([[i, i, i] for i in range(10)])
+        read_data, next_pos = self.data.getData(2, 5, False, None)
+        self.assertEqual(read_data, [[5, 5, 5], [6, 6, 6]])
+        self.assertEqual(next_pos, 7)
+        self.assertTrue(self.data.hasMore(9))
+        self.assertFalse(self.data.hasMore(10))
+        self.assertFalse(hasattr(self.data, '_data'))
+        self.assertEqual(self.data._index.rows, 10)
+
+        # the index is saved when the file is closed
+        self.data._file.close()
+        self.assertTrue(os.path.exists(self.filename[:-4] + '.idx'))
+
+    def test_get_data_slice(self):
+        self.data.addData([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        self.assertEqual(self.data.getDataSlice(0, None, 2, [0, 2]),
+                         ([1, 7], [3, 9]))
+        self.assertEqual(self.data.getDataSlice(1, 2, 1, None),
+                         ([4], [5], [6]))
+        self.assertEqual(self.data.getDataSlice(5, None, 1, [1]), ([],))
+        self.assertFalse(hasattr(self.data, '_data'))
+
     def test_add_data_wrong_number_of_columns(self):
         self.assertRaises(errors.BadDataError, self.data.addData, [(1, 2)])
         self.assertRaises(
@@ -566,6 +871,54 @@ class _BackendDataTest(_BackendDataTestCase):
                True,
                None)
 
+    def test_get_data_columns(self):
+        data_to_add = np.recarray(
+            (3, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        data_to_add[0] = (1, 2, 3)
+        data_to_add[1] = (4, 5, 6)
+        data_to_add[2] = (7, 8, 9)
+        self.data.addData(data_to_add)
+
+        columns, next_pos = self.data.getDataColumns(None, 0)
+        self.assertEqual(next_pos, 3)
+        self.assertEqual(len(columns), 3)
+        for col, expected in zip(columns, [[1, 4, 7], [2, 5, 8], [3, 6, 9]]):
+            self.assertTrue(col.flags['C_CONTIGUOUS'])
+            self.assert_arrays_equal(col, expected)
+
+        columns, next_pos = self.data.getDataColumns(1, 1)
+        self.assertEqual(next_pos, 2)
+        self.assert_arrays_equal(columns[2], [6])
+
+        columns, next_pos = self.data.getDataColumns(None, 3)
+        self.assertEqual(next_pos, 3)
+        self.assertEqual([len(col) for col in columns], [0, 0, 0])
+
+    def test_get_data_slice(self):
+        data_to_add = np.recarray(
+            (4, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        for i in range(4):
+            data_to_add[i] = (i, 10 * i, 100 * i)
+        self.data.addData(data_to_add)
+
+        x, z = self.data.getDataSlice(0, None, 2, [0, 2])
+        self.assert_arrays_equal(x, [0, 2])
+        self.assert_arrays_equal(z, [0, 200])
+
+        columns = self.data.getDataSlice(1, 3, 1, None)
+        self.assertEqual(len(columns), 3)
+        self.assert_arrays_equal(columns[1], [10, 20])
+
+        (y,) = self.data.getDataSlice(3, 10, 1, [1])
+        self.assert_arrays_equal(y, [30])
+
+        (y,) = self.data.getDataSlice(4, None, 1, [1])
+        self.assertEqual(len(y), 0)
+
+        self.assertRaises(ValueError, self.data.getDataSlice, 0, None, 0, None)
+
 
 class CsvNumpyDataTest(_BackendDataTest):
 
@@ -581,6 +934,7 @@ class CsvNumpyDataTest(_BackendDataTest):
         for name in self.files_to_remove:
             _remove_file_if_exists(name)
             _remove_file_if_exists(name[:-4] + '.ini')
+            _remove_file_if_exists(name[:-4] + '.idx')
 
 
     def get_backend_data(self, filename):
@@ -598,6 +952,71 @@ class CsvNumpyDataTest(_BackendDataTest):
         self.assertRaises(
                errors.BadDataError, self.data.addData, [(1, 2, 3, 4)])
 
+    def write_rows(self, rows, trailing_newline=True):
+        with open(self.filename, 'ab') as f:
+            text = '\r\n'.join(', '.join(str(v) for v in row) for row in rows)
+            f.write(text + ('\r\n' if trailing_newline else ''))
+
+    def test_windowed_read_does_not_load_data(self):
+        self.write_rows([[i, 2 * i, 3 * i] for i in range(100)])
+        read_data, next_pos = self.data.getData(3, 50, False, None)
+        self.assert_arrays_equal(read_data, [[50, 100, 150], [51, 102, 153],
+                                             [52, 104, 156]])
+        self.assertEqual(next_pos, 53)
+        self.assertFalse(hasattr(self.data, '_buf'))
+        self.assertTrue(self.data.hasMore(99))
+        self.assertFalse(self.data.hasMore(100))
+
+        read_data, next_pos = self.data.getData(None, 98, False, None)
+        self.assert_arrays_equal(read_data, [[98, 196, 294], [99, 198, 297]])
+        self.assertEqual(next_pos, 100)
+        read_data, next_pos = self.data.getData(None, 100, False, None)
+        self.assertEqual(read_data.size, 0)
+        self.assertEqual(next_pos, 100)
+
+    def test_slice_does_not_load_data(self):
+        self.write_rows([[i, 2 * i, 3 * i] for i in range(100)])
+        x, z = self.data.getDataSlice(50, 56, 2, [0, 2])
+        self.assert_arrays_equal(x, [50, 52, 54])
+        self.assert_arrays_equal(z, [150, 156, 162])
+        (y,) = self.data.getDataSlice(98, None, 1, [1])
+        self.assert_arrays_equal(y, [196, 198])
+        self.assertFalse(hasattr(self.data, '_buf'))
+        # negative indices count from the end of the data
+        (y,) = self.data.getDataSlice(-2, None, 1, [1])
+        self.assert_arrays_equal(y, [196, 198])
+
+    def test_incremental_parse(self):
+        self.write_rows([[1, 2, 3]])
+        self.assert_arrays_equal(self.data.data, [[1, 2, 3]])
+        # rows written to the file are picked up on the next read
+        self.write_rows([[4, 5, 6], [7, 8, 9]])
+        self.assert_arrays_equal(self.data.data, [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        # as are rows added while the data is in memory
+        data = np.recarray(
+            (1, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        data[0] = (10, 11, 12)
+        self.data.addData(data)
+        self.assertEqual(len(self.data), 4)
+        self.assert_arrays_equal(self.data.data[-1], [10, 11, 12])
+
+    def test_parse_across_blocks(self):
+        rows = [[i, i + 0.5, -i] for i in range(2000)]
+        self.write_rows(rows)
+        old_block = backend.CSV_READ_BLOCK
+        backend.CSV_READ_BLOCK = 100
+        try:
+            self.assert_arrays_equal(self.data.data, rows)
+            read_data, _ = self.data.getData(5, 1500, False, None)
+        finally:
+            backend.CSV_READ_BLOCK = old_block
+        self.assert_arrays_equal(read_data, rows[1500:1505])
+
+    def test_last_line_without_newline(self):
+        self.write_rows([[1, 2, 3], [4, 5, 6]], trailing_newline=False)
+        self.assert_arrays_equal(self.data.data, [[1, 2, 3], [4, 5, 6]])
+
 class ExtendedHDF5DataTest(_BackendDataTest):
 
     def setUp(self):
@@ -635,6 +1054,60 @@ class ExtendedHDF5DataTest(_BackendDataTest):
         self.assertEqual(len(actual), 3)
         self.assert_arrays_equal(actual, [[1, 4], [2, 5], [3, 6]])
 
+    def test_variables_are_cached(self):
+        stats = backend.metadata_stats
+        hits, misses, saved = stats.hits, stats.misses, stats.reads_saved
+        independents = self.data.getIndependents()
+        self.assertEqual(stats.misses, misses + 1)
+        self.assertEqual(self.data.getIndependents(), independents)
+        self.assertEqual(len(self.data.getDependents()), len(_DEPENDENTS))
+        self.data.getRowType()
+        self.assertEqual(stats.misses, misses + 1)
+        self.assertTrue(stats.hits > hits + 2)
+        self.assertTrue(stats.reads_saved > saved)
+
+        # rewriting the metadata clears the cache
+        data = self.get_backend_data(_unique_filename())
+        data._variables = ([], [], 0)
+        data.initialize_info('Foo', _INDEPENDENTS, _DEPENDENTS)
+        self.assertEqual(len(data.getDependents()), len(_DEPENDENTS))
+
+    def test_comments_dataset(self):
+        for i in xrange(100):
+            self.data.addComment('user', str(i))
+        comments = self.data.file['Comments']
+        self.assertEqual(comments.shape, (100,))
+        self.assertEqual(comments.chunks, (backend.COMMENT_CHUNK,))
+        # older readers find a note in the attribute they read comments from
+        self.assertEqual([c[2] for c in self.data.dataset.attrs['Comments']],
+                         [backend.COMMENTS_NOTE])
+        read, next_pos = self.data.getComments(3, 95)
+        self.assertEqual([c[2] for c in read], ['95', '96', '97'])
+        self.assertEqual(next_pos, 98)
+        self.assertEqual(self.data.getComments(None, 100), ([], 100))
+
+    def test_legacy_comments_attribute(self):
+        # files written before the comments dataset keep comments in an
+        # attribute; they are copied to the dataset on the first add, and
+        # left in the attribute for older readers.
+        del self.data.file['Comments']
+        legacy = np.array([(1.0, 'alice', 'old 1'), (2.0, 'bob', 'old 2')],
+                          dtype=self.data.comment_type)
+        self.data.dataset.attrs['Comments'] = legacy
+        data = self.get_backend_data(self.filename)
+        self.assertEqual(data.numComments(), 2)
+        comments, _ = data.getComments(1, 1)
+        self.assertEqual(comments[0][1:], ('bob', 'old 2'))
+        self.assertNotIn('Comments', data.file)
+
+        data.addComment('carol', 'new')
+        self.assertEqual(data.file['Comments'].shape, (3,))
+        self.assertEqual([c[2] for c in data.dataset.attrs['Comments']],
+                         ['old 1', 'old 2', backend.COMMENTS_NOTE])
+        self.assertEqual(data.numComments(), 3)
+        comments, _ = data.getComments(None, 0)
+        self.assertEqual([c[2] for c in comments], ['old 1', 'old 2', 'new'])
+
     def test_initialize_info_bad_vars(self):
         bad_independents = [
                         backend.Independent(
@@ -770,6 +1243,84 @@ class ExtendedHDF5DataTest(_BackendDataTest):
         added_data, _ = data.getData(None, 0, False, None)
         self.assertEqual(added_data[0][0], "{'a': 0}")
 
+    def test_add_data_grows_capacity(self):
+        row = np.recarray(
+            (1, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        for i in range(5):
+            row[0] = (i, i, i)
+            self.data.addData(row)
+        self.assertEqual(len(self.data), 5)
+        self.assertTrue(self.data.dataset.shape[0] >= 5)
+        self.assertTrue(self.data.hasMore(4))
+        self.assertFalse(self.data.hasMore(5))
+        read_data, next_pos = self.data.getData(None, 3, False, None)
+        self.assertEqual(next_pos, 5)
+        self.assert_arrays_equal(read_data, [(3, 3, 3), (4, 4, 4)])
+        read_data, next_pos = self.data.getData(10, 5, False, None)
+        self.assertEqual(next_pos, 5)
+        self.assertEqual(read_data, [])
+
+    def test_capacity_truncated_on_close(self):
+        row = np.recarray(
+            (3, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        row[:] = (1, 2, 3)
+        self.data.addData(row)
+        self.clock.advance(backend.FILE_TIMEOUT_SEC)
+        self.assertEqual(self.data.dataset.shape[0], 3)
+        self.assertEqual(len(self.data), 3)
+        self.assertEqual(self.data.dataset.attrs['Length'], 3)
+
+    def test_length_saved(self):
+        row = np.recarray(
+            (3, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        row[:] = (1, 2, 3)
+        self.data.addData(row)
+        # the length is not written on every append
+        self.assertTrue(self.data.unsaved)
+        self.assertEqual(self.data.dataset.attrs['Length'], 0)
+        self.data.save()
+        self.assertFalse(self.data.unsaved)
+        self.assertEqual(self.data.dataset.attrs['Length'], 3)
+
+    def test_unsaved_rows_dropped_on_open(self):
+        row = np.recarray(
+            (3, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        row[:] = (1, 2, 3)
+        self.data.addData(row)
+        self.data.save()
+        self.data.addData(row)
+        # close the file without the callbacks, as if the server crashed
+        self.data._file.callbacks = []
+        self.data._file.close()
+        data = self.get_backend_data(self.filename)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data.dataset.shape[0], 3)
+
+    def test_initialize_storage_profile(self):
+        name = _unique_filename()
+        data = self.get_backend_data(name)
+        data.initialize_info('Foo', _INDEPENDENTS, _DEPENDENTS, 'gzip:6')
+        self.assertEqual(data.dataset.chunks, (4096,))
+        self.assertEqual(data.dataset.compression, 'gzip')
+        self.assertEqual(data.dataset.compression_opts, 6)
+        self.assertTrue(data.dataset.shuffle)
+
+    def test_initialize_chunks_limited_for_wide_rows(self):
+        name = _unique_filename()
+        data = self.get_backend_data(name)
+        independent = backend.Independent(
+                label='NewVariable',
+                shape=(1000,),
+                datatype='v',
+                unit='')
+        data.initialize_info('Foo', [independent], [], 'default')
+        self.assertEqual(
+                data.dataset.chunks, (backend.MAX_CHUNK_BYTES // 8000,))
+
     def test_add_string_array_column(self):
         name = _unique_filename()
         data = self.get_backend_data(name)
@@ -811,5 +1362,27 @@ class SimpleHDF5DataTest(_BackendDataTest):
         self.assertEqual(read_data.dtype, np.dtype(float))
         self.assertEqual(read_data.size, 0)
 
+    def test_add_data_grows_capacity(self):
+        row = np.recarray(
+            (1, ),
+            dtype=[('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        for i in range(5):
+            row[0] = (i, i, i)
+            self.data.addData(row)
+        self.assertEqual(len(self.data), 5)
+        read_data, next_pos = self.data.getData(None, 0, False, None)
+        self.assertEqual(next_pos, 5)
+        self.assertEqual(read_data.shape, (5, 3))
+        self.clock.advance(backend.FILE_TIMEOUT_SEC)
+        self.assertEqual(self.data.dataset.shape[0], 5)
+
+    def test_initialize_storage_profile(self):
+        name = _unique_filename()
+        data = self.get_backend_data(name)
+        data.initialize_info('Foo', _INDEPENDENTS, _DEPENDENTS, 'lzf')
+        self.assertEqual(data.dataset.chunks, (4096,))
+        self.assertEqual(data.dataset.compression, 'lzf')
+        self.assertTrue(data.dataset.shuffle)
+
 if __name__ == '__main__':
     pytest.main(['-v', __file__])
@@ -0,0 +1,110 @@
+import mock
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from labrad import units as U
+from twisted.internet import task
+
+from datavault import SessionStore, catalog
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp(prefix='dvtest_')
+        self.catalog = catalog.Catalog(':memory:')
+        self.clock = task.Clock()
+        self.catalog.reactor = self.clock
+        self.store = SessionStore(self.datadir, mock.MagicMock(),
+                                  catalog=self.catalog)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.datadir)
+
+    def new_dataset(self, path, title):
+        session = self.store.get(path)
+        return session.newDataset(title, ['x [s]'], ['y (amp) [V]'])
+
+    def test_path_key(self):
+        for path in [[''], ['', 'a'], ['', 'a/b', 'c%d']]:
+            self.assertEqual(path, catalog.key_path(catalog.path_key(path)))
+        self.assertEqual('/a%fb', catalog.path_key(['', 'a/b']))
+
+    def test_scalar(self):
+        self.assertEqual((2.0, '', None), catalog.scalar(2))
+        self.assertEqual((5.0, 'GHz', None), catalog.scalar(U.Value(5, 'GHz')))
+        self.assertEqual((None, None, 'abc'), catalog.scalar('abc'))
+        self.assertEqual((None, None, None), catalog.scalar([1, 2]))
+
+    def test_search_title(self):
+        self.new_dataset([''], 'Rabi scan')
+        self.new_dataset(['', 'a'], 'T1 scan')
+        self.new_dataset(['', 'a'], 'rabi 100%')
+        self.assertEqual([([''], '00001 - Rabi scan'),
+                          (['', 'a'], '00002 - rabi 100%')],
+                         self.catalog.search(title='RABI'))
+        self.assertEqual([(['', 'a'], '00002 - rabi 100%')],
+                         self.catalog.search(title='0%'))
+        self.assertEqual(3, len(self.catalog.search()))
+
+    def test_search_path_and_paging(self):
+        self.new_dataset([''], 'root')
+        self.new_dataset(['', 'a'], 'a')
+        self.new_dataset(['', 'a', 'b'], 'b')
+        self.new_dataset(['', 'ab'], 'ab')
+        names = lambda results: [name for path, name in results]
+        self.assertEqual(['00001 - a', '00001 - b'],
+                         names(self.catalog.search(path=['', 'a'])))
+        # sorted by path, then name
+        self.assertEqual(['00001 - b', '00001 - ab'],
+                         names(self.catalog.search(limit=2, offset=2)))
+
+    def test_search_parameters_and_tags(self):
+        d1 = self.new_dataset([''], 'one')
+        d2 = self.new_dataset([''], 'two')
+        d1.addParameter('freq', U.Value(5.0, 'GHz'))
+        d2.addParameters([('freq', U.Value(6.5, 'GHz')), ('note', 'hi')])
+        self.assertEqual([([''], d2.name)],
+                         self.catalog.search(params=[('freq', 6, 7)]))
+
+        session = self.store.get([''])
+        session.updateTags(['star'], [], [d1.name, d2.name])
+        session.updateTags(['trash'], [], [d2.name])
+        self.assertEqual([([''], d1.name)],
+                         self.catalog.search(tags=['star', '-trash']))
+
+    def test_rows_and_dates(self):
+        d = self.new_dataset([''], 'one')
+        d.addData(np.zeros((3,), dtype=d.data.dtype))
+        title, rows, created, modified = self.catalog.getDataset([''], d.name)
+        self.assertEqual(('one', 3), (title, rows))
+        self.assertTrue(modified >= created)
+        self.assertEqual(1, len(self.catalog.search(after=created - 1)))
+        self.assertEqual(0, len(self.catalog.search(before=created - 1)))
+
+    def test_commit_batched(self):
+        filename = os.path.join(self.datadir, 'catalog.sqlite')
+        cat = catalog.Catalog(filename, commit_delay=2)
+        cat.reactor = self.clock
+        cat.addSession([''], 0)
+        other = catalog.Catalog(filename)
+        self.assertEqual([], other._db.execute('SELECT * FROM sessions').fetchall())
+        self.clock.advance(2)
+        self.assertEqual(1, len(other._db.execute('SELECT * FROM sessions').fetchall()))
+        other.close()
+        cat.close()
+
+    def test_rows_written_on_commit(self):
+        d = self.new_dataset([''], 'one')
+        self.catalog.flush()
+        for i in range(3):
+            d.addData(np.zeros((2,), dtype=d.data.dtype))
+        # counted in memory, not updated in the database on every add
+        self.assertEqual(6, self.catalog._rows[('', d.name)][0])
+        self.clock.advance(catalog.COMMIT_DELAY)
+        self.assertEqual({}, self.catalog._rows)
+        self.assertEqual(6, self.catalog.getDataset([''], d.name)[1])
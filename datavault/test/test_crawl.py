@@ -0,0 +1,102 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from twisted.internet import task
+
+from datavault import SessionStore, backend, catalog, crawl
+
+
+class CrawlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp(prefix='dvtest_')
+        self.clock = task.Clock()
+        store = SessionStore(self.datadir, mock.MagicMock())
+        root = store.get([''])
+        root.reactor = self.clock
+        self.rabi = root.newDataset('rabi', ['x [s]'], ['y (amp) [V]'])
+        self.rabi.addParameter('freq', 5.5)
+        self.rabi.addData(np.zeros((4,), dtype=self.rabi.data.dtype))
+        root.updateTags(['star'], [], [self.rabi.name])
+        root.flush()
+        self.sub = store.get(['', 'sub'])
+        self.sub.newDataset('t1', ['x [s]'], ['y (amp) [V]'])
+        self.csv = self.make_csv_dataset(self.sub.dir, '00002 - old')
+
+    def tearDown(self):
+        shutil.rmtree(self.datadir)
+
+    def make_csv_dataset(self, dirpath, name):
+        data = backend.CsvNumpyData(os.path.join(dirpath, name + '.csv'),
+                                    reactor=self.clock)
+        data.initialize_info('old', [backend.Independent('x', (1,), 'v', '')],
+                             [backend.Dependent('y', '', (1,), 'v', '')])
+        data.save()
+        data.addData(np.array([(0.0, 1.0), (1.0, 2.0)], dtype=data.dtype))
+        data._file.close()
+        return name
+
+    def new_catalog(self):
+        cat = catalog.Catalog(':memory:')
+        cat.reactor = self.clock
+        self.addCleanup(cat.close)
+        return cat
+
+    def test_find_sessions(self):
+        found = [path for path, dirpath in crawl.find_sessions(self.datadir)]
+        self.assertEqual([[''], ['', 'sub']], found)
+
+    def test_crawl(self):
+        cat = self.new_catalog()
+        open_files = len(backend.file_pool)
+        stats = crawl.crawl(self.datadir, cat, processes=1, report=None)
+        self.assertEqual((2, 3, 0), stats[:3])
+        self.assertEqual(open_files, len(backend.file_pool))
+
+        self.assertEqual([([''], self.rabi.name)],
+                         cat.search(params=[('freq', 5, 6)], tags=['star']))
+        self.assertEqual(['00001 - t1', '00002 - old'],
+                         [name for path, name in cat.search(path=['', 'sub'])])
+        self.assertEqual(4, cat.getDataset([''], self.rabi.name)[1])
+        # csv datasets are not read to count their rows
+        self.assertEqual(None, cat.getDataset(['', 'sub'], self.csv)[1])
+
+    def test_crawl_pool(self):
+        cat = self.new_catalog()
+        stats = crawl.crawl(self.datadir, cat, processes=2, report=None,
+                            chunk_files=1)
+        self.assertEqual((2, 3, 0), stats[:3])
+        self.assertEqual(3, len(cat.search()))
+
+    def test_checkpoint(self):
+        checkpoint = os.path.join(self.datadir, 'crawl.json')
+        crawl.crawl(self.datadir, self.new_catalog(), processes=1,
+                    checkpoint=checkpoint, report=None)
+        self.assertEqual(set(['', '/sub']), crawl.load_checkpoint(checkpoint))
+        stats = crawl.crawl(self.datadir, self.new_catalog(), processes=1,
+                            checkpoint=checkpoint, report=None)
+        self.assertEqual((0, 0, 0), stats[:3])
+
+    def test_read_only(self):
+        # files are opened read-only, not with the backend of the server
+        with mock.patch.object(crawl.h5py, 'File', wraps=h5py.File) as File:
+            info = crawl.read_dataset(self.datadir, self.rabi.name)
+        self.assertEqual('r', File.call_args[0][1])
+        self.assertEqual(4, info['rows'])
+        self.assertEqual([('freq', 5.5, '', None)], info['params'])
+
+    def test_unreadable_dataset(self):
+        with open(os.path.join(self.sub.dir, '00003 - bad.hdf5'), 'w') as f:
+            f.write('not hdf5')
+        checkpoint = os.path.join(self.datadir, 'crawl.json')
+        stats = crawl.crawl(self.datadir, self.new_catalog(), processes=1,
+                            checkpoint=checkpoint, report=None)
+        self.assertEqual((2, 4, 1), stats[:3])
+        # the session with the failed dataset is crawled again
+        self.assertEqual(set(['']), crawl.load_checkpoint(checkpoint))
@@ -1,15 +1,17 @@
+from datetime import datetime
 import mock
 import numpy as np
 import os
 import pytest
 import tempfile
+import time
 import unittest
 
 from labrad import types
 
 from twisted.internet import task
 
-from datavault import Session, Dataset, SessionStore
+from datavault import Session, Dataset, SessionStore, errors
 
 
 def _unique_dir():
@@ -67,6 +69,18 @@ class TestSessionStore(unittest.TestCase):
         self.assertEqual([foo_session, bar_session], store.get_all())
 
 
+    def test_flush_saves_pending_changes(self):
+        store = SessionStore(self.datadir, self.hub)
+        session = store.get('foo')
+        session.reactor = task.Clock()
+        session.updateTags(['tag'], ['bar'], [])
+        reloaded = Session(self.datadir, 'foo', self.hub, store)
+        self.assertEqual({}, reloaded.session_tags)
+        store.flush()
+        reloaded.load()
+        self.assertEqual({'bar': set(['tag'])}, reloaded.session_tags)
+
+
 class _DatavaultTestCase(unittest.TestCase):
     _TITLE = 'Foo'
     _INDEPENDENTS = [('Current', 'mA'), ('Freq', 'Ghz')]
@@ -158,6 +172,8 @@ class SessionTest(_DatavaultTestCase):
         d1.addData(np.array([0]))
         d1.addData(np.array([1]))
         s1.save()
+        # the number of rows is saved with the datasets marked by saveLater
+        s1.flush()
         self.assertEqual(['00001 - Foo'], s1.listDatasets())
 
         s2 = self._get_session()
@@ -168,6 +184,40 @@ class SessionTest(_DatavaultTestCase):
         d2 = s2.openDataset(datasets[0])
         self.assertDatasetsEqual(d1, d2)
 
+    def _saved_accessed(self, session):
+        reloaded = Session(self.datadir, session.path, self.hub, self.store,
+                           track_access=False)
+        return reloaded.accessed
+
+    def test_access_is_saved_later(self):
+        session = self._get_session()
+        clock = task.Clock()
+        session.reactor = clock
+        session.access()
+        session.access()
+        session.accessed = datetime(2001, 2, 3, 4, 5, 6)
+        self.assertNotEqual(session.accessed, self._saved_accessed(session))
+        self.assertEqual(1, len(clock.getDelayedCalls()))
+        clock.advance(session.save_delay)
+        self.assertEqual(session.accessed, self._saved_accessed(session))
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_access_not_tracked(self):
+        session = Session(self.datadir, ['foo'], self.hub, self.store,
+                          track_access=False)
+        clock = task.Clock()
+        session.reactor = clock
+        accessed = session.accessed
+        session.access()
+        self.assertEqual(accessed, session.accessed)
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_new_dataset_saves_counter(self):
+        session = self._get_session()
+        session.reactor = task.Clock()
+        session.newDataset(self._TITLE, self._INDEPENDENTS, self._DEPENDENTS)
+        self.assertEqual(2, self._get_session().counter)
+
     def test_add_new_tags(self):
         session1 = self._get_session()
         dataset1 = session1.newDataset(
@@ -261,6 +311,71 @@ class SessionTest(_DatavaultTestCase):
         self.assertEqual([(dataset, ['tag'])], dataset_tags)
 
 
+    def test_list_contents_tag_filters(self):
+        session = self._get_session()
+        for title in ['a', 'b', 'c']:
+            session.newDataset(title, self._INDEPENDENTS, self._DEPENDENTS)
+        a, b, c = session.listDatasets()
+        session.updateTags(['trash'], [], [a])
+        session.updateTags(['keep'], [], [b, c])
+        session.updateTags(['-keep'], [], [c])
+        self.assertEqual([b, c], session.listContents(['-trash'])[1])
+        self.assertEqual([b], session.listContents(['keep'])[1])
+        self.assertEqual([b], session.listContents(['keep', '-trash'])[1])
+        self.assertEqual([], session.listContents(['missing'])[1])
+        self.assertEqual([a, b, c], session.listContents(['-missing'])[1])
+
+        # the index is rebuilt from the saved tags
+        session.flush()
+        reloaded = self._get_session()
+        self.assertEqual([b], reloaded.listContents(['keep', '-trash'])[1])
+
+    def test_list_contents_cached(self):
+        session = self._get_session()
+        session.newDataset(self._TITLE, self._INDEPENDENTS, self._DEPENDENTS)
+        # listings of recently changed directories are not cached
+        past = time.time() - 10
+        os.utime(session.dir, (past, past))
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+            first = session.listContents([])
+            self.assertEqual(first, session.listContents([]))
+            self.assertEqual(1, listdir.call_count)
+
+            session.newDataset('Bar', self._INDEPENDENTS, self._DEPENDENTS)
+            os.utime(session.dir, (past, past))
+            self.assertEqual(2, len(session.listContents([])[1]))
+            self.assertEqual(2, listdir.call_count)
+
+            # changes made behind our back are seen through the mtime
+            os.mkdir(os.path.join(session.dir, 'other.dir'))
+            os.utime(session.dir, (past + 1, past + 1))
+            self.assertEqual(['other'], session.listContents([])[0])
+            self.assertEqual(3, listdir.call_count)
+
+
+    def test_open_dataset_by_number(self):
+        session = self._get_session()
+        session.newDataset('a', self._INDEPENDENTS, self._DEPENDENTS)
+        self.assertEqual('00001 - a', session.openDataset(1).name)
+        self.assertRaises(errors.DatasetNotFoundError, session.openDataset, 3)
+
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+            # numbers of new datasets are known without listing the directory
+            session.newDataset('b', self._INDEPENDENTS, self._DEPENDENTS)
+            self.assertEqual('00002 - b', session.openDataset(2).name)
+            self.assertEqual('00001 - a', session.openDataset(1).name)
+            self.assertEqual(0, listdir.call_count)
+
+        # datasets added behind our back are found by rescanning
+        other = self._get_session()
+        other.newDataset('c', self._INDEPENDENTS, self._DEPENDENTS)
+        self.assertEqual('00003 - c', session.openDataset(3).name)
+
+        # and deleted ones are not returned
+        os.remove(os.path.join(session.dir, '00003 - c.hdf5'))
+        self.assertRaises(errors.DatasetNotFoundError, session.openDataset, 3)
+
+
 class DatasetTest(_DatavaultTestCase):
 
     _EXT_INDEPENDENTS = [('t', [1], 'v', 'ns'), ('x', [2,2], 'c', 'V')]
@@ -271,6 +386,7 @@ class DatasetTest(_DatavaultTestCase):
         self.session = mock.MagicMock()
         self.session.hub = self.hub
         self.session.dir = _unique_dir()
+        self.session.io_executor = None
 
     def tearDown(self):
         _empty_and_remove_dir(self.session.dir)
@@ -288,6 +404,22 @@ class DatasetTest(_DatavaultTestCase):
         return data_record
 
 
+    def test_access_saved_with_session(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        dataset.access()
+        self.session.saveLater.assert_called_with(dataset)
+
+        self.session.saveLater.reset_mock()
+        self.session.track_access = False
+        dataset.access()
+        self.assertFalse(self.session.saveLater.called)
+
     def test_init_create_simple(self):
         dataset = Dataset(
                 self.session,
@@ -443,6 +575,176 @@ class DatasetTest(_DatavaultTestCase):
         self.assertArrayEqual(row_2[1], data_in_dataset[1][1])
         self.assertArrayEqual(row_2[2], data_in_dataset[1][2])
 
+    def test_write_buffer_flushes_when_full(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        dataset.reactor = task.Clock()
+        dataset.setWriteBuffer(3, 10, 1024)
+        dataset.listeners.add('foo listener')
+        data = self._get_records_simple([(1, 2, 3)], dataset.data.dtype)
+
+        dataset.addData(data)
+        dataset.addData(data)
+        self.assertFalse(self.hub.onDataAvailable.called)
+        self.assertEqual(0, len(dataset.data))
+
+        dataset.addData(data)
+        self.hub.onDataAvailable.assert_called_once_with(
+                None, set(['foo listener']))
+        self.assertEqual(3, len(dataset.data))
+
+    def test_write_buffer_flushes_after_delay(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        clock = task.Clock()
+        dataset.reactor = clock
+        dataset.setWriteBuffer(100, 2, 1024)
+        data = self._get_records_simple([(1, 2, 3)], dataset.data.dtype)
+
+        dataset.addData(data)
+        clock.advance(1)
+        self.assertEqual(0, len(dataset.data))
+        clock.advance(1)
+        self.assertEqual(1, len(dataset.data))
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_notify_interval(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        clock = task.Clock()
+        dataset.reactor = clock
+        dataset.setNotifyInterval(0.05)
+        dataset.keepStreaming('a', 0)
+        dataset.keepStreaming('b', 0)
+        data = self._get_records_simple([(1, 2, 3)], dataset.data.dtype)
+
+        dataset.addData(data)
+        dataset.addData(data)
+        self.assertFalse(self.hub.onDataAvailable.called)
+        clock.advance(0.05)
+        self.hub.onDataAvailable.assert_called_once_with(None, set(['a', 'b']))
+        self.assertEqual(set(['a', 'b']), dataset.listeners)
+
+        # only 'a' has read the new data, so only 'a' hears about more
+        self.hub.onDataAvailable.reset_mock()
+        dataset.keepStreaming('a', 2)
+        dataset.addData(data)
+        clock.advance(0.05)
+        self.hub.onDataAvailable.assert_called_once_with(None, set(['a']))
+
+        # turning the interval off sends pending messages
+        self.hub.onDataAvailable.reset_mock()
+        dataset.keepStreaming('a', 3)
+        dataset.addData(data)
+        dataset.setNotifyInterval(0)
+        self.hub.onDataAvailable.assert_called_once_with(None, set(['a']))
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_stream_pushes_rows(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        dataset.startStream('a', 0, 2, 2)
+        dataset.addData(self._get_records_simple(
+                [(1, 2, 3)], dataset.data.dtype))
+        (start, data), contexts = self.hub.onDataPushed.call_args[0]
+        self.assertEqual((0, ['a']), (start, contexts))
+        self.assertArrayEqual([1], data[0])
+        self.assertEqual(1, dataset.streamPosition('a', 0))
+
+        # only the last 2 rows are sent
+        dataset.addData(self._get_records_simple(
+                [(2, 3, 4), (3, 4, 5), (4, 5, 6)], dataset.data.dtype))
+        (start, data), contexts = self.hub.onDataPushed.call_args[0]
+        self.assertEqual(2, start)
+        self.assertArrayEqual([3, 4], data[0])
+        self.assertNotIn(mock.call(None, ['a']),
+                         self.hub.onDataAvailable.call_args_list)
+
+    def test_stream_falls_back_to_notify(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        data = self._get_records_simple([(1, 2, 3)], dataset.data.dtype)
+        dataset.startStream('a', 0, 10, 1)
+        dataset.addData(data)
+        dataset.addData(data)
+        dataset.addData(data)
+        self.assertEqual(1, self.hub.onDataPushed.call_count)
+        notified = lambda: self.hub.onDataAvailable.call_args_list.count(
+                mock.call(None, ['a']))
+        self.assertEqual(1, notified())
+
+        # reading to the end catches up and resumes pushing
+        dataset.keepStreaming('a', 3)
+        dataset.addData(data)
+        self.assertEqual(2, self.hub.onDataPushed.call_count)
+        self.assertEqual(3, self.hub.onDataPushed.call_args[0][0][0])
+
+        # acknowledged messages free up the window
+        dataset.ackStream('a')
+        dataset.addData(data)
+        self.assertEqual(3, self.hub.onDataPushed.call_count)
+        self.assertEqual(1, notified())
+
+    def test_write_buffer_flushes_at_byte_budget(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        dataset.reactor = task.Clock()
+        dataset.setWriteBuffer(100, 10, 48)
+        data = self._get_records_simple([(1, 2, 3)], dataset.data.dtype)
+
+        dataset.addData(data)
+        self.assertEqual(0, len(dataset.data))
+        dataset.addData(data)
+        self.assertEqual(2, len(dataset.data))
+
+    def test_read_buffered_data(self):
+        dataset = Dataset(
+                self.session,
+                "Foo Name",
+                title=self._TITLE,
+                create=True,
+                independents=self._INDEPENDENTS,
+                dependents=self._DEPENDENTS)
+        dataset.reactor = task.Clock()
+        dataset.setWriteBuffer(100, 10, 1024)
+        dataset.addData(self._get_records_simple(
+                [(1, 2, 3), (2, 3, 4)], dataset.data.dtype))
+
+        self.assertTrue(dataset.hasMore(0))
+        data_in_dataset, count = dataset.getData(None, 0, simpleOnly=True)
+        self.assertEqual(count, 2)
+        self.assertArrayEqual([[1, 2, 3], [2, 3, 4]], data_in_dataset)
+
     def test_add_one_parameter(self):
         dataset = Dataset(
                 self.session,
@@ -0,0 +1,178 @@
+import os
+import pytest
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from twisted.internet import task
+
+from datavault import backend, decimate
+
+
+class _ArrayData(object):
+    """Backend stand-in that serves columns of a 2-D array."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def getDataSlice(self, start, stop, step, columns):
+        rows = self.array[start:stop:step]
+        return tuple(rows[:, idx] for idx in columns)
+
+
+class DecimateTest(unittest.TestCase):
+
+    def setUp(self):
+        x = np.arange(1000, dtype=float)
+        y = np.random.RandomState(0).normal(size=1000)
+        self.array = np.column_stack((x, y))
+        self.data = _ArrayData(self.array)
+
+    def decimate_array(self, array, points, mode, chunk_rows=decimate.CHUNK_ROWS):
+        return decimate.decimate(_ArrayData(array), None,
+                                 range(array.shape[1]), points, mode, chunk_rows)
+
+    def decimate(self, points, mode, chunk_rows=decimate.CHUNK_ROWS):
+        return decimate.decimate(self.data, len(self.array), [0, 1], points,
+                                 mode, chunk_rows)
+
+    def test_bin_index(self):
+        x = np.array([0.0, 0.5, 2.9, 3.0, np.nan])
+        b = decimate.bin_index(x, 0.0, 3.0, 3)
+        self.assertTrue(np.array_equal(b[:4], [0, 0, 2, 2]))
+        self.assertTrue(np.isnan(b[4]))
+        # a single value puts all rows in one bin
+        self.assertTrue(np.array_equal(decimate.bin_index(x[:1], 0.0, 0.0, 3), [0]))
+
+    def test_stride(self):
+        x, y = self.decimate(250, 'stride', chunk_rows=7)
+        # 1000 rows of x from 0 to 999 in 250 bins of 4 rows
+        self.assertTrue(np.array_equal(x, self.array[::4, 0]))
+        self.assertTrue(np.array_equal(y, self.array[::4, 1]))
+
+    def test_mean(self):
+        x, y = self.decimate(250, 'mean', chunk_rows=7)
+        expected = self.array.reshape(250, 4, 2).mean(axis=1)
+        self.assertTrue(np.allclose(x, expected[:, 0]))
+        self.assertTrue(np.allclose(y, expected[:, 1]))
+
+    def test_mean_last_bin_includes_max(self):
+        x, = decimate.decimate(self.data, 10, [0], 3, 'mean', chunk_rows=3)
+        self.assertTrue(np.allclose(x, [1, 4, 7.5]))
+
+    def test_minmax(self):
+        x, y = self.decimate(100, 'minmax', chunk_rows=3)
+        bins = self.array[:, 1].reshape(100, 10)
+        self.assertTrue(np.array_equal(y[0::2], bins.min(axis=1)))
+        self.assertTrue(np.array_equal(y[1::2], bins.max(axis=1)))
+        self.assertTrue(np.array_equal(x[0::2], self.array[::10, 0]))
+        self.assertTrue(np.array_equal(x[1::2], self.array[9::10, 0]))
+
+    def test_non_uniform_sweep(self):
+        # ten coarse steps followed by a thousand fine ones
+        x = np.concatenate((np.arange(10.0), 10 + np.arange(1000) * 0.01))
+        array = np.column_stack((x, x * 2))
+        for mode in decimate.MODES:
+            columns = self.decimate_array(array, 20, mode, chunk_rows=64)
+            rows = 2 if mode == 'minmax' else 1
+            self.assertEqual(len(columns[0]), 20 * rows)
+            # the coarse steps get a bin each, rather than sharing one
+            self.assertTrue(np.allclose(columns[0][:10 * rows:rows], np.arange(10)))
+            self.assertTrue(np.allclose(columns[1], 2 * columns[0]))
+
+    def test_back_and_forth_sweep(self):
+        x = np.concatenate((np.arange(10.0), np.arange(10.0)[::-1]))
+        y = np.concatenate((np.zeros(10), np.ones(10)))
+        array = np.column_stack((x, y))
+        x, y = self.decimate_array(array, 10, 'mean', chunk_rows=3)
+        self.assertTrue(np.array_equal(x, np.arange(10)))
+        self.assertTrue(np.array_equal(y, [0.5] * 10))
+        x, y = self.decimate_array(array, 10, 'stride', chunk_rows=3)
+        self.assertTrue(np.array_equal(y, [0.0] * 10))
+
+    def test_empty_bins_left_out(self):
+        array = np.array([[0.0, 1.0], [1.0, 2.0], [9.0, 3.0], [10.0, 4.0]])
+        x, y = self.decimate_array(array, 10, 'stride')
+        self.assertTrue(np.array_equal(x, [0, 1, 9]))
+        x, y = self.decimate_array(array, 10, 'mean')
+        self.assertTrue(np.array_equal(x, [0, 1, 9.5]))
+        x, y = self.decimate_array(array, 10, 'minmax')
+        self.assertTrue(np.array_equal(x, [0, 0, 1, 1, 9, 10]))
+
+    def test_nan_values(self):
+        array = self.array[:20].copy()
+        array[:4, 1] = np.nan
+        array[5, 1] = np.nan
+        array[10, 0] = np.nan
+        x, y = self.decimate_array(array, 5, 'mean')
+        # rows without an independent value are left out
+        self.assertTrue(np.allclose(x[:3], [1.5, 5.5, 28.0 / 3]))
+        self.assertTrue(np.isnan(y[0]))
+        self.assertTrue(np.allclose(y[1], array[[4, 6, 7], 1].mean()))
+        self.assertTrue(np.allclose(y[2], array[[8, 9, 11], 1].mean()))
+        x, y = self.decimate_array(array, 5, 'minmax')
+        self.assertTrue(np.isnan(y[0]) and np.isnan(y[1]))
+        self.assertEqual(y[2], array[[4, 6, 7], 1].min())
+        self.assertEqual(y[3], array[[4, 6, 7], 1].max())
+
+    def test_chunk_size_does_not_change_result(self):
+        for mode in decimate.MODES:
+            expected = self.decimate(37, mode)
+            actual = self.decimate(37, mode, chunk_rows=5)
+            for a, b in zip(expected, actual):
+                self.assertTrue(np.allclose(a, b))
+
+    def test_read_to_end(self):
+        for mode in decimate.MODES:
+            expected = self.decimate(37, mode)
+            actual = decimate.decimate(self.data, None, [0, 1], 37, mode,
+                                       chunk_rows=10)
+            for a, b in zip(expected, actual):
+                self.assertTrue(np.allclose(a, b))
+
+    def test_empty(self):
+        for mode in decimate.MODES:
+            columns = decimate.decimate(self.data, 0, [0, 1], 10, mode)
+            self.assertEqual([len(c) for c in columns], [0, 0])
+            array = np.full((5, 2), np.nan)
+            columns = self.decimate_array(array, 10, mode)
+            self.assertEqual([len(c) for c in columns], [0, 0])
+
+    def test_bad_mode(self):
+        self.assertRaises(ValueError, self.decimate, 10, 'median')
+        self.assertRaises(ValueError, self.decimate, 0, 'mean')
+
+
+class CsvDecimateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='dvtest')
+        self.clock = task.Clock()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_csv_read_in_chunks(self):
+        filename = os.path.join(self.dir, 'a.csv')
+        data = backend.CsvNumpyData(filename, reactor=self.clock)
+        indep = [backend.Independent('x', (1,), 'v', 'V')]
+        dep = [backend.Dependent('y', '', (1,), 'v', 'A')]
+        data.initialize_info('Foo', indep, dep)
+        data.save()
+        records = np.zeros((1000,), dtype=data.dtype)
+        records['f0'] = np.arange(1000)
+        records['f1'] = np.arange(1000) % 4
+        data.addData(records)
+
+        x, y = decimate.decimate(data, None, [0, 1], 250, 'mean', chunk_rows=100)
+        self.assertTrue(np.allclose(x, np.arange(1000).reshape(250, 4).mean(axis=1)))
+        self.assertTrue(np.allclose(y, [1.5] * 250))
+        # the rows are read through the row index, not loaded as a whole
+        self.assertIsNone(getattr(data, '_buf', None))
+        data._file.close()
+
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,120 @@
+import Queue
+import pytest
+import threading
+import time
+import unittest
+
+from twisted.internet import base, defer
+from twisted.python import failure
+
+from datavault import executor
+
+
+class ThreadReactor(object):
+    """Stands in for a running reactor, for results delivered from threads.
+
+    Calls made with callFromThread are run by wait, in the test thread.
+    """
+    def __init__(self):
+        self.calls = Queue.Queue()
+        self.shutdown = base._ThreePhaseEvent()
+
+    def callFromThread(self, func, *args, **kw):
+        self.calls.put((func, args, kw))
+
+    def addSystemEventTrigger(self, phase, event, func, *args, **kw):
+        assert event == 'shutdown'
+        return self.shutdown.addTrigger(phase, func, *args, **kw)
+
+    def removeSystemEventTrigger(self, trigger_id):
+        self.shutdown.removeTrigger(trigger_id)
+
+    def wait(self, d, timeout=10):
+        """Run calls from threads until d fires, and return its result."""
+        results = []
+        d.addBoth(results.append)
+        while not results:
+            func, args, kw = self.calls.get(timeout=timeout)
+            func(*args, **kw)
+        result = results[0]
+        if isinstance(result, failure.Failure):
+            result.raiseException()
+        return result
+
+
+class IOExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = ThreadReactor()
+        self.executor = executor.IOExecutor(threads=2, reactor=self.reactor)
+
+    def tearDown(self):
+        self.executor.stop()
+
+    def test_run(self):
+        d = self.executor.run('a', lambda x, y: x + y, 1, y=2)
+        self.assertEqual(3, self.reactor.wait(d))
+        self.assertEqual(0, len(self.executor))
+
+    def test_error(self):
+        d = self.executor.run('a', lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            self.reactor.wait(d)
+        self.assertEqual(0, len(self.executor))
+
+    def test_same_key_in_order(self):
+        calls = []
+        def call(i):
+            calls.append(('start', i))
+            time.sleep(0.01)
+            calls.append(('end', i))
+        ds = [self.executor.run('a', call, i) for i in range(3)]
+        self.assertEqual(1, len(self.executor))
+        self.reactor.wait(defer.gatherResults(ds))
+        self.assertEqual([('start', 0), ('end', 0), ('start', 1), ('end', 1),
+                          ('start', 2), ('end', 2)], calls)
+        self.assertEqual(0, len(self.executor))
+
+    def test_different_keys_concurrently(self):
+        started = threading.Event()
+        # the first call only returns True if the second one runs meanwhile
+        d1 = self.executor.run('a', started.wait, 5)
+        d2 = self.executor.run('b', started.set)
+        self.reactor.wait(d2)
+        self.assertTrue(self.reactor.wait(d1))
+
+    def test_stop(self):
+        self.executor.stop()
+        self.assertFalse(self.executor.pool.started)
+        self.assertEqual([], self.reactor.shutdown.during)
+        self.executor.stop()
+
+    def test_stop_on_shutdown(self):
+        self.reactor.shutdown.fireEvent()
+        self.assertFalse(self.executor.pool.started)
+        self.executor.stop()
+
+    def test_then(self):
+        self.assertEqual(2, executor.then(1, lambda x: x + 1))
+        d = defer.Deferred()
+        result = executor.then(d, lambda x, y: x + y, 1)
+        d.callback(1)
+        self.assertEqual(2, result.result)
+
+    def test_gather(self):
+        self.assertEqual(None, executor.gather([None, 1]))
+        d1, d2 = defer.Deferred(), defer.Deferred()
+        d = executor.gather([d1, None, d2])
+        d1.callback(1)
+        self.assertFalse(d.called)
+        d2.callback(2)
+        self.assertEqual(None, d.result)
+        d1 = defer.Deferred()
+        d = executor.gather([d1])
+        d1.errback(ValueError('oops'))
+        self.assertRaises(ValueError, d.result.raiseException)
+        d.addErrback(lambda f: None)
+
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,141 @@
+import os
+import pytest
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from twisted.internet import task
+
+from datavault import backend, migrate
+
+
+class MigrateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='dvtest')
+        self.clock = task.Clock()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def make_csv_dataset(self, name, rows, subdir=''):
+        path = os.path.join(self.dir, subdir)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        base = os.path.join(path, name)
+        data = backend.CsvNumpyData(base + '.csv', reactor=self.clock)
+        indep = [backend.Independent('x', (1,), 'v', 'V')]
+        dep = [backend.Dependent('y', 'trace', (1,), 'v', 'A')]
+        data.initialize_info('Title ' + name, indep, dep)
+        data.addParam('gain', 2.5)
+        data.addComment('alice', 'first comment')
+        data.save()
+        if rows:
+            records = np.zeros((rows,), dtype=data.dtype)
+            records['f0'] = np.arange(rows)
+            records['f1'] = np.arange(rows) * 0.5
+            data.addData(records)
+        data._file.close()
+        return base
+
+    def open_hdf5(self, base):
+        data = backend.open_backend(base)
+        self.assertIsInstance(data, backend.SimpleHDF5Data)
+        return data
+
+    def test_find_datasets(self):
+        a = self.make_csv_dataset('a', 1)
+        b = self.make_csv_dataset('b', 1, subdir='sub.dir')
+        self.assertEqual(migrate.find_datasets(self.dir), [a, b])
+        self.assertEqual(migrate.find_datasets(self.dir, recursive=False), [a])
+
+    def test_convert_and_commit(self):
+        base = self.make_csv_dataset('a', 100)
+        migrate.convert(base)
+        # until the dataset is committed, the csv file is used
+        self.assertIsInstance(backend.open_backend(base), backend.CsvNumpyData)
+        self.assertTrue(migrate.commit(base))
+        self.assertFalse(os.path.exists(base + '.csv'))
+        self.assertTrue(os.path.exists(base + '.csv.migrated'))
+        self.assertTrue(os.path.exists(base + '.ini.migrated'))
+
+        data = self.open_hdf5(base)
+        self.assertEqual(data.dataset.attrs['Title'], 'Title a')
+        self.assertEqual(data.getIndependents()[0].label, 'x')
+        self.assertEqual(data.getDependents()[0].legend, 'trace')
+        self.assertEqual(data.getParameter('gain'), 2.5)
+        comments, _ = data.getComments(None, 0)
+        self.assertEqual([c[1:] for c in comments], [('alice', 'first comment')])
+        rows, _ = data.getData(None, 0, False, False)
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(tuple(rows[99]), (99, 49.5))
+        data._file.close()
+
+    def test_convert_leaves_file_pool_alone(self):
+        # convert runs in worker threads, where it must not close the files
+        # of the server to make room in the pool
+        base = self.make_csv_dataset('a', 10)
+        pool = backend.FilePool(max_open=1)
+        other = backend.SelfClosingFile(open_args=(base + '.ini',),
+                                        reactor=self.clock, pool=pool)
+        old_pool = backend.file_pool
+        backend.file_pool = pool
+        try:
+            migrate.convert(base)
+        finally:
+            backend.file_pool = old_pool
+        self.assertEqual(pool.misses, 1)
+        self.assertEqual(pool.evictions, 0)
+        self.assertTrue(hasattr(other, '_file'))
+        self.assertEqual(self.clock.getDelayedCalls()[0].func, other._fileTimeout)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        other.close()
+
+    def test_empty_dataset(self):
+        base = self.make_csv_dataset('a', 0)
+        migrate.convert(base)
+        self.assertTrue(migrate.commit(base))
+        self.assertEqual(len(self.open_hdf5(base)), 0)
+
+    def test_resume_discards_temporary_file(self):
+        base = self.make_csv_dataset('a', 10)
+        with open(base + migrate.TMP_SUFFIX, 'w') as f:
+            f.write('partial')
+        migrate.convert(base)
+        self.assertFalse(os.path.exists(base + migrate.TMP_SUFFIX))
+        self.assertTrue(migrate.commit(base))
+
+    def test_resume_commits_converted_dataset(self):
+        base = self.make_csv_dataset('a', 10)
+        migrate.convert(base)
+        mtime = os.path.getmtime(base + '.hdf5')
+        # an interrupted run is converted again without redoing the work
+        results = migrate.convert_all([base], processes=1)
+        self.assertEqual(results, [(base, None)])
+        self.assertEqual(os.path.getmtime(base + '.hdf5'), mtime)
+        self.assertTrue(migrate.commit(base))
+
+    def test_changed_during_conversion(self):
+        base = self.make_csv_dataset('a', 10)
+        migrate.convert(base)
+        with open(base + '.csv', 'a') as f:
+            f.write('10, 5\r\n')
+        self.assertFalse(migrate.commit(base))
+        self.assertFalse(os.path.exists(base + '.hdf5'))
+        self.assertTrue(os.path.exists(base + '.csv'))
+
+    def test_convert_all_in_pool(self):
+        bases = [self.make_csv_dataset(name, 50) for name in 'abc']
+        with open(bases[1] + '.ini', 'w') as f:
+            f.write('not an ini file')
+        results = dict(migrate.convert_all(bases, processes=2))
+        self.assertIsNone(results[bases[0]])
+        self.assertIsNotNone(results[bases[1]])
+        self.assertIsNone(results[bases[2]])
+        self.assertTrue(os.path.exists(bases[2] + '.hdf5'))
+
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -5,12 +5,16 @@ import pytest
 import tempfile
 import unittest
 
-from twisted.internet import reactor, task
+from twisted.internet import defer, reactor, task
 
 from labrad.server import LabradServer, Signal, setting
 from labrad import server
+from labrad import types as T
 
-from datavault import backend, errors, server, SessionStore
+from datavault import (backend, catalog, errors, executor, migrate, server, stats,
+                       SessionStore)
+
+from test_executor import ThreadReactor
 
 
 def _unique_dir():
@@ -155,6 +159,35 @@ class DataVaultTest(unittest.TestCase):
         self.assertEqual(
                 '(*v[ms],*v[eV])', self.datavault.transpose_type(self.context))
 
+    def test_create_dataset_with_storage_profile(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(
+                self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')],
+                storage='gzip')
+        dataset = self.datavault.getDataset(self.context)
+        self.assertEqual('gzip', dataset.data.dataset.compression)
+
+        self.datavault.new_ex(
+                self.context, 'bar', [('x', [1], 'v', 'ms')],
+                [('y', 'E', [1], 'v', 'eV')], storage=(128, '', 0, False))
+        dataset = self.datavault.getDataset(self.context)
+        self.assertEqual((128,), dataset.data.dataset.chunks)
+        self.assertEqual(None, dataset.data.dataset.compression)
+
+        self.assertRaises(
+                errors.BadStorageProfileError,
+                self.datavault.new,
+                self.context, 'baz', [('x', 'ms')], [('y', 'E', 'eV')],
+                storage='bzip2')
+
+    def test_default_storage_profile(self):
+        self.store.storage_profile = backend.get_storage_profile('lzf')
+        self.datavault.initContext(self.context)
+        self.datavault.new(
+                self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')])
+        dataset = self.datavault.getDataset(self.context)
+        self.assertEqual('lzf', dataset.data.dataset.compression)
+
     def test_expire_context(self):
         # Create the root session.
         self.datavault.initContext(self.context)
@@ -225,6 +258,8 @@ class DataVaultTest(unittest.TestCase):
         self.datavault.initContext(self.context)
         self.datavault.cd(self.context, path='first', create=True)
         self.datavault.cd(self.context, path=['second', 'third'], create=True)
+        # sessions with unsaved access times are kept until they are saved
+        self.store.flush()
         all_sessions = self.datavault.dump_existing_sessions(self.context)
         self.assertEqual(['/first/second/third'], all_sessions)
 
@@ -261,6 +296,336 @@ class DataVaultTest(unittest.TestCase):
                 self.context,
                 startOver=True)
 
+    def test_get_arrays(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(self.context, 'foo', ['x'], ['y'])
+        self.datavault.add(self.context, [[0.0, 1.0], [1.0, 2.0], [2.0, 3.0]])
+
+        x, y = self.datavault.get_arrays(self.context, limit=2)
+        self.assertArrayEqual([0.0, 1.0], x)
+        self.assertArrayEqual([1.0, 2.0], y)
+        x, y = self.datavault.get_arrays(self.context)
+        self.assertArrayEqual([2.0], x)
+        self.assertArrayEqual([3.0], y)
+        x, y = self.datavault.get_arrays(self.context, startOver=True)
+        self.assertArrayEqual([0.0, 1.0, 2.0], x)
+
+    def test_get_slice(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(self.context, 'foo', ['x [s]'],
+                           ['V (ch1) [V]', 'V (ch2) [V]', 'I [A]'])
+        self.datavault.add(
+            self.context, [[float(i), 1.0 * i, 2.0 * i, 3.0 * i] for i in range(5)])
+
+        (x,) = self.datavault.get_slice(self.context, 1, 4, 2, [0])
+        self.assertArrayEqual([1.0, 3.0], x)
+        ch2, current = self.datavault.get_slice(
+            self.context, columns=['ch2', 'I'])
+        self.assertArrayEqual([0.0, 2.0, 4.0, 6.0, 8.0], ch2)
+        self.assertArrayEqual([0.0, 3.0, 6.0, 9.0, 12.0], current)
+        (ch1,) = self.datavault.get_slice(self.context, 3, columns=['V (ch1)'])
+        self.assertArrayEqual([3.0, 4.0], ch1)
+
+        self.assertRaises(errors.AmbiguousColumnError,
+                          self.datavault.get_slice, self.context, columns=['V'])
+        self.assertRaises(errors.ColumnNotFoundError,
+                          self.datavault.get_slice, self.context, columns=['T'])
+        self.assertRaises(errors.ColumnNotFoundError,
+                          self.datavault.get_slice, self.context, columns=[4])
+
+        # get_slice doesn't move the stream position.
+        data = self.datavault.get(self.context)
+        self.assertEqual(5, len(data))
+
+    def test_get_decimated(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(self.context, 'foo', ['x', 'i'], ['y'])
+        self.datavault.add(
+            self.context, [[float(i), 0.0, float(i % 4)] for i in range(100)])
+
+        x, y = self.datavault.get_decimated(self.context, 10, 'minmax')
+        self.assertEqual(20, len(x))
+        self.assertArrayEqual([0.0, 9.0], x[:2])
+        self.assertArrayEqual([0.0, 3.0] * 10, y)
+        x, y = self.datavault.get_decimated(self.context, 25, 'mean')
+        self.assertArrayEqual([1.5] * 25, y)
+        x, y = self.datavault.get_decimated(self.context, 50, 'stride')
+        self.assertArrayEqual(range(0, 100, 2), x)
+        self.assertArrayEqual([0.0, 2.0] * 25, y)
+        # bins are spread over the values of the independent, not the rows
+        i, y = self.datavault.get_decimated(self.context, 50, 'stride', 'i')
+        self.assertArrayEqual([0.0], i)
+        self.assertArrayEqual([0.0], y)
+        self.assertRaises(errors.ColumnNotFoundError,
+                          self.datavault.get_decimated, self.context, 10,
+                          'mean', 'y')
+        self.assertRaises(errors.BadDecimationError,
+                          self.datavault.get_decimated, self.context, 0, 'mean')
+        self.assertRaises(errors.BadDecimationError,
+                          self.datavault.get_decimated, self.context, 10,
+                          'median')
+
+    def test_summary(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(self.context, 'foo', ['x'], ['y'])
+        self.assertEqual([], self.datavault.summary_levels(self.context))
+        self.datavault.new(self.context, 'bar', ['x'], ['y'], 'timeseries')
+        self.datavault.add(
+            self.context, [[float(i), float(i % 16)] for i in range(40)])
+
+        self.assertEqual([16, 256, 4096],
+                         self.datavault.summary_levels(self.context))
+        cols, mins, maxs, means = self.datavault.get_summary(self.context, 16)
+        self.assertEqual([0, 1], cols)
+        self.assertArrayEqual([[0.0, 0.0], [16.0, 0.0], [32.0, 0.0]], mins)
+        self.assertArrayEqual([[15.0, 15.0], [31.0, 15.0], [39.0, 7.0]], maxs)
+        self.assertArrayEqual([7.5, 7.5, 3.5], means[:, 1])
+        self.assertRaises(errors.SummaryLevelNotFoundError,
+                          self.datavault.get_summary, self.context, 10)
+
+    def _make_csv_dataset(self, name):
+        session_dir = self.store.get(['']).dir
+        base = os.path.join(session_dir, name)
+        data = backend.CsvNumpyData(base + '.csv', reactor=task.Clock())
+        data.initialize_info('foo', [backend.Independent('x', (1,), 'v', '')],
+                             [backend.Dependent('y', '', (1,), 'v', '')])
+        data.save()
+        data.addData(np.array([(0.0, 1.0), (1.0, 2.0)], dtype=data.dtype))
+        data._file.close()
+        return base
+
+    def _migrate(self, **kw):
+        results = []
+        with mock.patch.object(server.threads, 'deferToThread',
+                               side_effect=lambda f, *a: defer.succeed(f(*a))) as run, \
+             mock.patch.object(migrate.multiprocessing, 'Pool') as pool:
+            self.datavault.migrate_datasets(self.context, **kw).addCallback(
+                    results.append)
+        # the server must not fork workers from its thread
+        self.assertEqual(1, run.call_args[0][2])
+        self.assertFalse(pool.called)
+        return results[0]
+
+    def test_migrate(self):
+        self.datavault.initContext(self.context)
+        base = self._make_csv_dataset('00001 - foo')
+        self._make_csv_dataset('00002 - foo')
+        # datasets in use are not migrated
+        self.datavault.open(self.context, '00002 - foo')
+
+        self.assertEqual((1, 1, 0), self._migrate())
+        self.assertTrue(os.path.exists(base + '.hdf5'))
+        self.assertFalse(os.path.exists(base + '.csv'))
+        _, datasets = self.datavault.dir(self.context)
+        self.assertEqual(['00001 - foo', '00002 - foo'], datasets)
+
+        self.datavault.open(self.context, '00001 - foo')
+        self.assertArrayEqual([[0.0, 1.0], [1.0, 2.0]],
+                              self.datavault.get(self.context))
+
+    def test_search(self):
+        self.datavault.initContext(self.context)
+        self.assertRaises(errors.CatalogDisabledError,
+                          self.datavault.search, self.context)
+
+        cat = catalog.Catalog(':memory:')
+        cat.reactor = task.Clock()
+        store = SessionStore(_unique_dir(), self.hub, catalog=cat)
+        datavault = server.DataVault(store)
+        datavault.initServer()
+        context = MockContext()
+        datavault.initContext(context)
+        datavault.new(context, 'root scan', ['x'], ['y'])
+        datavault.cd(context, 'sub', True)
+        datavault.new(context, 'sub scan', ['x'], ['y'])
+        datavault.add_parameter(context, 'n', 3)
+        self.assertEqual([([''], '00001 - root scan'),
+                          (['', 'sub'], '00001 - sub scan')],
+                         datavault.search(context, 'scan'))
+        self.assertEqual([(['', 'sub'], '00001 - sub scan')],
+                         datavault.search(context, params=[('n', 3, 3)]))
+        self.assertEqual([(['', 'sub'], '00001 - sub scan')],
+                         datavault.search(context, below=True))
+        _empty_and_remove_dir(store.datadir)
+
+    def test_metadata_cache(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(self.context, 'foo', ['x'], ['y'])
+        self.datavault.variables(self.context)
+        stats = dict(self.datavault.metadata_cache(self.context))
+        self.datavault.variables(self.context)
+        self.datavault.row_type(self.context)
+        new_stats = dict(self.datavault.metadata_cache(self.context))
+        self.assertEqual(stats['misses'], new_stats['misses'])
+        self.assertTrue(new_stats['attribute reads saved'] >
+                        stats['attribute reads saved'])
+
+    def test_data_cache(self):
+        self.datavault.initContext(self.context)
+        stats, datasets = self.datavault.data_cache(self.context)
+        self.assertEqual(set(['datasets', 'bytes', 'max bytes', 'evictions']),
+                         set(dict(stats)))
+        max_bytes = dict(stats)['max bytes']
+        try:
+            stats, datasets = self.datavault.data_cache(self.context, 1000)
+            self.assertEqual(1000, dict(stats)['max bytes'])
+        finally:
+            backend.data_cache.setMaxBytes(max_bytes)
+
+    def test_stats(self):
+        self.datavault.initContext(self.context)
+        handlers = dict((h.ID, h)
+                        for h in self.datavault._findSettingHandlers())
+        self.assertIsInstance(handlers[7], server.TimedSetting)
+        self.assertEqual('cd', handlers[7].name)
+        self.assertIsInstance(handlers[543619], Signal)
+        try:
+            # nothing is recorded until enabled
+            handlers[7].handleRequest(
+                    self.datavault, self.context, T.flatten(None))
+            self.assertEqual([], self.datavault.timing_stats(self.context))
+            self.datavault.timing_stats(self.context, True)
+            path = handlers[7].handleRequest(
+                    self.datavault, self.context, T.flatten(None))
+            self.assertEqual([''], path)
+            self.datavault.new(
+                    self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')])
+            self.datavault.add(self.context, [(.1, .2)])
+            self.datavault.get(self.context)
+            rows = dict((row[0], row[1:])
+                        for row in self.datavault.timing_stats(self.context))
+            for name in ['setting: cd', 'hdf5 write', 'hdf5 read']:
+                count, mean, p50, p99, max_ms = rows[name]
+                self.assertEqual(1, count)
+                self.assertTrue(0 <= p50 <= p99 <= max_ms)
+            self.assertEqual([], self.datavault.timing_stats(
+                    self.context, False, True))
+        finally:
+            stats.timings.enabled = False
+            stats.timings.reset()
+
+    def test_io_executor(self):
+        thread_reactor = ThreadReactor()
+        io_executor = executor.IOExecutor(reactor=thread_reactor)
+        self.addCleanup(io_executor.stop)
+        wait = thread_reactor.wait
+        self.store = SessionStore(self.datadir, self.hub,
+                                  io_executor=io_executor)
+        self.datavault = server.DataVault(self.store)
+        self.datavault.initServer()
+        self.datavault.initContext(self.context)
+        self.datavault.new(
+                self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')])
+        dataset = self.datavault.getDataset(self.context)
+        dataset.listeners.add('listener')
+        d = self.datavault.add(self.context, [(.1, .2), (.3, .4)])
+        self.assertIsInstance(d, defer.Deferred)
+        # listeners are notified from the reactor thread once written
+        wait(d)
+        self.hub.onDataAvailable.assert_called_with(None, set(['listener']))
+        data = wait(self.datavault.get(self.context))
+        self.assertArrayEqual([[.1, .2], [.3, .4]], data)
+        self.assertEqual(2, self.context['filepos'])
+        # buffered rows are written before they are read
+        self.datavault.write_buffer(self.context, 10, 60)
+        self.assertEqual(None, self.datavault.add(self.context, [(.5, .6)]))
+        data = wait(self.datavault.get_arrays(self.context))
+        self.assertArrayEqual([.5], data[0])
+        self.assertEqual(0, dataset.data._file.holds)
+        # pushed rows are read in a thread, and sent from the reactor thread
+        d = dataset.startStream('stream', 1, 100, 10)
+        self.assertEqual(1, dataset.streams['stream'].pos)
+        wait(d)
+        (start, columns), contexts = self.hub.onDataPushed.call_args[0]
+        self.assertEqual((1, ['stream']), (start, contexts))
+        self.assertArrayEqual([.3, .5], columns[0])
+        # info files are written right away, in the reactor thread
+        session = self.store.get([''])
+        self.assertEqual(None, session.flush())
+        dirs, datasets = wait(self.datavault.dir(self.context))
+        self.assertEqual(['00001 - foo'], datasets)
+        # the length of rows written on shutdown is saved
+        dataset.stopStream('stream')
+        self.assertEqual(None, self.datavault.add(self.context, [(.7, .8)]))
+        wait(self.datavault.stopServer())
+        self.assertEqual(0, len(io_executor))
+        self.assertEqual(4, dataset.data.dataset.attrs['Length'])
+
+    def test_write_buffer(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(
+                self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')])
+        self.datavault.write_buffer(self.context, 10, 60)
+        self.datavault.add(self.context, [(.1, .2), (.3, .4)])
+        dataset = self.datavault.getDataset(self.context)
+        self.assertEqual(0, len(dataset.data))
+
+        # Readers see buffered data.
+        data = self.datavault.get(self.context)
+        self.assertArrayEqual([[.1, .2], [.3, .4]], data)
+
+        # Buffered data is written on shutdown.
+        self.datavault.add(self.context, [(.5, .6)])
+        self.assertEqual(2, len(dataset.data))
+        self.datavault.stopServer()
+        self.assertEqual(3, len(dataset.data))
+
+    def test_notify_interval(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(
+                self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')])
+        dataset = self.datavault.getDataset(self.context)
+        clock = task.Clock()
+        dataset.reactor = clock
+        self.datavault.notify_interval(self.context, 0.1)
+        self.datavault.get(self.context)
+        self.datavault.add(self.context, [(.1, .2)])
+        self.datavault.add(self.context, [(.3, .4)])
+        self.assertFalse(self.hub.onDataAvailable.called)
+        clock.advance(0.1)
+        self.assertEqual(1, self.hub.onDataAvailable.call_count)
+
+    def test_stream_data(self):
+        self.datavault.initContext(self.context)
+        self.datavault.new(
+                self.context, 'foo', [('x', 'ms')], [('y', 'E', 'eV')])
+        self.datavault.add(self.context, [(.1, .2)])
+        # rows already in the dataset are pushed when streaming starts
+        self.datavault.stream_data(self.context, 10, 4)
+        (start, data), contexts = self.hub.onDataPushed.call_args[0]
+        self.assertEqual(0, start)
+        self.assertArrayEqual([.1], data[0])
+        self.datavault.add(self.context, [(.3, .4)])
+        (start, data), contexts = self.hub.onDataPushed.call_args[0]
+        self.assertEqual(1, start)
+        self.assertArrayEqual([.3], data[0])
+
+        # get continues after the pushed rows
+        self.datavault.add(self.context, [(.5, .6)])
+        self.assertEqual(2, self.hub.onDataPushed.call_args[0][0][0])
+        self.assertEqual(0, len(self.datavault.get(self.context)))
+
+        # opening another dataset stops the stream
+        self.datavault.new(
+                self.context, 'bar', [('x', 'ms')], [('y', 'E', 'eV')])
+        self.hub.onDataPushed.reset_mock()
+        dataset = self.datavault.session_store.get(['']).datasets['00001 - foo']
+        dataset.addData(np.array([(.7, .8)], dtype=dataset.data.dtype))
+        self.assertFalse(self.hub.onDataPushed.called)
+
+    def test_file_pool(self):
+        self.datavault.initContext(self.context)
+        stats = dict(self.datavault.file_pool(self.context))
+        self.assertEqual(
+                set(['open', 'max open', 'hits', 'misses', 'evictions']),
+                set(stats))
+        max_open = stats['max open']
+        try:
+            stats = dict(self.datavault.file_pool(self.context, 7))
+            self.assertEqual(7, stats['max open'])
+        finally:
+            self.datavault.file_pool(self.context, max_open)
+
     def test_add_extended_data(self):
         self.datavault.initContext(self.context)
         # Create a root dataset.
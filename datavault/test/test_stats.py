@@ -0,0 +1,106 @@
+import pytest
+import unittest
+
+from twisted.internet import defer, task
+
+from datavault import stats
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        hist = stats.Histogram()
+        self.assertEqual(0, hist.percentile(50))
+        for i in range(1, 101):
+            hist.add(i * 1e-3)
+        self.assertEqual(100, hist.count)
+        self.assertAlmostEqual(50.5e-3, hist.mean())
+        self.assertEqual(0.1, hist.max)
+        # percentiles are upper bounds of buckets, within BUCKET_RATIO
+        self.assertTrue(50e-3 <= hist.percentile(50) < 50e-3 * stats.BUCKET_RATIO)
+        self.assertTrue(99e-3 <= hist.percentile(99) <= 0.1)
+        self.assertEqual(0.1, hist.percentile(100))
+
+    def test_small_durations(self):
+        hist = stats.Histogram()
+        hist.add(0)
+        hist.add(1e-9)
+        self.assertEqual(1e-9, hist.percentile(99))
+
+
+class TimingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.timings = stats.Timings(reactor=self.clock)
+        self.now = [0.0]
+        self.orig_clock = stats.clock
+        stats.clock = lambda: self.now[0]
+
+    def tearDown(self):
+        stats.clock = self.orig_clock
+        self.timings.setDumpInterval(0)
+
+    def advance(self, seconds):
+        self.now[0] += seconds
+
+    def test_disabled(self):
+        self.assertEqual(3, self.timings.call('f', lambda x: x + 1, 2))
+        self.assertEqual([], self.timings.stats())
+
+    def test_call(self):
+        self.timings.enabled = True
+        self.timings.call('f', self.advance, 0.002)
+        with self.assertRaises(ZeroDivisionError):
+            self.timings.call('f', lambda: 1 / 0)
+        [(name, count, mean, p50, p99, max_ms)] = self.timings.stats()
+        self.assertEqual(('f', 2), (name, count))
+        self.assertAlmostEqual(1.0, mean)
+        self.assertAlmostEqual(2.0, max_ms)
+        self.timings.reset()
+        self.assertEqual([], self.timings.stats())
+
+    def test_deferred(self):
+        self.timings.enabled = True
+        d = defer.Deferred()
+        result = self.timings.call('f', lambda: d)
+        self.assertEqual([], self.timings.stats())
+        self.advance(0.5)
+        d.callback('done')
+        self.assertEqual('done', result.result)
+        [(name, count, mean, p50, p99, max_ms)] = self.timings.stats()
+        self.assertAlmostEqual(500, max_ms)
+
+    def test_dump(self):
+        self.timings.enabled = True
+        self.timings.record('f', 0.1)
+        dumps = []
+        self.timings.dump = lambda: dumps.append(self.timings.format())
+        self.timings.setDumpInterval(10)
+        self.clock.pump([10, 10, 5])
+        self.assertEqual(2, len(dumps))
+        self.assertIn('f', dumps[0].splitlines()[1])
+        self.timings.setDumpInterval(0)
+        self.clock.pump([10, 10, 5])
+        self.assertEqual(2, len(dumps))
+
+    def test_timed(self):
+        calls = []
+        @stats.timed('g')
+        def g(x):
+            calls.append(x)
+            return x
+        self.assertEqual(1, g(1))
+        self.assertEqual(0, len(stats.timings.histograms))
+        stats.timings.enabled = True
+        try:
+            self.assertEqual(2, g(2))
+            self.assertEqual(1, stats.timings.histograms['g'].count)
+        finally:
+            stats.timings.enabled = False
+            stats.timings.reset()
+        self.assertEqual([1, 2], calls)
+
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,144 @@
+import os
+import pytest
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from twisted.internet import task
+
+from datavault import backend, errors, summary
+
+
+class SummaryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = tempfile.mktemp(prefix='dvtest', suffix='.hdf5')
+        self.clock = task.Clock()
+        fh = backend.SelfClosingFile(
+                h5py.File, open_args=(self.filename, 'a'), reactor=self.clock)
+        self.data = backend.ExtendedHDF5Data(fh)
+        indep = [backend.Independent('t', (1,), 'v', 's'),
+                 backend.Independent('n', (1,), 'i', '')]
+        dep = [backend.Dependent('y', '', (1,), 'v', 'V'),
+               backend.Dependent('s', '', (1,), 's', '')]
+        self.data.initialize_info('Foo', indep, dep, 'timeseries')
+
+    def tearDown(self):
+        self.data._file.close()
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+    def add_rows(self, start, stop):
+        rows = np.zeros((stop - start,), dtype=self.data.dtype)
+        n = np.arange(start, stop)
+        rows['f0'] = n * 0.5
+        rows['f1'] = n % 7
+        rows['f2'] = np.sin(n)
+        rows['f3'] = 'x'
+        self.data.addData(rows)
+
+    def expected(self, length, factor):
+        n = np.arange(length)
+        cols = np.column_stack((n * 0.5, n % 7, np.sin(n)))
+        bins = [cols[i:i + factor] for i in range(0, length, factor)]
+        return (np.array([b.min(axis=0) for b in bins]),
+                np.array([b.max(axis=0) for b in bins]),
+                np.array([b.mean(axis=0) for b in bins]))
+
+    def assert_summary(self, length):
+        for factor in summary.FACTORS:
+            cols, mins, maxs, means = self.data.getSummary(factor, 0, None)
+            self.assertEqual(cols, [0, 1, 2])
+            exp_mins, exp_maxs, exp_means = self.expected(length, factor)
+            self.assertTrue(np.array_equal(mins, exp_mins))
+            self.assertTrue(np.array_equal(maxs, exp_maxs))
+            self.assertTrue(np.allclose(means, exp_means))
+
+    def test_levels(self):
+        self.assertEqual(self.data.getSummaryLevels(), list(summary.FACTORS))
+
+    def test_incremental_update(self):
+        length = 0
+        for size in [1, 5, 20, 300, 1, 4000, 7]:
+            self.add_rows(length, length + size)
+            length += size
+        self.assert_summary(length)
+        self.assertEqual(self.data.file['Summary/16'].shape[0], length // 16)
+
+    def test_read_range(self):
+        self.add_rows(0, 100)
+        _, mins, _, _ = self.data.getSummary(16, 2, 4)
+        self.assertTrue(np.array_equal(mins[:, 0], [16, 24]))
+        # the last bin is partial
+        _, mins, maxs, _ = self.data.getSummary(16, 6, None)
+        self.assertTrue(np.array_equal(mins[:, 0], [48]))
+        self.assertTrue(np.array_equal(maxs[:, 0], [49.5]))
+
+    def test_nan_values(self):
+        # failed points stored as NaN do not blank the bins they are in
+        rows = np.zeros((300,), dtype=self.data.dtype)
+        rows['f0'] = np.arange(300)
+        rows['f2'] = 1.0
+        rows['f2'][:16] = np.nan
+        rows['f2'][20] = np.nan
+        rows['f2'][40] = 5.0
+        self.data.addData(rows)
+        _, mins, maxs, means = self.data.getSummary(16, 0, 3)
+        self.assertTrue(np.isnan(mins[0, 2]) and np.isnan(maxs[0, 2]))
+        self.assertTrue(np.isnan(means[0, 2]))
+        self.assertTrue(np.array_equal(mins[1:, 2], [1.0, 1.0]))
+        self.assertTrue(np.array_equal(maxs[1:, 2], [1.0, 5.0]))
+        self.assertTrue(np.allclose(means[1:, 2], [1.0, 1.25]))
+        _, mins, maxs, means = self.data.getSummary(256, 0, None)
+        self.assertTrue(np.array_equal(mins[:, 2], [1.0, 1.0]))
+        self.assertTrue(np.array_equal(maxs[:, 2], [5.0, 1.0]))
+        # higher levels are weighted by the number of values in each bin
+        self.assertTrue(np.allclose(means[:, 2], [243.0 / 239, 1.0]))
+        self.assertTrue(np.array_equal(
+                self.data.file['Summary/256'][0, summary.COUNT], [256, 256, 239]))
+
+    def test_empty(self):
+        _, mins, _, _ = self.data.getSummary(256, 0, None)
+        self.assertEqual(mins.shape, (0, 3))
+
+    def test_unknown_level(self):
+        self.assertRaises(errors.SummaryLevelNotFoundError,
+                          self.data.getSummary, 100, 0, None)
+
+    def test_rebuild(self):
+        self.add_rows(0, 1000)
+        self.data._file.close()
+        with h5py.File(self.filename, 'a') as f:
+            del f['Summary']
+        self.assertEqual(self.data.getSummaryLevels(), [])
+        self.data._file.close()
+
+        summary.main([self.filename])
+        self.assertEqual(self.data.getSummaryLevels(), list(summary.FACTORS))
+        self.assert_summary(1000)
+
+    def test_levels_without_counts(self):
+        # files written before counts were stored are read as they are,
+        # then rebuilt when rows are appended
+        self.add_rows(0, 300)
+        for factor in summary.FACTORS:
+            name = 'Summary/{}'.format(factor)
+            level = self.data.file[name][:, :summary.COUNT]
+            del self.data.file[name]
+            self.data.file.create_dataset(name, data=level,
+                                          maxshape=(None,) + level.shape[1:])
+        self.assert_summary(300)
+        self.add_rows(300, 600)
+        self.assertEqual(self.data.file['Summary/16'].shape,
+                         (600 // 16, summary.STATS, 3))
+        self.assert_summary(600)
+
+    def test_bad_factors(self):
+        self.assertRaises(ValueError, summary.create, self.data.file,
+                          self.data.dataset, [16, 100])
+
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
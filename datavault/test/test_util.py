@@ -51,6 +51,47 @@ class Testutil(unittest.TestCase):
         self.assertEqual(expected.dtype, actual.dtype, msg='dtype mismatch')
         self.assertTrue(np.array_equal(expected, actual), msg='array mismatch')
 
+    def test_homogeneous_dtype(self):
+        self.assertEqual(np.dtype('<f8'), util.homogeneous_dtype(
+                np.dtype([('f0', '<f8'), ('f1', '<f8')])))
+        self.assertEqual(None, util.homogeneous_dtype(
+                np.dtype([('f0', '<f8'), ('f1', '<i4')])))
+        self.assertEqual(None, util.homogeneous_dtype(
+                np.dtype([('f0', '<f8'), ('f1', '<f8', (2,))])))
+        self.assertEqual(None, util.homogeneous_dtype(np.dtype('<f8')))
+
+    def test_record_array_views(self):
+        dtype = np.dtype([('f0', '<f8'), ('f1', '<f8'), ('f2', '<f8')])
+        data = np.array([[0, 1, 2], [3, 4, 5]], dtype=float)
+        records = util.to_record_array(data, dtype)
+        self.assertEqual(dtype, records.dtype)
+        self.assertEqual((2,), records.shape)
+        self.assertEqual((3, 4, 5), tuple(records[1]))
+        self.assertTrue(np.may_share_memory(data, records))
+        rows = util.from_record_array(records)
+        self.assertTrue(np.array_equal(data, rows))
+        self.assertTrue(np.may_share_memory(data, rows))
+
+    def test_mixed_record_array(self):
+        dtype = np.dtype([('f0', '<f8'), ('f1', '<i4')])
+        records = util.to_record_array(np.array([[1.5, 2], [3, 4]]), dtype)
+        self.assertEqual([(1.5, 2), (3.0, 4)], records.tolist())
+        rows = util.from_record_array(records)
+        self.assertTrue(np.array_equal([[1.5, 2], [3, 4]], rows))
+
+    def test_rows_to_record_array(self):
+        dtype = np.dtype([('f0', '<f8'), ('f1', '<f8')])
+        for rows in [[(1, 2), (3, 4)], [[1, 2], [3, 4]],
+                     np.array([[1., 2.], [3., 4.]])]:
+            records = util.rows_to_record_array(rows, dtype)
+            self.assertEqual(dtype, records.dtype)
+            self.assertEqual([(1, 2), (3, 4)], records.tolist())
+        dtype = np.dtype([('f0', '<f8'), ('f1', 'O'), ('f2', '<i4', (2,))])
+        records = util.rows_to_record_array([[1, 'a', [2, 3]]], dtype)
+        self.assertEqual('a', records[0][1])
+        self.assertEqual([2, 3], list(records[0][2]))
+        self.assertEqual(0, len(util.rows_to_record_array([], dtype)))
+
     def test_braced(self):
         actual = util.braced('foo')
         expected = '{' + 'foo' + '}'
@@ -28,17 +28,65 @@ class DVSafeConfigParser(cp.SafeConfigParser):
             fp.write(newline)
 
 
-def to_record_array(data):
-    """Take a 2-D array of numpy data and return a 1-D array of records."""
-    return np.core.records.fromarrays(data.T)
+def homogeneous_dtype(dtype):
+    """Get the common type of the fields of a record dtype, or None.
+
+    Returns None unless all fields are scalars of the same type, packed
+    in order without gaps, so that each record can be viewed as a row of
+    a 2-D array of that type.
+    """
+    if dtype.names is None:
+        return None
+    base = dtype.fields[dtype.names[0]][0]
+    for idx, name in enumerate(dtype.names):
+        field, offset = dtype.fields[name][:2]
+        if field != base or field.shape or offset != idx * base.itemsize:
+            return None
+    if dtype.itemsize != len(dtype.names) * base.itemsize:
+        return None
+    return base
+
+
+def to_record_array(data, dtype=None):
+    """Take a 2-D array of numpy data and return a 1-D array of records.
+
+    If dtype is a record type whose fields all have the same type, the
+    records are a view of the data (converted to that type if needed)
+    rather than a copy.
+    """
+    if dtype is None:
+        return np.core.records.fromarrays(data.T)
+    dtype = np.dtype(dtype)
+    base = homogeneous_dtype(dtype)
+    if base is None or data.ndim != 2 or data.shape[1] != len(dtype.names):
+        return np.core.records.fromarrays(data.T, dtype=dtype)
+    rows = np.ascontiguousarray(data, dtype=base)
+    return rows.view(dtype).reshape(len(rows))
 
 
 def from_record_array(data):
     """Take a 1-D array of records and convert to a 2-D array.
 
-    The records must be homogeneous.
+    The records must be homogeneous.  If the fields all have the same
+    type, the result is a view of the data rather than a copy.
     """
-    return np.vstack([np.array(tuple(row)) for row in data])
+    base = homogeneous_dtype(data.dtype)
+    if base is None:
+        return np.column_stack([data[name] for name in data.dtype.names])
+    data = np.ascontiguousarray(data).view(np.ndarray)
+    return data.view(base).reshape(len(data), len(data.dtype.names))
+
+
+def rows_to_record_array(rows, dtype):
+    """Convert a list of rows, each a tuple or list, to a 1-D array of records."""
+    if isinstance(rows, np.ndarray):
+        if rows.dtype.names is not None:
+            return rows.astype(dtype)
+        return to_record_array(np.atleast_2d(rows), dtype)
+    # numpy parses a list of tuples as records in one pass
+    if len(rows) and not isinstance(rows[0], tuple):
+        rows = [tuple(row) for row in rows]
+    return np.array(rows, dtype=dtype)
 
 
 def braced(s):